@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark the compression of the members of a new book.
+
+A number of files are generated (text, compressible as chapters are), and
+written to a new archive with deflate:
+
+- one after the other, with zipfile.ZipFile.write,
+- with a zipio.DeflatePool of a number of threads, as `EpubFile.add_item`
+  does with `deflate_workers`.
+
+Both archives hold the same members, in the same order.
+
+Usage: python benchmarks/bench_deflate.py [number_of_file] [size_of_file]
+"""
+from __future__ import print_function
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_save_as import build_chapter
+from epub import zipio
+
+
+def with_zipfile(paths, target_path, workers):
+    with zipfile.ZipFile(target_path, 'w', zipfile.ZIP_DEFLATED) as target:
+        for path in paths:
+            target.write(path, os.path.basename(path))
+
+
+def with_deflate_pool(paths, target_path, workers):
+    with zipfile.ZipFile(target_path, 'w') as target:
+        with zipio.DeflatePool(target, workers) as pool:
+            for path in paths:
+                pool.write(path, os.path.basename(path))
+
+
+def main(number_of_file, size_of_file):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        paths = []
+        for i in range(number_of_file):
+            path = os.path.join(tmp_dir, 'chapter%d.xhtml' % i)
+            with open(path, 'wb') as f:
+                f.write(build_chapter(i, size_of_file))
+            paths.append(path)
+        target_path = os.path.join(tmp_dir, 'target.epub')
+        print('%d files of %d bytes, %d CPUs' % (
+            number_of_file, size_of_file, multiprocessing.cpu_count()))
+
+        cases = [('ZipFile.write', with_zipfile, 1)]
+        for workers in (2, 4, None):
+            cases.append(('DeflatePool(%s)' % (workers or 'cpu_count'),
+                          with_deflate_pool, workers))
+        for label, func, workers in cases:
+            start = time.time()
+            func(paths, target_path, workers)
+            duration = time.time() - start
+            with zipfile.ZipFile(target_path) as target:
+                assert target.namelist() == [os.path.basename(path)
+                                             for path in paths]
+            print('  %-30s %8.1f ms' % (label, duration * 1000))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 500000)
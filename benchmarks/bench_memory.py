@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Measure the memory used by a parsed book: its Opf and Ncx objects.
+
+A book is generated with a number of manifest items (each one in the spine,
+and with one navPoint and one pageTarget in the NCX file), parsed with
+`opf.parse_opf` and `ncx.parse_toc`, and the memory still allocated for the
+resulting objects is measured with tracemalloc (Python 3.4+).
+
+Usage: python benchmarks/bench_memory.py [number_of_item] [number_of_book]
+"""
+from __future__ import print_function
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from epub.reader import ncx, opf
+
+
+OPF_TEMPLATE = """<?xml version="1.0" ?>
+<package unique-identifier="BookId" version="2.0" xmlns="http://www.idpf.org/2007/opf">
+    <metadata xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:opf="http://www.idpf.org/2007/opf">
+        <dc:identifier id="BookId" opf:scheme="UUID">urn:uuid:477d1a82</dc:identifier>
+        <dc:title>Benchmark</dc:title>
+        <dc:creator opf:role="aut">Florian Strzelecki</dc:creator>
+        <dc:language>en</dc:language>
+    </metadata>
+    <manifest>
+        <item href="toc.ncx" id="ncx" media-type="application/x-dtbncx+xml"/>
+%(items)s
+    </manifest>
+    <spine toc="ncx">
+%(itemrefs)s
+    </spine>
+</package>
+"""
+
+NCX_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
+<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">
+  <head>
+    <meta content="urn:uuid:477d1a82" name="dtb:uid"/>
+  </head>
+  <docTitle>
+    <text>Benchmark</text>
+  </docTitle>
+  <navMap>
+%(nav_points)s
+  </navMap>
+  <pageList>
+%(page_targets)s
+  </pageList>
+</ncx>
+"""
+
+
+def build_opf(number_of_item):
+    items = '\n'.join(
+        '        <item href="Text/chapter%d.xhtml" id="chapter%d" '
+        'media-type="application/xhtml+xml"/>' % (i, i)
+        for i in range(number_of_item))
+    itemrefs = '\n'.join(
+        '        <itemref idref="chapter%d"/>' % i
+        for i in range(number_of_item))
+    return (OPF_TEMPLATE % {'items': items,
+                            'itemrefs': itemrefs}).encode('utf-8')
+
+
+def build_ncx(number_of_item):
+    nav_points = '\n'.join(
+        '    <navPoint id="navPoint-%d" playOrder="%d">'
+        '<navLabel><text>Chapter %d</text></navLabel>'
+        '<content src="Text/chapter%d.xhtml"/></navPoint>' % (i, i + 1, i, i)
+        for i in range(number_of_item))
+    page_targets = '\n'.join(
+        '    <pageTarget id="page-%d" type="normal" value="%d" '
+        'playOrder="%d"><navLabel><text>%d</text></navLabel>'
+        '<content src="Text/chapter%d.xhtml#page%d"/></pageTarget>'
+        % (i, i + 1, number_of_item + i + 1, i + 1, i, i)
+        for i in range(number_of_item))
+    return (NCX_TEMPLATE % {'nav_points': nav_points,
+                            'page_targets': page_targets}).encode('utf-8')
+
+
+def measure(opf_string, ncx_string, number_of_book, intern_strings=True):
+    """Return the memory used per book, in bytes."""
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    books = [(opf.parse_opf(opf_string, intern_strings=intern_strings),
+              ncx.parse_toc(ncx_string, intern_strings=intern_strings))
+             for _ in range(number_of_book)]
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del books
+    return size // number_of_book
+
+
+def main():
+    number_of_item = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    number_of_book = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    opf_string = build_opf(number_of_item)
+    ncx_string = build_ncx(number_of_item)
+
+    for intern_strings in (False, True):
+        size = measure(opf_string, ncx_string, number_of_book,
+                       intern_strings)
+        print('%d items, intern_strings=%s: %.1f KiB per book '
+              '(%d bytes per item)' % (number_of_item, intern_strings,
+                                       size / 1024.0, size // number_of_item))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark the parsing and serialization of an NCX file with many navPoints.
+
+Two NCX files are generated with the same number of navPoints: a "wide" one,
+with chapters of 10 sections of 10 sub-sections, and a "deep" one, where each
+navPoint is the child of the previous one (as some converters do). Each one
+is parsed with `ncx.parse_toc` with every available XML backend, then its
+navMap is serialized with `NavMap.as_xml_element`.
+
+Both are inspected with an explicit stack, so the deep NCX does not hit the
+recursion limit.
+
+Usage: python benchmarks/bench_ncx_nav_points.py [number_of_nav_point]
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from epub.reader import ncx, xmlbackend
+
+
+NCX_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
+<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">
+  <head>
+    <meta content="urn:uuid:477d1a82" name="dtb:uid"/>
+  </head>
+  <docTitle>
+    <text>Benchmark</text>
+  </docTitle>
+  <navMap>
+%(nav_points)s
+  </navMap>
+</ncx>
+"""
+
+NAV_POINT_START = ('<navPoint id="navPoint-%d" playOrder="%d">'
+                   '<navLabel><text>Entry %d</text></navLabel>'
+                   '<content src="Text/chapter%d.xhtml#entry%d"/>')
+
+
+def build_nav_point_start(i):
+    return NAV_POINT_START % (i, i + 1, i, i // 100, i)
+
+
+def build_ncx(depths):
+    """Return an NCX file with one navPoint per depth of `depths`."""
+    parts = []
+    opened = 0
+    for i, depth in enumerate(depths):
+        depth = min(depth, opened + 1)
+        parts.append('</navPoint>' * (opened - depth + 1))
+        parts.append(build_nav_point_start(i))
+        opened = depth
+    parts.append('</navPoint>' * opened)
+    return (NCX_TEMPLATE % {'nav_points': ''.join(parts)}).encode('utf-8')
+
+
+def build_wide_ncx(number_of_nav_point):
+    """Chapters of 10 sections of 10 sub-sections."""
+    return build_ncx([1 if i % 100 == 0 else 2 if i % 10 == 0 else 3
+                      for i in range(number_of_nav_point)])
+
+
+def build_deep_ncx(number_of_nav_point):
+    """Each navPoint is the child of the previous one."""
+    return build_ncx(range(1, number_of_nav_point + 1))
+
+
+def timed(func, *args):
+    start = time.time()
+    result = func(*args)
+    return result, time.time() - start
+
+
+def main(number_of_nav_point):
+    cases = [('wide', build_wide_ncx(number_of_nav_point)),
+             ('deep', build_deep_ncx(number_of_nav_point))]
+    for shape, xml_string in cases:
+        print('%s NCX with %d navPoints (%d bytes)' % (
+            shape, number_of_nav_point, len(xml_string)))
+        for backend in xmlbackend.get_available_backends():
+            toc, duration = timed(ncx.parse_toc, xml_string, backend)
+            assert len(toc.index) == number_of_nav_point
+            print('  parse_toc (%-7s)          %8.1f ms' % (backend,
+                                                          duration * 1000))
+        element, duration = timed(toc.nav_map.as_xml_element)
+        print('  NavMap.as_xml_element        %8.1f ms' % (duration * 1000))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
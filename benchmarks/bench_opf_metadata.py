@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark the parsing of the <metadata> element of an OPF file.
+
+Compare the former implementation (one `getElementsByTagName` walk per
+Dublin Core element) with the one-pass dispatch of `_parse_xml_metadata`,
+and with the streaming `parse_metadata`.
+
+Usage: python benchmarks/bench_opf_metadata.py [number_of_meta]
+"""
+from __future__ import print_function
+import os
+import sys
+import timeit
+from xml.dom import minidom
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from epub.reader import opf
+from epub.utils import get_node_text
+
+
+OPF_TEMPLATE = """<?xml version="1.0" ?>
+<package unique-identifier="BookId" version="2.0" xmlns="http://www.idpf.org/2007/opf">
+    <metadata xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:opf="http://www.idpf.org/2007/opf">
+        <dc:identifier id="BookId" opf:scheme="UUID">urn:uuid:477d1a82</dc:identifier>
+        <dc:title>Benchmark</dc:title>
+        <dc:creator opf:role="aut">Florian Strzelecki</dc:creator>
+        <dc:language>en</dc:language>
+%(metas)s
+    </metadata>
+    <manifest>
+%(items)s
+    </manifest>
+    <spine toc="ncx">
+    </spine>
+</package>
+"""
+
+
+def build_opf(number_of_meta, number_of_item=1000):
+    metas = '\n'.join(
+        '        <meta content="value %d" name="vendor:meta%d"/>' % (i, i)
+        for i in range(number_of_meta))
+    items = '\n'.join(
+        '        <item href="Text/%d.xhtml" id="item%d" '
+        'media-type="application/xhtml+xml"/>' % (i, i)
+        for i in range(number_of_item))
+    return (OPF_TEMPLATE % {'metas': metas, 'items': items}).encode('utf-8')
+
+
+def legacy_parse_xml_metadata(element):
+    """One getElementsByTagName walk per tag, as it was done before."""
+    metadata = opf.Metadata()
+    for name, parser in opf._METADATA_PARSERS.items():
+        for node in element.getElementsByTagName(name):
+            parser(metadata, get_node_text(node), node.getAttribute)
+    return metadata
+
+
+def main(number_of_meta):
+    xml_string = build_opf(number_of_meta)
+    package = minidom.parseString(xml_string).documentElement
+    element = package.getElementsByTagName('metadata')[0]
+
+    cases = [
+        ('legacy (16 walks)', lambda: legacy_parse_xml_metadata(element)),
+        ('_parse_xml_metadata (1 walk)',
+         lambda: opf._parse_xml_metadata(element)),
+        ('parse_metadata (streaming, from bytes)',
+         lambda: opf.parse_metadata(xml_string)),
+    ]
+    print('OPF with %d <meta> elements (%d bytes)' % (number_of_meta,
+                                                      len(xml_string)))
+    for label, func in cases:
+        number = 20
+        best = min(timeit.repeat(func, number=number, repeat=5)) / number
+        print('  %-40s %8.3f ms' % (label, best * 1000))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
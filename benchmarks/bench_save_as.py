@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark a metadata-only rewrite of a book.
+
+A book is generated with a number of deflated chapters (with the OPF and NCX
+files of bench_memory.py). Its title is changed, and the book is written to
+a new file:
+
+- by reading each member and writing it again with zipfile, which inflates
+  and deflates all of them,
+- with `EpubFile.save_as`, which copies the raw data of the members and only
+  writes the OPF and NCX files again.
+
+Usage: python benchmarks/bench_save_as.py [number_of_item] [size_of_item]
+"""
+from __future__ import print_function
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_memory import build_ncx, build_opf
+from epub import const
+from epub.reader import content
+
+CONTAINER = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+    <rootfiles>
+        <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+    </rootfiles>
+</container>"""
+
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do '
+         'eiusmod tempor incididunt ut labore et dolore magna aliqua').split()
+
+
+def build_chapter(i, size_of_item):
+    text = []
+    length = 0
+    while length < size_of_item:
+        paragraph = ' '.join(random.choice(WORDS) for j in range(80))
+        text.append('<p>%s</p>' % paragraph)
+        length += len(paragraph) + 7
+    return ('<html><head><title>Chapter %d</title></head><body>%s</body>'
+            '</html>' % (i, '\n'.join(text))).encode('utf-8')
+
+
+def build_epub(path, number_of_item, size_of_item):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(zipfile.ZipInfo('mimetype'), const.MIMETYPE_EPUB)
+        archive.writestr(const.CONTAINER_PATH, CONTAINER)
+        archive.writestr('OEBPS/content.opf', build_opf(number_of_item))
+        archive.writestr('OEBPS/toc.ncx', build_ncx(number_of_item))
+        for i in range(number_of_item):
+            archive.writestr('OEBPS/Text/chapter%d.xhtml' % i,
+                             build_chapter(i, size_of_item))
+
+
+def with_recompression(source_path, target_path):
+    with content.open_epub(source_path) as book:
+        book.opf.metadata.titles = [('Stamped', '')]
+        buffer = io.BytesIO()
+        book.opf.write_xml_document(buffer)
+        with zipfile.ZipFile(target_path, 'w',
+                             zipfile.ZIP_DEFLATED) as target:
+            for info in book.infolist():
+                data = book.read(info)
+                if info.filename == book.opf_path:
+                    data = buffer.getvalue()
+                target.writestr(info, data)
+
+
+def with_save_as(source_path, target_path):
+    with content.open_epub(source_path) as book:
+        book.opf.metadata.titles = [('Stamped', '')]
+        book.save_as(target_path)
+
+
+def main(number_of_item, size_of_item):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        source_path = os.path.join(tmp_dir, 'source.epub')
+        build_epub(source_path, number_of_item, size_of_item)
+        print('%d items of %d bytes (%d bytes compressed)' % (
+            number_of_item, size_of_item, os.path.getsize(source_path)))
+        for label, func in (('inflate and deflate', with_recompression),
+                            ('save_as', with_save_as)):
+            target_path = os.path.join(tmp_dir, 'target.epub')
+            best = None
+            for i in range(3):
+                start = time.time()
+                func(source_path, target_path)
+                duration = time.time() - start
+                best = duration if best is None else min(best, duration)
+            print('  %-30s %8.1f ms' % (label, best * 1000))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+         int(sys.argv[2]) if len(sys.argv) > 2 else 100000)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark the serialization of the OPF and NCX files of a book.
+
+A book is generated with a number of manifest items (each one in the spine,
+and with one navPoint and one pageTarget in the NCX file), as for
+bench_memory.py. Its Opf and Ncx objects are serialized to bytes with
+minidom (`as_xml_document().toxml()`, as EpubFile did before) and with the
+streaming `write_xml_document`, which writes the same bytes without building
+a DOM.
+
+Usage: python benchmarks/bench_xml_writer.py [number_of_item]
+"""
+from __future__ import print_function
+import io
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from bench_memory import build_ncx, build_opf
+from epub.reader import ncx, opf
+
+
+def with_minidom(obj):
+    return obj.as_xml_document().toxml().encode('utf-8')
+
+
+def with_writer(obj):
+    stream = io.BytesIO()
+    obj.write_xml_document(stream)
+    return stream.getvalue()
+
+
+def main(number_of_item):
+    cases = [('OPF', opf.parse_opf(build_opf(number_of_item))),
+             ('NCX', ncx.parse_toc(build_ncx(number_of_item)))]
+    print('%d items' % number_of_item)
+    for name, obj in cases:
+        expected = with_minidom(obj)
+        assert with_writer(obj) == expected
+        print('  %s (%d bytes)' % (name, len(expected)))
+        for label, func in (('as_xml_document().toxml()', with_minidom),
+                            ('write_xml_document', with_writer)):
+            number = 5
+            best = min(timeit.repeat(lambda: func(obj), number=number,
+                                     repeat=3)) / number
+            print('    %-30s %8.1f ms' % (label, best * 1000))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+"""
+Asyncio facade over epub.reader.content (Python 3.7+ only).
+
+Opening an epub file, inflating its items and parsing its XML files can take
+hundreds of milliseconds: this module runs them in a bounded executor, so the
+event loop is never blocked:
+
+    async def read_book(path):
+        async with await open_epub(path) as book:
+            cover = await book.read_item('Text/cover.xhtml')
+            async for item, data in book.iter_spine():
+                ...
+
+By default, epub files are open with `threadsafe=True`, so many items of the
+same epub file can be read at the same time by the executor's threads.
+"""
+
+
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from epub.reader import content
+
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_PENDING = 8
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+
+def get_default_executor():
+    """Return the executor used when none is given, created on first use."""
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = ThreadPoolExecutor(DEFAULT_MAX_WORKERS)
+        return _default_executor
+
+
+async def open_epub(filename, executor=None, max_pending=DEFAULT_MAX_PENDING,
+                    **options):
+    """
+    Open an epub file (and parse its OPF and NCX files) in `executor`, and
+    return an AsyncEpubFile.
+
+    Others keyword arguments are given to epub.reader.content.EpubFile. If
+    the task is cancelled, the epub file is closed once open.
+
+    """
+    options.setdefault('threadsafe', True)
+    executor = executor or get_default_executor()
+    future = executor.submit(_open_epub_file, filename, options)
+    try:
+        epub_file = await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        future.add_done_callback(_close_opened_epub_file)
+        raise
+    return AsyncEpubFile(epub_file, executor, max_pending)
+
+
+class AsyncEpubFile(object):
+    """
+    Wrap an EpubFile, and run its blocking methods in `executor`.
+
+    At most `max_pending` calls of an AsyncEpubFile run (or wait for a worker)
+    in the executor at the same time: others calls wait for their turn in the
+    event loop, so a burst of reads does not fill the executor's queue.
+
+    """
+
+    def __init__(self, epub_file, executor=None,
+                 max_pending=DEFAULT_MAX_PENDING):
+        if max_pending < 1:
+            raise ValueError('max_pending must be at least 1.')
+        self.epub_file = epub_file
+        self.executor = executor or get_default_executor()
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(max_pending)
+
+    @property
+    def opf(self):
+        return self.epub_file.opf
+
+    @property
+    def toc(self):
+        return self.epub_file.toc
+
+    def get_item(self, identifier):
+        return self.epub_file.get_item(identifier)
+
+    def get_item_by_href(self, href):
+        return self.epub_file.get_item_by_href(href)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def read_item(self, item):
+        """Read an item, as EpubFile.read_item."""
+        return await self._run(self.epub_file.read_item, item)
+
+    async def iter_spine(self, prefetch=2):
+        """
+        Iterate over the manifest items of the spine, in reading order, and
+        yield each one with its content.
+
+        At most `prefetch` items are read ahead: the next items are read only
+        when the previous ones are consumed. Pending reads are cancelled when
+        the iteration is stopped.
+
+        """
+        items = iter(self._get_spine_items())
+        pending = deque()
+        try:
+            while True:
+                for item in items:
+                    task = asyncio.ensure_future(self.read_item(item))
+                    pending.append((item, task))
+                    if len(pending) > prefetch:
+                        break
+                if not pending:
+                    break
+                item, task = pending.popleft()
+                yield item, await task
+        finally:
+            for _, task in pending:
+                task.cancel()
+                if task.done() and not task.cancelled():
+                    # Retrieve the exception, as it will never be awaited
+                    task.exception()
+
+    async def close(self):
+        """Wait for the pending calls, and close the epub file."""
+        for _ in range(self.max_pending):
+            await self._semaphore.acquire()
+        try:
+            await asyncio.wrap_future(
+                self.executor.submit(self.epub_file.close))
+        finally:
+            for _ in range(self.max_pending):
+                self._semaphore.release()
+
+    async def _run(self, func, *args):
+        """
+        Run `func` in the executor, once there are less than `max_pending`
+        calls already running. A call cancelled before it is run is removed
+        from the executor's queue.
+
+        """
+        await self._semaphore.acquire()
+        loop = asyncio.get_running_loop()
+        try:
+            future = self.executor.submit(func, *args)
+        except Exception:
+            self._semaphore.release()
+            raise
+
+        def release(future):
+            # The slot is released when the call is really over, even when
+            # the task awaiting it has been cancelled.
+            try:
+                loop.call_soon_threadsafe(self._semaphore.release)
+            except RuntimeError:
+                # The event loop is closed
+                pass
+
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+    def _get_spine_items(self):
+        for idref, linear in self.epub_file.opf.spine.itemrefs:
+            item = self.epub_file.get_item(idref)
+            if item is not None:
+                yield item
+
+
+def _open_epub_file(filename, options):
+    epub_file = content.EpubFile(filename, **options)
+    try:
+        # Parse the OPF and NCX files now, even in lazy mode
+        epub_file.opf
+        epub_file.toc
+    except Exception:
+        epub_file.close()
+        raise
+    return epub_file
+
+
+def _close_opened_epub_file(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
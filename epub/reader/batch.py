@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+"""
+Batch processing of many epub files.
+
+Parsing OPF files is CPU bound: to read the metadata of a whole catalogue,
+iter_metadata opens the epub files in a pool of processes, and yields the
+results as soon as they are available:
+
+    for result in iter_metadata(paths, workers=8):
+        if result.error:
+            print('%s: %s' % (result.path, result.error))
+        else:
+            print(result.metadata.titles)
+"""
+
+
+from collections import namedtuple
+import functools
+import multiprocessing
+
+from epub.reader import content, opf
+
+
+class MetadataResult(namedtuple('MetadataResult',
+                                ['path', 'metadata', 'error'])):
+    """
+    Metadata of the epub file `path`, as an epub.reader.opf.Metadata object,
+    or None if the file can not be read; `error` is then a message describing
+    the error (as "BadZipfile: File is not a zip file"), and None otherwise.
+
+    """
+    __slots__ = ()
+
+
+def iter_metadata(paths, workers=None, chunksize=1, backend=None):
+    """
+    Read the metadata of the epub files `paths`, and yield a MetadataResult
+    for each one of them, in completion order (not in the order of `paths`).
+
+    The files are read by a pool of `workers` processes (by default, the
+    number of CPUs); with `workers` set to 1, they are read in the current
+    process. `chunksize` is the number of paths sent to a worker at once:
+    a bigger one reduces the communication cost for large batches.
+
+    Errors are reported in the results, and never stop the batch.
+
+    """
+    read_metadata = functools.partial(_read_metadata, backend=backend)
+    if workers == 1:
+        for path in paths:
+            yield read_metadata(path)
+        return
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        for result in pool.imap_unordered(read_metadata, paths, chunksize):
+            yield result
+        pool.close()
+    finally:
+        # Also stop the workers when the caller stops the iteration early
+        pool.terminate()
+        pool.join()
+
+
+def _read_metadata(path, backend=None):
+    """
+    Return the MetadataResult of the epub file `path`. Only the container and
+    the metadata of the OPF file are parsed.
+
+    """
+    try:
+        with content.open_epub(path, lazy=True) as book:
+            if not getattr(book, 'opf_path', None):
+                raise content.BadEpubFile('No OPF file found in container')
+            with book.open(book.opf_path) as opf_file:
+                metadata = opf.parse_metadata(opf_file, backend)
+    except Exception as error:
+        message = '%s: %s' % (error.__class__.__name__, error)
+        return MetadataResult(path, None, message)
+    return MetadataResult(path, metadata, None)
@@ -1,17 +1,77 @@
+import threading
+
+try:
+    # Only for Python 2.7+
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+try:
+    from queue import Queue
+except ImportError:
+    from Queue import Queue
+
+from epub.reader import fragment as fragment_index
+
+
 class BookChapter(object):
 
     @property
     def identifier(self):
         return self._manifest_item.identifier
 
-    def __init__(self, book, identifier, fragment=None):
+    @property
+    def fragment(self):
+        return self._fragment
+
+    @property
+    def next(self):
+        """
+        Return the next chapter in reading order, or None.
+        """
+        return self._book.next_chapter(self)
+
+    @property
+    def previous(self):
+        """
+        Return the previous chapter in reading order, or None.
+        """
+        return self._book.previous_chapter(self)
+
+    def __init__(self, book, identifier, fragment=None, position=None):
         self._book = book
         self._manifest_item = self._book.epub_file.get_item(identifier)
         self._fragment = fragment
+        # Position in Book.chapters (None for extra chapters)
+        self.position = position
 
     def read(self):
         return self._book.epub_file.read_item(self._manifest_item)
 
+    def read_fragment(self, fragment=None):
+        """
+        Return the section of the chapter addressed by `fragment` (by default
+        the fragment of the chapter): the element with this id and its
+        following siblings, up to the next one with an id.
+
+        The chapter is streamed, and not parsed again once its fragment index
+        is built. The whole chapter is returned when there is no fragment, or
+        when it is not found.
+
+        """
+        if fragment is None:
+            fragment = self._fragment
+        if not fragment:
+            return self.read()
+
+        offsets = self._book.get_fragment_index(self).get(fragment)
+        if offsets is None:
+            return self.read()
+        start, end = offsets
+        epub_file = self._book.epub_file
+        with epub_file.open_item(self._manifest_item) as stream:
+            return fragment_index.read_range(stream, start, end)
+
 
 class Book(object):
     """
@@ -22,6 +82,11 @@ class Book(object):
 
     def __init__(self, epub_file):
         self.epub_file = epub_file
+        self._spine_state = None
+        self._chapters = []
+        self._extra_chapters = []
+        self._chapters_by_id = {}
+        self._fragment_indexes = {}
 
     @property
     def creators(self):
@@ -95,16 +160,285 @@ class Book(object):
     def chapters(self):
         """
         Return a list of linear chapter from spine.
+
+        The list is built once (and again only if the spine changes), and
+        shared by all calls: it must not be modified.
         """
-        return [BookChapter(self, identifier)
-                for identifier, linear in self.epub_file.opf.spine.itemrefs
-                if linear]
+        self._load_spine()
+        return self._chapters
 
     @property
     def extra_chapters(self):
         """
         Return a list of non-linear chapter from spine.
+
+        As `chapters`, the list is shared and must not be modified.
+        """
+        self._load_spine()
+        return self._extra_chapters
+
+    def chapter_at(self, position):
+        """
+        Return the linear chapter at `position` in reading order.
+
+        Raise an IndexError if there is no such chapter.
+        """
+        self._load_spine()
+        return self._chapters[position]
+
+    def chapter_by_id(self, identifier):
+        """
+        Return the chapter (linear or not) from its manifest identifier, or
+        None if it is not in spine.
+        """
+        self._load_spine()
+        return self._chapters_by_id.get(identifier)
+
+    def next_chapter(self, chapter):
+        """
+        Return the linear chapter following `chapter`, or None if `chapter`
+        is the last one (or an extra chapter).
+        """
+        position = self._get_position(chapter)
+        if position is None or position + 1 >= len(self._chapters):
+            return None
+        return self._chapters[position + 1]
+
+    def previous_chapter(self, chapter):
+        """
+        Return the linear chapter preceding `chapter`, or None if `chapter`
+        is the first one (or an extra chapter).
+        """
+        position = self._get_position(chapter)
+        if position is None or position == 0:
+            return None
+        return self._chapters[position - 1]
+
+    def get_fragment_index(self, chapter):
         """
-        return [BookChapter(self, identifier)
-                for identifier, linear in self.epub_file.opf.spine.itemrefs
-                if not linear]
\ No newline at end of file
+        Return the fragment index of `chapter`: the byte range of the section
+        of each id of its file (see epub.reader.fragment).
+
+        The index is built the first time, and kept for the Book's lifetime.
+
+        """
+        href = chapter._manifest_item.href
+        index = self._fragment_indexes.get(href)
+        if index is None:
+            with self.epub_file.open_item(chapter._manifest_item) as stream:
+                index = fragment_index.build_index(stream)
+            self._fragment_indexes[href] = index
+        return index
+
+    def open_reader(self, prefetch=2, capacity=None):
+        """
+        Return a ChapterReader of this book, to read its chapters in reading
+        order with `prefetch` chapters read ahead.
+        """
+        return ChapterReader(self, prefetch, capacity)
+
+    def _get_position(self, chapter):
+        """
+        Return the position of `chapter` in `chapters`, or None.
+        """
+        self._load_spine()
+        position = chapter.position
+        if position is None:
+            # Extra chapters are not in reading order
+            return None
+        if position < len(self._chapters) and \
+           self._chapters[position] is chapter:
+            return position
+        # A chapter from another Book object, or built before a change
+        chapter = self._chapters_by_id.get(chapter.identifier)
+        if chapter is None:
+            return None
+        return chapter.position
+
+    def _load_spine(self):
+        """
+        Build the chapters from spine, unless it has not changed since they
+        were built.
+        """
+        spine = self.epub_file.opf.spine
+        # Items are usually added to the spine, not replaced: its length is
+        # enough to detect changes.
+        state = self._spine_state
+        if state is not None and state[0] is spine and \
+           state[1] is spine.itemrefs and state[2] == len(spine.itemrefs):
+            return
+
+        chapters = []
+        extra_chapters = []
+        chapters_by_id = {}
+        for identifier, linear in spine.itemrefs:
+            if linear:
+                chapter = BookChapter(self, identifier,
+                                      position=len(chapters))
+                chapters.append(chapter)
+            else:
+                chapter = BookChapter(self, identifier)
+                extra_chapters.append(chapter)
+            chapters_by_id.setdefault(identifier, chapter)
+
+        self._chapters = chapters
+        self._extra_chapters = extra_chapters
+        self._chapters_by_id = chapters_by_id
+        self._spine_state = (spine, spine.itemrefs, len(spine.itemrefs))
+
+
+class ChapterReader(object):
+    """
+    Read the linear chapters of a book, and read ahead the next ones.
+
+    When the chapter at position `i` is read, chapters `i + 1` to
+    `i + prefetch` are read by a background thread, and kept in a cache of
+    `capacity` chapters (by default `2 * prefetch + 1`), so a sequential
+    reading never waits for a chapter to be inflated.
+
+    `hits` counts chapters found in the cache (or being read ahead), with
+    `waits` of them still being read, and `misses` counts chapters read on
+    request. The reader must be closed to stop its thread.
+
+    The thread reads the chapters from the same EpubFile as the caller. This
+    relies on the EpubFile being safe to read from two threads: it is with
+    Python 3 (zipfile shares its file under a lock), with Python 2 when it is
+    open from a path (each read opens the file again), and with `use_mmap` or
+    `threadsafe`. An epub open from a file object with Python 2 must be open
+    with `threadsafe=True`.
+
+    """
+
+    def __init__(self, book, prefetch=2, capacity=None):
+        if prefetch < 0:
+            raise ValueError('prefetch must be positive.')
+        if capacity is None:
+            capacity = 2 * prefetch + 1
+        if capacity < prefetch + 1:
+            raise ValueError('capacity must be greater than prefetch.')
+        self.book = book
+        self.prefetch = prefetch
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.prefetched = 0
+        self._cache = OrderedDict()
+        self._pending = set()
+        self._position = None
+        self._condition = threading.Condition()
+        self._queue = Queue()
+        self._thread = None
+        self._closed = False
+
+    @property
+    def hit_rate(self):
+        """Return the ratio of chapters found in the cache, from 0 to 1."""
+        total = self.hits + self.misses
+        if not total:
+            return 0.0
+        return float(self.hits) / total
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def read(self, chapter):
+        """
+        Return the content of `chapter`, a BookChapter of `book.chapters` or
+        its position, and read ahead the next ones.
+        """
+        if isinstance(chapter, BookChapter):
+            position = self.book._get_position(chapter)
+            if position is None:
+                raise ValueError('Only linear chapters can be read.')
+        else:
+            position = chapter
+            chapter = self.book.chapter_at(position)
+            position = chapter.position
+
+        with self._condition:
+            self._position = position
+            if position in self._pending:
+                self.waits += 1
+                while position in self._pending:
+                    self._condition.wait()
+            data = self._cache.pop(position, None)
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._cache[position] = data
+
+        if data is None:
+            data = chapter.read()
+            with self._condition:
+                self._store(position, data)
+
+        self._schedule(position)
+        return data
+
+    def close(self):
+        """Stop the background thread, and clear the cache."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+        with self._condition:
+            self._cache.clear()
+            self._pending.clear()
+            self._condition.notify_all()
+
+    def _schedule(self, position):
+        """Queue the chapters to read ahead of `position`."""
+        end = min(position + self.prefetch + 1, len(self.book.chapters))
+        with self._condition:
+            if self._closed:
+                return
+            for next_position in range(position + 1, end):
+                if next_position not in self._cache and \
+                   next_position not in self._pending:
+                    self._pending.add(next_position)
+                    self._queue.put(next_position)
+            if self._pending and self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _store(self, position, data):
+        """Add a chapter to the cache. Lock must be held."""
+        self._cache.pop(position, None)
+        self._cache[position] = data
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
+
+    def _run(self):
+        while True:
+            position = self._queue.get()
+            if position is None:
+                break
+            with self._condition:
+                # Skip chapters left behind since they were queued
+                current = self._position
+                if self._closed or not \
+                   current <= position <= current + self.prefetch:
+                    self._pending.discard(position)
+                    self._condition.notify_all()
+                    continue
+            try:
+                data = self.book.chapter_at(position).read()
+            except Exception:
+                # The error is raised again when the chapter is requested
+                data = None
+            with self._condition:
+                self._pending.discard(position)
+                if data is not None and not self._closed:
+                    self._store(position, data)
+                    self.prefetched += 1
+                self._condition.notify_all()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+"""
+Cache of decompressed members of epub files.
+
+Reading an item of an epub file means inflating it again and again; an
+EpubFile open with a MemberCache keeps the content of the most recently read
+items, up to a budget in bytes:
+
+    cache = MemberCache(max_size=64 * 1024 * 1024)
+
+    with open_epub('path/to/book.epub', cache=cache) as book:
+        data = book.read_item('Text/chapter1.xhtml')
+
+The same MemberCache can be shared by many EpubFile (and threads). Members
+are identified by their archive (its path, modification time and size), their
+name and their CRC, so the content of a replaced file is never served.
+"""
+
+
+import os
+import threading
+
+try:
+    # Only for Python 2.7+
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+
+class MemberCache(object):
+    """
+    Keep the content of members up to `max_size` bytes, and discard the least
+    recently used ones when a new one is added.
+
+    Members bigger than `max_item_size` (by default `max_size`) are never
+    kept, so a big image does not evict all the chapters of a book.
+
+    """
+
+    def __init__(self, max_size=32 * 1024 * 1024, max_item_size=None):
+        if max_size < 1:
+            raise ValueError('Cache size must be at least 1 byte.')
+        if max_item_size is None:
+            max_item_size = max_size
+        self.max_size = max_size
+        self.max_item_size = min(max_item_size, max_size)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """
+        Return the content of `key` (and mark it as the most recently used),
+        or None if it is not in the cache.
+
+        """
+        with self._lock:
+            data = self._entries.pop(key, None)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries[key] = data
+            self.hits += 1
+            return data
+
+    def set(self, key, data):
+        """
+        Add the content of `key` to the cache, and evict the least recently
+        used contents to stay in the budget.
+
+        """
+        if len(data) > self.max_item_size:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self._entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_size:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        """Remove all the contents from the cache (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+def get_archive_key(zip_file):
+    """
+    Return a key identifying the archive of `zip_file` (a zipfile.ZipFile),
+    that changes when the file is replaced or modified.
+
+    Archives open from a file object without name get a new key, that is
+    never shared with another archive.
+
+    """
+    filename = zip_file.filename
+    if filename:
+        try:
+            stat = os.stat(filename)
+        except (OSError, TypeError):
+            pass
+        else:
+            return (os.path.abspath(filename), stat.st_mtime, stat.st_size)
+    return (object(),)
+
+
+def get_member_key(archive_key, info):
+    """
+    Return the cache key of the member described by `info` (a
+    zipfile.ZipInfo) in the archive identified by `archive_key`.
+
+    """
+    return archive_key + (info.filename, info.CRC)
@@ -1,11 +1,16 @@
+import io
+import mmap
 import os
+import shutil
+import tempfile
+import threading
 import uuid
 import warnings
-from xml.dom import minidom
 import zipfile
 
-from epub import const, utils
-from epub.reader import ncx, opf
+from epub import const, utils, zipio
+from epub.reader import cache as member_cache
+from epub.reader import ncx, opf, snapshot, xmlbackend
 
 
 def open(filename, mode=None):
@@ -15,8 +20,11 @@ def open(filename, mode=None):
     return open_epub(filename, mode)
 
 
-def open_epub(filename, mode=None):
-    return EpubFile(filename, mode)
+def open_epub(filename, mode=None, lazy=False, use_mmap=False,
+              threadsafe=False, cache=None, snapshots=None,
+              deflate_workers=None):
+    return EpubFile(filename, mode, lazy, use_mmap, threadsafe, cache,
+                    snapshots, deflate_workers)
 
 
 class BadEpubFile(zipfile.BadZipfile):
@@ -46,13 +54,140 @@ class EpubFile(zipfile.ZipFile):
         """
         return os.path.dirname(self.opf_path)
 
-    def __init__(self, filename, mode=None):
+    @property
+    def opf(self):
+        """
+        Return the Opf object of the epub; in lazy mode the OPF file is
+        parsed on first access.
+
+        """
+        if self._opf is None:
+            self._load_opf()
+        return self._opf
+
+    @opf.setter
+    def opf(self, value):
+        self._opf = value
+
+    @property
+    def toc(self):
+        """
+        Return the Ncx object of the epub; in lazy mode the NCX file is
+        parsed on first access.
+
+        """
+        if self._toc is None:
+            self._load_toc()
+        return self._toc
+
+    @toc.setter
+    def toc(self, value):
+        self._toc = value
+
+    @property
+    def uid(self):
+        """
+        Return the unique identifier of the epub, as found in the OPF
+        metadata. It requires the OPF file to be parsed.
+
+        """
+        if self._opf is None:
+            self._load_opf()
+        return self._uid
+
+    @uid.setter
+    def uid(self, value):
+        self._uid = value
+
+    def __init__(self, filename, mode=None, lazy=False, use_mmap=False,
+                 threadsafe=False, cache=None, snapshots=None,
+                 deflate_workers=None):
         """
         Open the Epub zip file with mode read "r", write "w" or append "a".
 
+        With `lazy` set to True, the OPF and NCX files are not parsed when
+        the epub is open, but only on first access to `opf` and `toc`.
+
+        With `use_mmap` set to True (read mode only), the epub file is memory
+        mapped, and its members are read from the map instead of the file
+        object (see also `read_item_buffer`).
+
+        With `threadsafe` set to True (read mode only), items are read with
+        positional reads (`os.pread`) that do not share the file position, so
+        many threads can read items from the same EpubFile at the same time.
+
+        With `cache` (read mode only), the content of the members read is kept
+        in this epub.reader.cache.MemberCache, that can be shared with others
+        EpubFile. `cache` can also be True to use a new MemberCache.
+
+        With `snapshots` (read mode only), the OPF and NCX files are loaded
+        from their snapshot in this epub.reader.snapshot.SnapshotCache (or
+        cache directory) when there is one, and their snapshot is saved once
+        they are parsed otherwise.
+
+        With `deflate_workers` (write modes only), the items added with
+        `add_item` are read and compressed (with `compression`, as without a
+        pool) by a pool of this number of threads (or of the number of CPUs
+        if it is True), then written in the order they were added. mimetype
+        is still the first member, and is stored.
+
         """
         mode = mode or 'r'
+        if use_mmap and mode != 'r':
+            raise ValueError('Memory map is only available in read mode.')
+        if threadsafe and mode != 'r':
+            raise ValueError('Thread-safe reads are only available in read '
+                             'mode.')
+        if cache is True:
+            cache = member_cache.MemberCache()
+        elif cache is False:
+            cache = None
+        if cache is not None and mode != 'r':
+            raise ValueError('Cache is only available in read mode.')
+        if snapshots is not None and mode != 'r':
+            raise ValueError('Snapshots are only available in read mode.')
+        if deflate_workers and mode == 'r':
+            raise ValueError('Parallel deflate is only available in write '
+                             'modes.')
+        if isinstance(snapshots, xmlbackend.string_types):
+            snapshots = snapshot.SnapshotCache(snapshots)
+        self.lazy = lazy
+        self.threadsafe = threadsafe
+        self.cache = cache
+        self.snapshots = snapshots
+        self._archive_key = None
+        self._opf = None
+        self._toc = None
+        self._uid = None
+        self._mmap = None
+        self._checked_members = set()
+        self._local = threading.local()
+        self._local_files = []
+        self._local_files_lock = threading.Lock()
+        self._rebuild_on_close = False
+        self._deflate_pool = None
         zipfile.ZipFile.__init__(self, filename, mode)
+        try:
+            self._init(use_mmap, threadsafe, deflate_workers)
+        except BaseException:
+            # Nothing has been added yet: the files are closed without
+            # writing the container, OPF and NCX files.
+            self._close_files()
+            raise
+
+    def _init(self, use_mmap, threadsafe, deflate_workers):
+        """
+        Prepare the reads and writes of the open archive, and parse its
+        container (and its OPF and NCX files unless in lazy mode).
+
+        """
+        if self.cache is not None:
+            self._archive_key = member_cache.get_archive_key(self)
+
+        if use_mmap:
+            self._init_mmap()
+        elif threadsafe:
+            self._init_pread()
 
         if self.mode == 'r':
             self._init_read()
@@ -63,6 +198,83 @@ class EpubFile(zipfile.ZipFile):
                 self._init_new()
             else:
                 self._init_read()
+                # Rebuilt on close, to replace its container, OPF and NCX
+                self._rebuild_on_close = not self._filePassed
+
+        if deflate_workers:
+            if deflate_workers is True:
+                deflate_workers = None
+            self._deflate_pool = zipio.DeflatePool(self, deflate_workers)
+
+    def _init_mmap(self):
+        """
+        Map the epub file in memory.
+
+        """
+        try:
+            fileno = self.fp.fileno()
+        except (AttributeError, IOError, ValueError):
+            raise ValueError('Memory map is only available for local files.')
+        self._mmap = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+
+    def _init_pread(self):
+        """
+        Prepare positional reads of the epub file, with os.pread when it is
+        available, or with one file object per thread otherwise.
+
+        """
+        try:
+            self._fileno = self.fp.fileno()
+        except (AttributeError, IOError, ValueError):
+            raise ValueError('Thread-safe reads are only available for local '
+                             'files.')
+        if hasattr(os, 'pread'):
+            self._pread = self._pread_fileno
+        else:
+            self._pread = self._pread_local_file
+
+    def _read_at(self, offset, size):
+        """
+        Return `size` bytes at `offset` in the epub file, from the memory map,
+        with a positional read, or from the file object otherwise.
+
+        """
+        if self._mmap is not None:
+            return self._mmap[offset:offset + size]
+        if self.threadsafe:
+            return self._pread(offset, size)
+        # The file object is shared with the members open by zipfile, under
+        # a lock (Python 3)
+        lock = getattr(self, '_lock', None)
+        if lock is None:
+            self.fp.seek(offset)
+            return self.fp.read(size)
+        with lock:
+            self.fp.seek(offset)
+            return self.fp.read(size)
+
+    def _pread_fileno(self, offset, size):
+        chunks = []
+        while size > 0:
+            chunk = os.pread(self._fileno, size, offset)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            offset += len(chunk)
+            size -= len(chunk)
+        if len(chunks) == 1:
+            return chunks[0]
+        return b''.join(chunks)
+
+    def _pread_local_file(self, offset, size):
+        local_file = getattr(self._local, 'file', None)
+        if local_file is None:
+            local_file = io.open(self.filename, 'rb')
+            self._local.file = local_file
+            with self._local_files_lock:
+                self._local_files.append(local_file)
+        local_file.seek(offset)
+        return local_file.read(size)
 
     def _init_new(self):
         """
@@ -75,34 +287,64 @@ class EpubFile(zipfile.ZipFile):
         self.opf_path = const.OPF_PATH
         # Uid & Uid's id
         uid_id = 'BookId'
-        self.uid = '%s' % uuid.uuid4()
+        uid = '%s' % uuid.uuid4()
         # Create metadata, manifest, and spine, as minimalist as possible
         metadata = opf.Metadata()
-        metadata.add_identifier(self.uid, uid_id, 'uid')
+        metadata.add_identifier(uid, uid_id, 'uid')
         manifest = opf.Manifest()
         manifest.add_item('ncx', 'toc.ncx', const.MIMETYPE_NCX)
         spine = opf.Spine('ncx')
         # Create Opf object
         self.opf = opf.Opf(uid_id=uid_id,
                            metadata=metadata, manifest=manifest, spine=spine)
+        self.uid = uid
         # Create Ncx object
         self.toc = ncx.Ncx()
-        self.toc.uid = self.uid
+        self.toc.uid = uid
 
     def _init_read(self):
         # Read container.xml to get OPF xml file path
-        xmlstring = self.read('META-INF/container.xml')
-        container_xml = minidom.parseString(xmlstring).documentElement
+        xmlstring = self._read_member(const.CONTAINER_PATH)
+        container_xml = xmlbackend.parse(xmlstring)
 
-        for e in container_xml.getElementsByTagName('rootfile'):
-            if e.getAttribute('media-type') == const.MIMETYPE_OPF:
+        for e in xmlbackend.get_elements_by_name(container_xml, 'rootfile'):
+            media_type = xmlbackend.get_attribute(e, 'media-type')
+            if media_type == const.MIMETYPE_OPF:
                 # Only take the first full-path available
-                self.opf_path = e.getAttribute('full-path')
+                self.opf_path = xmlbackend.get_attribute(e, 'full-path')
                 break
 
-        # Read OPF xml file
-        xml_string = self.read(self.opf_path)
-        self.opf = opf.parse_opf(xml_string)
+        if not self.lazy:
+            self._load_opf()
+            if self._toc is None:
+                self._load_toc()
+
+    def _load_opf(self):
+        """
+        Parse the OPF file and set `opf` and `uid` attributes.
+
+        With snapshots, the `toc` attribute is set too when the snapshot of
+        the epub is loaded instead (if it holds the Ncx object). Otherwise,
+        the snapshot is saved once the OPF file is parsed, unless the NCX file
+        is about to be parsed too (see `_init_read`): metadata-only lazy opens
+        get a snapshot as well.
+
+        """
+        if self.snapshots is not None:
+            result = self.snapshots.load(self)
+            if result is not None:
+                self._set_opf(result[0])
+                if result[1] is not None:
+                    self.toc = result[1]
+                return
+
+        xml_string = self._read_member(self.opf_path)
+        self._set_opf(opf.parse_opf(xml_string))
+        if self.lazy:
+            self._save_snapshot()
+
+    def _set_opf(self, value):
+        self.opf = value
         uids = [x for x in self.opf.metadata.identifiers
                       if x[1] == self.opf.uid_id]
         if uids:
@@ -111,10 +353,13 @@ class EpubFile(zipfile.ZipFile):
             self.uid = None
             warnings.warn('The ePub does not define any uid', SyntaxWarning)
 
+    def _load_toc(self):
+        """
+        Parse the NCX file (as defined by the spine) and set `toc` attribute.
+
+        """
         item_toc = self.get_item(self.opf.spine.toc)
 
-        # Inspect NCX toc file
-        self.toc = None
         if item_toc is not None:
             self.toc = ncx.parse_toc(self.read_item(item_toc))
         else:
@@ -123,11 +368,61 @@ class EpubFile(zipfile.ZipFile):
             self.toc = ncx.Ncx()
             self.toc.uid = self.uid
 
+        self._save_snapshot()
+
+    def _save_snapshot(self):
+        """
+        Save the snapshot of the Opf object, and of the Ncx object if it is
+        already parsed.
+
+        """
+        if self.snapshots is None:
+            return
+        try:
+            self.snapshots.save(self, self.opf, self._toc)
+        except (IOError, OSError, RuntimeError) as error:
+            # The epub file is still usable without its snapshot (that
+            # can not be pickled if its navPoints are too deeply nested)
+            warnings.warn('Can not save the snapshot: %s' % error,
+                          RuntimeWarning)
+
     def close(self):
         if self.fp is None:
             return
-        if self.mode in ('w', 'a'):
-            self._write_close()
+        rebuilt_path = None
+        try:
+            if self._deflate_pool is not None:
+                try:
+                    self._deflate_pool.close()
+                finally:
+                    self._deflate_pool = None
+            if self._rebuild_on_close:
+                rebuilt_path = self._rebuild_close()
+            elif self.mode in ('w', 'a'):
+                self._write_close()
+        finally:
+            self._close_files()
+        if rebuilt_path is not None:
+            self._replace_with_rebuilt(rebuilt_path)
+
+    def _close_files(self):
+        """
+        Close the memory map, the files of positional reads, and the epub
+        file itself.
+
+        """
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Buffers from read_item_buffer are still in use: the map
+                # will be closed when they are released.
+                pass
+            self._mmap = None
+        with self._local_files_lock:
+            for local_file in self._local_files:
+                local_file.close()
+            del self._local_files[:]
         zipfile.ZipFile.close(self)
 
     def _write_close(self):
@@ -136,17 +431,172 @@ class EpubFile(zipfile.ZipFile):
         file mode (a), some files must be generated: container, OPF, and NCX.
 
         """
-        # Write META-INF/container.xml
-        self.writestr('META-INF/container.xml',
-                      self._build_container().encode('utf-8'))
-        # Write OPF File
-        self.writestr(self.opf_path,
-                      self.opf.as_xml_document().toxml().encode('utf-8'))
-        # Write NCX File if exist
+        for path, data in self._get_generated_members():
+            self.writestr(path, data)
+
+    def _rebuild_close(self):
+        """
+        Handle writes when closing an epub open in append mode (a): its
+        container, OPF and NCX files can not be replaced in place, so the
+        archive is rebuilt, once, in a new file. Return the path of this new
+        file, or None if nothing changed.
+
+        The other members are copied with their raw data, without being
+        decompressed and compressed again; only the last one is kept for
+        members added more than once, so the archive does not grow with
+        duplicate members on each edit.
+
+        """
+        generated = self._get_generated_members()
+        if not self._didModify and all(
+                path in self.NameToInfo and self.read(path) == data
+                for path, data in generated):
+            return None
+
+        try:
+            return self._write_temporary_archive(self.filename, generated)
+        except Exception:
+            # The epub file is completed as it would be without rebuild
+            self._write_close()
+            raise
+
+    def _replace_with_rebuilt(self, rebuilt_path):
+        """
+        Replace the epub file, once closed, by its rebuilt archive.
+
+        Until then, the epub file is still a valid archive (zipfile writes
+        its central directory on close if members were added): if it can not
+        be replaced, the generated members are appended to it instead, as
+        without rebuild.
+
+        """
+        try:
+            utils.replace_file(rebuilt_path, self.filename)
+        except Exception:
+            os.remove(rebuilt_path)
+            with zipfile.ZipFile(self.filename, 'a',
+                                 self.compression) as original:
+                for path, data in self._get_generated_members():
+                    original.writestr(path, data)
+            raise
+
+    def _write_temporary_archive(self, filename, generated):
+        """
+        Write a new archive with the `generated` members (as returned by
+        `_get_generated_members`) and the raw copy of the others, in a
+        temporary file next to `filename`. Return the path of this file.
+
+        """
+        self._flush_deflate_pool()
+        generated_paths = set(path for path, data in generated)
+        infos = [info for info in self.infolist()
+                 if self.NameToInfo[info.filename] is info and
+                 info.filename not in generated_paths]
+        # mimetype must be the first member of the archive
+        infos.sort(key=lambda info: info.filename != 'mimetype')
+
+        fd, archive_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(filename)), suffix='.tmp')
+        os.close(fd)
+        try:
+            # Same permissions as the file replaced, or as the source file
+            if os.path.exists(filename):
+                shutil.copymode(filename, archive_path)
+            elif not self._filePassed:
+                shutil.copymode(self.filename, archive_path)
+            with zipfile.ZipFile(archive_path, 'w',
+                                 self.compression) as archive:
+                archive.comment = self.comment
+                for info in infos:
+                    self.copy_member(info, archive)
+                for path, data in generated:
+                    archive.writestr(path, data)
+        except Exception:
+            os.remove(archive_path)
+            raise
+        return archive_path
+
+    def save_as(self, filename):
+        """
+        Save the epub to a new file `filename`, with its OPF and NCX files
+        generated from `opf` and `toc` (as on close in write mode).
+
+        The other members are copied with their raw data, as by
+        `copy_member`: changing only the metadata of an epub and saving it
+        costs no compression. The epub is still open afterwards, and its
+        file is unchanged (unless `filename` is its own path).
+
+        Raise RuntimeError if the epub is already closed.
+
+        """
+        if not self.fp:
+            raise RuntimeError(
+                'Attempt to save EPUB file that was already closed')
+        archive_path = self._write_temporary_archive(
+            filename, self._get_generated_members())
+        try:
+            utils.replace_file(archive_path, filename)
+        except Exception:
+            os.remove(archive_path)
+            raise
+
+    def copy_member(self, member, target):
+        """
+        Copy the member `member` of the archive (its path, or its ZipInfo)
+        to `target`, a zipfile.ZipFile (or EpubFile) open for writing, and
+        return its new ZipInfo.
+
+        The member is copied byte for byte: its compressed data and its CRC
+        are written as is, without being decompressed and compressed again.
+        For an EpubFile, the manifest of `target` is not updated.
+
+        """
+        self._flush_deflate_pool()
+        if isinstance(member, zipfile.ZipInfo):
+            info = member
+        else:
+            info = self.getinfo(member)
+        return zipio.write_raw(target, info,
+                               zipio.read_raw(self._read_at, info))
+
+    def infolist(self):
+        self._flush_deflate_pool()
+        return zipfile.ZipFile.infolist(self)
+
+    def namelist(self):
+        self._flush_deflate_pool()
+        return zipfile.ZipFile.namelist(self)
+
+    def _flush_deflate_pool(self):
+        """
+        Write the items still deflated by the pool (with `deflate_workers`),
+        so that they are members of the archive.
+
+        """
+        if self._deflate_pool is not None:
+            self._deflate_pool.flush()
+
+    def _get_generated_members(self):
+        """
+        Return the members generated from the epub objects, as a list of
+        (path, data): container, OPF, and NCX (if the spine defines one).
+
+        """
+        # META-INF/container.xml
+        members = [('META-INF/container.xml',
+                    self._build_container().encode('utf-8'))]
+        # OPF File
+        buffer = io.BytesIO()
+        self.opf.write_xml_document(buffer)
+        members.append((self.opf_path, buffer.getvalue()))
+        # NCX File if exist
         item_toc = self.get_item(self.opf.spine.toc)
         if item_toc:
-            self.writestr(os.path.join(self.content_path, item_toc.href),
-                          self.toc.as_xml_document().toxml().encode('utf-8'))
+            buffer = io.BytesIO()
+            self.toc.write_xml_document(buffer)
+            members.append((os.path.join(self.content_path, item_toc.href),
+                            buffer.getvalue()))
+        return members
 
     def _build_container(self):
         template = """<?xml version="1.0" encoding="UTF-8"?>
@@ -173,8 +623,11 @@ class EpubFile(zipfile.ZipFile):
         """
         self.check_mode_write()
         self.opf.manifest.append(manifest_item)
-        self.write(filename, os.path.join(self.content_path,
-                                          manifest_item.href))
+        arcname = os.path.join(self.content_path, manifest_item.href)
+        if self._deflate_pool is not None:
+            self._deflate_pool.write(filename, arcname, self.compression)
+        else:
+            self.write(filename, arcname)
         if append_to_spine:
             self.opf.spine.add_itemref(manifest_item.identifier, is_linear)
 
@@ -202,11 +655,7 @@ class EpubFile(zipfile.ZipFile):
         Extract an item from its href in epub archive to `to_path` location.
 
         """
-        path = item
-        if hasattr(item, 'href'):
-            path = item.href
-        return  self.extract(member=os.path.join(self.content_path, path),
-                             path=to_path)
+        return self.extract(member=self._get_item_path(item), path=to_path)
 
     def get_item(self, identifier):
         """
@@ -219,19 +668,14 @@ class EpubFile(zipfile.ZipFile):
 
     def get_item_by_href(self, href):
         """
-        Get an item from manifest through its "href" attribute.
+        Get an item from manifest through its "href" attribute. The href is
+        normalized (see epub.utils.normalize_href) and url fragment ignored.
 
-        Return an EpubManifestItem if found, else None.
+        Return an EpubManifestItem if found, else None. Raise a LookupError if
+        many items are found with this href.
 
         """
-        l = [x for x in self.opf.manifest.values() if x.href == href]
-        size = len(l)
-        if size == 1:
-            return l[0]
-        elif size > 1:
-            raise LookupError('Multiple items are found with this href.')
-        else:
-            return None
+        return self.opf.manifest.get_by_href(href)
 
     # read method is zipfile.ZipFile.read(path)
 
@@ -246,7 +690,80 @@ class EpubFile(zipfile.ZipFile):
         as indicated in the opf file.
 
         """
+        return self._read_member(self._get_item_path(item))
+
+    def open_item(self, item):
+        """
+        Open a file from the epub zipfile container, and return a file-like
+        object to read its content by chunks, without loading it in memory.
+
+        "item" parameter can be the relative path to the opf file or an
+        EpubManifestItem object, as for `read_item`.
+
+        """
+        return self.open(self._get_item_path(item))
+
+    def read_item_buffer(self, item):
+        """
+        Read a file from the epub zipfile container, and return its content
+        as a memoryview.
+
+        When the epub is memory mapped (`use_mmap`) and the file is stored
+        without compression (as images and fonts usually are), the memoryview
+        is a slice of the map: the content is not copied. Its CRC is checked
+        the first time it is read.
+
+        Otherwise, the content is read as by `read_item`.
+
+        """
+        path = self._get_item_path(item)
+        if self._mmap is not None:
+            info = self.getinfo(path)
+            if (info.compress_type == zipfile.ZIP_STORED and
+                    zipio.is_readable(info)):
+                offset = zipio.get_data_offset(self._read_at, info)
+                view = memoryview(self._mmap)[offset:offset + info.file_size]
+                if path not in self._checked_members:
+                    zipio.check_crc(info, view)
+                    self._checked_members.add(path)
+                return view
+        return memoryview(self._read_member(path))
+
+    def _read_member(self, path):
+        """
+        Return the content of the member `path` of the archive, from the cache
+        if there is one.
+
+        """
+        if self.cache is None:
+            return self._read_member_data(path)
+        key = member_cache.get_member_key(self._archive_key,
+                                          self.getinfo(path))
+        data = self.cache.get(key)
+        if data is None:
+            data = self._read_member_data(path)
+            self.cache.set(key, data)
+        return data
+
+    def _read_member_data(self, path):
+        if self._mmap is not None or self.threadsafe:
+            info = self.getinfo(path)
+            if zipio.is_readable(info):
+                raw = zipio.read_raw(self._read_at, info)
+                return zipio.decompress(info, raw)
+        return self.read(path)
+
+    def _get_item_path(self, item):
+        """
+        Return the path in the archive of an item, given as an
+        EpubManifestItem or a path relative to the opf file.
+
+        Items still deflated by the pool are written first, so that they can
+        be read.
+
+        """
+        self._flush_deflate_pool()
         path = item
         if hasattr(item, 'href'):
             path = item.href
-        return self.read(os.path.join(self.content_path, path))
\ No newline at end of file
+        return os.path.join(self.content_path, path)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+"""
+Read the sections of an XHTML file addressed by a fragment identifier.
+
+Entries of a table of content often point into a file (`chapter.xhtml#part2`)
+that can be very big for books made of a single file. A fragment index maps
+each id of a file to the byte range of its section: the element with this id,
+and its following siblings up to the next one with an id (or the end of their
+parent). It is built by streaming the file once through expat:
+
+    with book.open_item(item) as stream:
+        index = build_index(stream)
+
+    start, end = index['part2']
+    with book.open_item(item) as stream:
+        section = read_range(stream, start, end)
+
+Only the bytes up to the end of the section are inflated to read it, and the
+file is never kept in memory as a whole.
+"""
+
+
+from xml.parsers import expat
+
+
+CHUNK_SIZE = 64 * 1024
+
+ID_ATTRIBUTES = ('id', 'xml:id')
+
+
+class _IndexBuilder(object):
+    """
+    Expat handlers that build a fragment index.
+
+    Each open element has a slot on a stack for the id of its child section
+    still open: a section ends where the next child with an id starts, or
+    where its parent ends.
+
+    """
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.index = {}
+        self.stack = []
+        parser.StartElementHandler = self.start_element
+        parser.EndElementHandler = self.end_element
+
+    def start_element(self, name, attributes):
+        offset = self.parser.CurrentByteIndex
+        identifier = None
+        for attribute in ID_ATTRIBUTES:
+            identifier = attributes.get(attribute)
+            if identifier:
+                break
+
+        if identifier and identifier not in self.index:
+            if self.stack:
+                self.close_section(offset)
+                self.stack[-1] = identifier
+            self.index[identifier] = [offset, None]
+        self.stack.append(None)
+
+    def end_element(self, name):
+        self.close_section(self.parser.CurrentByteIndex)
+        self.stack.pop()
+
+    def close_section(self, offset):
+        identifier = self.stack[-1]
+        if identifier is not None:
+            self.index[identifier][1] = offset
+            self.stack[-1] = None
+
+
+def build_index(stream, chunk_size=CHUNK_SIZE):
+    """
+    Return the fragment index of an XHTML file read from `stream`: a dict of
+    its ids, with the (start, end) byte offsets of their sections.
+
+    `end` is None for a section that ends with the file. Undefined entities
+    (HTML ones, without their DTD) are skipped. If the file is not
+    well-formed XML, ids found before the error are not indexed either, and
+    an empty dict is returned.
+
+    """
+    parser = expat.ParserCreate()
+    # HTML entities (as `&nbsp;` in an EPUB 3 file with `<!DOCTYPE html>`)
+    # are declared in a DTD that is not read: as with an external DTD,
+    # undefined entities are then skipped instead of being errors.
+    parser.UseForeignDTD(True)
+    builder = _IndexBuilder(parser)
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            parser.Parse(chunk, False)
+        parser.Parse(b'', True)
+    except expat.ExpatError:
+        return {}
+    return dict((identifier, tuple(offsets))
+                for identifier, offsets in builder.index.items())
+
+
+def read_range(stream, start, end=None, chunk_size=CHUNK_SIZE):
+    """
+    Return the bytes of `stream` from offset `start` to `end` (or to the end
+    of the stream if `end` is None), reading it by chunks.
+
+    """
+    position = 0
+    while position < start:
+        skipped = stream.read(min(chunk_size, start - position))
+        if not skipped:
+            return b''
+        position += len(skipped)
+    if end is None:
+        return stream.read()
+    return stream.read(end - start)
@@ -13,15 +13,148 @@ NCX Epub spec: http://idpf.org/epub/20/spec/OPF_2.0.1_draft.htm#Section2.4.1
 """
 
 
+from bisect import bisect_right
+import io
 from xml.dom import minidom
+from xml.etree import ElementTree
+from xml.parsers import expat
 
+from epub.reader import xmlbackend
+from epub.reader.xmlwriter import XmlWriter
+from epub.utils import intern_string, keep_string, normalize_href
 
-def parse_toc(xmlstring):
-    """Inspect an NCX formated xml document."""
+
+# Only for Python 3.4+: without it, deferred lists are iterated with iterparse
+_XMLPullParser = getattr(ElementTree, 'XMLPullParser', None)
+
+
+def parse_toc(xmlstring, backend=None, intern_strings=True, deferred=False):
+    """Inspect an NCX formated xml document.
+
+    `backend` is the name of the XML backend to use (see
+    epub.reader.xmlbackend), by default the fastest one available.
+
+    With `intern_strings`, repeated values (classes, languages, page types,
+    ...) are interned (see epub.utils.intern_string).
+
+    With `deferred`, the <pageList> and <navList> elements are only located
+    by a first scan of the document, and each one is parsed the first time
+    its content is accessed (see DeferredPageList and DeferredNavList).
+    """
+    intern_value = intern_string if intern_strings else keep_string
+    if deferred:
+        return _parse_deferred_toc(xmlstring, backend, intern_value)
+    toc_xml = xmlbackend.parse(xmlstring, backend)
+    if xmlbackend.is_dom(toc_xml):
+        return _parse_xml_toc(toc_xml, intern_value)
+    return _parse_etree_toc(toc_xml, intern_value)
+
+
+def _parse_deferred_toc(xmlstring, backend=None, intern_value=keep_string):
+    """Inspect an NCX formated xml document, without its <pageList> and
+    <navList> elements, replaced by deferred objects."""
+    is_text = not isinstance(xmlstring, bytes)
+    data = xmlstring.encode('utf-8') if is_text else xmlstring
+
+    scanner = _DeferredScanner(data, is_text)
+    if not scanner.ranges:
+        # Nothing to defer, or the document is not well-formed and the
+        # backend reports the error
+        return parse_toc(xmlstring, backend, intern_value is intern_string)
+
+    parts = []
+    position = 0
+    for name, start, end in scanner.ranges:
+        parts.append(data[position:start])
+        position = end
+    parts.append(data[position:])
+    toc = parse_toc(scanner.get_text(b''.join(parts)), backend,
+                    intern_value is intern_string)
+
+    for name, start, end in scanner.ranges:
+        source = scanner.get_source(start, end)
+        if name == 'pageList':
+            toc.page_list = DeferredPageList(source, backend, intern_value)
+        else:
+            toc.add_nav_list(DeferredNavList(source, backend, intern_value))
+    return toc
+
+
+class _DeferredScanner(object):
+    """
+    Scan an NCX document with expat to find the byte ranges of its
+    <pageList> and <navList> elements.
+
+    Each one becomes a standalone source: the document's prolog and <ncx>
+    start tag (for its encoding, entities and namespaces), the element, and
+    the </ncx> end tag.
+
+    """
+
+    def __init__(self, data, is_text=False):
+        self.data = data
+        self.is_text = is_text
+        self.ranges = []
+        self.prolog_end = None
+        self.root_name = None
+        self._depth = 0
+        self._start = None
+
+        if is_text:
+            # The data has been encoded as UTF-8, whatever it declares
+            self.parser = expat.ParserCreate('utf-8')
+        else:
+            self.parser = expat.ParserCreate()
+        self.parser.StartElementHandler = self.start_element
+        self.parser.EndElementHandler = self.end_element
+        try:
+            self.parser.Parse(data, True)
+        except expat.ExpatError:
+            self.ranges = []
+
+    def start_element(self, name, attributes):
+        self._depth += 1
+        if self._depth == 1:
+            self.root_name = name
+        elif self._depth == 2:
+            offset = self.parser.CurrentByteIndex
+            if self.prolog_end is None:
+                self.prolog_end = offset
+            local_name = name.rsplit(':', 1)[-1]
+            if local_name in ('pageList', 'navList'):
+                self._start = (local_name, offset)
+
+    def end_element(self, name):
+        if self._depth == 2 and self._start is not None:
+            local_name, start = self._start
+            self._start = None
+            offset = self.parser.CurrentByteIndex
+            # The end tag starts at offset, but for empty elements
+            # (<pageList/>), that are not worth deferring anyway.
+            end_tag = ('</%s' % name).encode('utf-8')
+            if self.data.startswith(end_tag, offset):
+                end = self.data.index(b'>', offset) + 1
+                self.ranges.append((local_name, start, end))
+        self._depth -= 1
+
+    def get_text(self, data):
+        if self.is_text:
+            return data.decode('utf-8')
+        return data
+
+    def get_source(self, start, end):
+        """Return the standalone source of the element at start:end."""
+        end_tag = ('</%s>' % self.root_name).encode('utf-8')
+        return (self.get_text(self.data[:self.prolog_end]),
+                self.get_text(self.data[start:end]),
+                self.get_text(end_tag))
+
+
+def _parse_xml_toc(toc_xml, intern_value=keep_string):
+    """Inspect an xml.dom.Element <ncx> and return a Ncx object."""
     toc = Ncx()
-    toc_xml = minidom.parseString(xmlstring).documentElement
 
-    xmlns = toc_xml.getAttribute('xmlns')
+    xmlns = toc_xml.namespaceURI
     if xmlns:
         toc.xmlns = xmlns
 
@@ -33,16 +166,37 @@ def parse_toc(xmlstring):
     if lang:
         toc.lang = lang
 
-    # Inspect head > meta; unknow meta are ignored
-    head = toc_xml.getElementsByTagName('head')[0]
+    # Each part of the NCX is a child of <ncx>: getElementsByTagName would
+    # walk the whole document (recursively), navPoints included.
     metas = {'dtb:uid': '',
              'dtb:depth': '',
              'dtb:totalPageCount': '',
              'dtb:maxPageNumber': '',
              'dtb:generator': ''}
+    heads = []
+    doc_titles = []
+    nav_maps = []
+    page_lists = []
+    for node in _iter_xml_children(toc_xml):
+        if node.localName == 'head':
+            heads.append(node)
+        elif node.localName == 'docTitle':
+            doc_titles.append(node)
+        elif node.localName == 'docAuthor':
+            # Get authors (<docAuthor> tags are optionnal)
+            toc.authors.append(_parse_for_text_tag(node))
+        elif node.localName == 'navMap':
+            nav_maps.append(node)
+        elif node.localName == 'pageList':
+            page_lists.append(node)
+        elif node.localName == 'navList':
+            # Inspect <navList> (optionnal, many are possible)
+            toc.add_nav_list(_parse_xml_nav_list(node, intern_value))
 
-    for meta in head.getElementsByTagName('meta'):
-        metas[meta.getAttribute('name')] = meta.getAttribute('content')
+    # Inspect head > meta; unknow meta are ignored
+    for head in heads:
+        for meta in head.getElementsByTagNameNS('*', 'meta'):
+            metas[meta.getAttribute('name')] = meta.getAttribute('content')
 
     toc.uid = metas['dtb:uid']
     toc.depth = metas['dtb:depth']
@@ -50,161 +204,227 @@ def parse_toc(xmlstring):
     toc.max_page_number = metas['dtb:maxPageNumber']
     toc.generator = metas['dtb:generator']
 
-    # Get title (one and only one <docTitle> tag is required)
-    doc_title_node = toc_xml.getElementsByTagName('docTitle')[0]
-    toc.title = _parse_for_text_tag(doc_title_node)
+    # Get title (one and only one <docTitle> tag is required, but a missing
+    # one is ignored, as with the others backends)
+    if doc_titles:
+        toc.title = _parse_for_text_tag(doc_titles[0])
 
-    # Get authors (<docAuthor> tags are optionnal)
-    for author in toc_xml.getElementsByTagName('docAuthor'):
-        toc.authors.append(_parse_for_text_tag(author))
-
-    # Inspect <navMap> (one is required)
-    nav_map_node = toc_xml.getElementsByTagName('navMap')[0]
-    toc.nav_map = _parse_xml_nav_map(nav_map_node)
+    # Inspect <navMap> (one is required, but a missing one is ignored)
+    if nav_maps:
+        toc.nav_map = _parse_xml_nav_map(nav_maps[0], intern_value)
 
     # Inspect <pageList> (optionnal, only one)
-    page_lists = toc_xml.getElementsByTagName('pageList')
     if len(page_lists) > 0:
-        toc.page_list = _parse_xml_page_list(page_lists[0])
+        toc.page_list = _parse_xml_page_list(page_lists[0], intern_value)
+
+    return toc
+
+
+def _parse_etree_toc(toc_xml, intern_value=keep_string):
+    """Inspect an ElementTree element <ncx> and return a Ncx object."""
+    toc = Ncx()
+
+    xmlns = xmlbackend.get_namespace(toc_xml.tag)
+    if xmlns:
+        toc.xmlns = xmlns
 
-    # Inspect <navList> (optionnal, many are possible)
-    for nav_list in toc_xml.getElementsByTagName('navList'):
-        toc.add_nav_list(_parse_xml_nav_list(nav_list))
+    version = toc_xml.get('version')
+    if version:
+        toc.version = version
+
+    lang = toc_xml.get(xmlbackend.XML_LANG)
+    if lang:
+        toc.lang = lang
+
+    # Each part of the NCX is a child of <ncx>: all of them are inspected
+    # with one walk over its children. As with minidom, only the first
+    # <docTitle>, <navMap> and <pageList> are used, and missing ones are
+    # ignored.
+    metas = {'dtb:uid': '',
+             'dtb:depth': '',
+             'dtb:totalPageCount': '',
+             'dtb:maxPageNumber': '',
+             'dtb:generator': ''}
+    found = set()
+    for name, node in xmlbackend.iter_children(toc_xml):
+        if name == 'head':
+            # Inspect head > meta; unknow meta are ignored
+            for meta_name, meta in xmlbackend.iter_descendants(node):
+                if meta_name == 'meta':
+                    metas[meta.get('name', '')] = meta.get('content', '')
+        elif name == 'docAuthor':
+            toc.authors.append(_parse_etree_text_tag(node))
+        elif name == 'navList':
+            toc.add_nav_list(_parse_etree_nav_list(node, intern_value))
+        elif name in found:
+            continue
+        elif name == 'docTitle':
+            found.add(name)
+            toc.title = _parse_etree_text_tag(node)
+        elif name == 'navMap':
+            found.add(name)
+            toc.nav_map = _parse_etree_nav_map(node, intern_value)
+        elif name == 'pageList':
+            found.add(name)
+            toc.page_list = _parse_etree_page_list(node, intern_value)
+
+    toc.uid = metas['dtb:uid']
+    toc.depth = metas['dtb:depth']
+    toc.total_page_count = metas['dtb:totalPageCount']
+    toc.max_page_number = metas['dtb:maxPageNumber']
+    toc.generator = metas['dtb:generator']
 
     return toc
 
 
-def _parse_xml_nav_map(element):
+def _parse_xml_nav_map(element, intern_value=keep_string):
     """Inspect an xml.dom.Element <navMap> and return a NcxNavMap object."""
     nav_map = NavMap()
     nav_map.identifier = element.getAttribute('id')
 
     children = [e for e in element.childNodes if e.nodeType == e.ELEMENT_NODE]
     for node in children:
-        if node.tagName == 'navLabel':
+        if node.localName == 'navLabel':
             nav_map.add_label(_parse_for_text_tag(node),
-                              node.getAttribute('xml:lang'),
-                              node.getAttribute('dir'))
-        elif node.tagName == 'navInfo':
+                              intern_value(node.getAttribute('xml:lang')),
+                              intern_value(node.getAttribute('dir')))
+        elif node.localName == 'navInfo':
             nav_map.add_info(_parse_for_text_tag(node),
-                             node.getAttribute('xml:lang'),
-                             node.getAttribute('dir'))
-        elif node.tagName == 'navPoint':
-            nav_map.add_point(_parse_xml_nav_point(node))
+                             intern_value(node.getAttribute('xml:lang')),
+                             intern_value(node.getAttribute('dir')))
+        elif node.localName == 'navPoint':
+            nav_map.add_point(_parse_xml_nav_point(node, intern_value))
 
     return nav_map
 
 
-def _parse_xml_nav_point(element):
+def _parse_xml_nav_point(element, intern_value=keep_string):
     """Inspect an xml.dom.Element <navPoint> and return a NcxNavPoint object.
-    """
-    nav_point = NavPoint()
-    nav_point.identifier = element.getAttribute('id')
-    nav_point.class_name = element.getAttribute('class')
-    nav_point.playOrder = element.getAttribute('playOrder')
-
-    children = [e for e in element.childNodes if e.nodeType == e.ELEMENT_NODE]
-    for node in children:
-        if node.tagName == 'navLabel':
-            nav_point.add_label(_parse_for_text_tag(node),
-                                node.getAttribute('xml:lang'),
-                                node.getAttribute('dir'))
-        elif node.tagName == 'content':
-            nav_point.src = node.getAttribute('src')
-        elif node.tagName == 'navPoint':
-            nav_point.add_point(_parse_xml_nav_point(node))
-
-    return nav_point
 
-
-def _parse_xml_page_list(element):
+    Nested navPoints are inspected with an explicit stack, and not
+    recursively, so there is no limit on their depth.
+    """
+    root = NavPoint()
+    stack = [(element, root)]
+    while stack:
+        element, nav_point = stack.pop()
+        nav_point.identifier = element.getAttribute('id')
+        nav_point.class_name = intern_value(element.getAttribute('class'))
+        nav_point.playOrder = element.getAttribute('playOrder')
+
+        children = []
+        for node in _iter_xml_children(element):
+            if node.localName == 'navLabel':
+                nav_point.add_label(
+                    _parse_for_text_tag(node),
+                    intern_value(node.getAttribute('xml:lang')),
+                    intern_value(node.getAttribute('dir')))
+            elif node.localName == 'content':
+                nav_point.src = node.getAttribute('src')
+            elif node.localName == 'navPoint':
+                child = NavPoint()
+                nav_point.add_point(child)
+                children.append((node, child))
+        stack.extend(reversed(children))
+
+    return root
+
+
+def _parse_xml_page_list(element, intern_value=keep_string):
     """Inspect an xml.dom.Element <pageList> and return a NcxPageList object.
     """
     page_list = PageList()
     page_list.identifier = element.getAttribute('id')
-    page_list.class_name = element.getAttribute('class')
+    page_list.class_name = intern_value(element.getAttribute('class'))
 
     children = [e for e in element.childNodes if e.nodeType == e.ELEMENT_NODE]
     for node in children:
-        if node.tagName == 'navLabel':
+        if node.localName == 'navLabel':
             page_list.add_label(_parse_for_text_tag(node),
-                                node.getAttribute('xml:lang'),
-                                node.getAttribute('dir'))
-        elif node.tagName == 'navInfo':
+                                intern_value(node.getAttribute('xml:lang')),
+                                intern_value(node.getAttribute('dir')))
+        elif node.localName == 'navInfo':
             page_list.add_info(_parse_for_text_tag(node),
-                               node.getAttribute('xml:lang'),
-                               node.getAttribute('dir'))
-        elif node.tagName == 'pageTarget':
-            page_list.add_target(_parse_xml_page_target(node))
+                               intern_value(node.getAttribute('xml:lang')),
+                               intern_value(node.getAttribute('dir')))
+        elif node.localName == 'pageTarget':
+            page_list.add_target(_parse_xml_page_target(node, intern_value))
 
     return page_list
 
 
-def _parse_xml_page_target(element):
+def _parse_xml_page_target(element, intern_value=keep_string):
     """Inspect an xml.dom.Element <pageTarget> and return a NcxPageTarget
     object."""
     page_target = PageTarget()
     page_target.identifier = element.getAttribute('id')
     page_target.value = element.getAttribute('value')
-    page_target.target_type = element.getAttribute('type')
-    page_target.class_name = element.getAttribute('class')
+    page_target.target_type = intern_value(element.getAttribute('type'))
+    page_target.class_name = intern_value(element.getAttribute('class'))
     page_target.playOrder = element.getAttribute('playOrder')
 
     children = [e for e in element.childNodes if e.nodeType == e.ELEMENT_NODE]
     for node in children:
-        if node.tagName == 'navLabel':
+        if node.localName == 'navLabel':
             page_target.add_label(_parse_for_text_tag(node),
-                                  node.getAttribute('xml:lang'),
-                                  node.getAttribute('dir'))
-        elif node.tagName == 'content':
+                                  intern_value(node.getAttribute('xml:lang')),
+                                  intern_value(node.getAttribute('dir')))
+        elif node.localName == 'content':
             page_target.src = node.getAttribute('src')
 
     return page_target
 
 
-def _parse_xml_nav_list(element):
+def _parse_xml_nav_list(element, intern_value=keep_string):
     """Inspect an xml.dom.Element <navList> and return a NcxNavList object."""
     nav_list = NavList()
     nav_list.identifier = element.getAttribute('id')
-    nav_list.class_name = element.getAttribute('class')
+    nav_list.class_name = intern_value(element.getAttribute('class'))
 
     children = [e for e in element.childNodes if e.nodeType == e.ELEMENT_NODE]
     for node in children:
-        if node.tagName == 'navLabel':
+        if node.localName == 'navLabel':
             nav_list.add_label(_parse_for_text_tag(node),
-                                node.getAttribute('xml:lang'),
-                                node.getAttribute('dir'))
-        elif node.tagName == 'navInfo':
+                                intern_value(node.getAttribute('xml:lang')),
+                                intern_value(node.getAttribute('dir')))
+        elif node.localName == 'navInfo':
             nav_list.add_info(_parse_for_text_tag(node),
-                               node.getAttribute('xml:lang'),
-                               node.getAttribute('dir'))
-        elif node.tagName == 'navTarget':
-            nav_list.add_target(_parse_xml_nav_target(node))
+                               intern_value(node.getAttribute('xml:lang')),
+                               intern_value(node.getAttribute('dir')))
+        elif node.localName == 'navTarget':
+            nav_list.add_target(_parse_xml_nav_target(node, intern_value))
 
     return nav_list
 
 
-def _parse_xml_nav_target(element):
+def _parse_xml_nav_target(element, intern_value=keep_string):
     """Inspect an xml.dom.Element <navTarget> and return a NcxNavTarget
     object."""
     nav_target = NavTarget()
     nav_target.identifier = element.getAttribute('id')
     nav_target.value = element.getAttribute('value')
-    nav_target.class_name = element.getAttribute('class')
+    nav_target.class_name = intern_value(element.getAttribute('class'))
     nav_target.playOrder = element.getAttribute('playOrder')
 
     children = [e for e in element.childNodes if e.nodeType == e.ELEMENT_NODE]
     for node in children:
-        if node.tagName == 'navLabel':
+        if node.localName == 'navLabel':
             nav_target.add_label(_parse_for_text_tag(node),
-                                  node.getAttribute('xml:lang'),
-                                  node.getAttribute('dir'))
-        elif node.tagName == 'content':
+                                  intern_value(node.getAttribute('xml:lang')),
+                                  intern_value(node.getAttribute('dir')))
+        elif node.localName == 'content':
             nav_target.src = node.getAttribute('src')
 
     return nav_target
 
 
+def _iter_xml_children(element):
+    """Iterate over the children elements of an xml.dom.Element."""
+    for node in element.childNodes:
+        if node.nodeType == node.ELEMENT_NODE:
+            yield node
+
+
 def _parse_for_text_tag(xml_element, name=None):
     """Inspect an xml.dom.Element with a child 'name' to get its text value.
 
@@ -220,7 +440,7 @@ def _parse_for_text_tag(xml_element, name=None):
     Whitespaces and tabulations are stripped."""
     name = name or 'text'
     tags = [e for e in xml_element.childNodes
-              if e.nodeType == e.ELEMENT_NODE and e.tagName == name]
+              if e.nodeType == e.ELEMENT_NODE and e.localName == name]
     text = ''
     if len(tags) > 0:
         tag = tags[0]
@@ -230,6 +450,139 @@ def _parse_for_text_tag(xml_element, name=None):
     return text
 
 
+def _parse_etree_nav_map(element, intern_value=keep_string):
+    """Inspect an ElementTree element <navMap> and return a NavMap object."""
+    nav_map = NavMap()
+    nav_map.identifier = element.get('id', '')
+
+    for name, node in xmlbackend.iter_children(element):
+        if name == 'navLabel':
+            nav_map.add_label(*_parse_etree_label(node, intern_value))
+        elif name == 'navInfo':
+            nav_map.add_info(*_parse_etree_label(node, intern_value))
+        elif name == 'navPoint':
+            nav_map.add_point(_parse_etree_nav_point(node, intern_value))
+
+    return nav_map
+
+
+def _parse_etree_nav_point(element, intern_value=keep_string):
+    """Inspect an ElementTree element <navPoint> and return a NavPoint
+    object (with an explicit stack, as _parse_xml_nav_point)."""
+    root = NavPoint()
+    stack = [(element, root)]
+    while stack:
+        element, nav_point = stack.pop()
+        nav_point.identifier = element.get('id', '')
+        nav_point.class_name = intern_value(element.get('class', ''))
+        nav_point.playOrder = element.get('playOrder', '')
+
+        children = []
+        for name, node in xmlbackend.iter_children(element):
+            if name == 'navLabel':
+                nav_point.add_label(*_parse_etree_label(node, intern_value))
+            elif name == 'content':
+                nav_point.src = node.get('src', '')
+            elif name == 'navPoint':
+                child = NavPoint()
+                nav_point.add_point(child)
+                children.append((node, child))
+        stack.extend(reversed(children))
+
+    return root
+
+
+def _parse_etree_page_list(element, intern_value=keep_string):
+    """Inspect an ElementTree element <pageList> and return a PageList
+    object."""
+    page_list = PageList()
+    page_list.identifier = element.get('id', '')
+    page_list.class_name = intern_value(element.get('class', ''))
+
+    for name, node in xmlbackend.iter_children(element):
+        if name == 'navLabel':
+            page_list.add_label(*_parse_etree_label(node, intern_value))
+        elif name == 'navInfo':
+            page_list.add_info(*_parse_etree_label(node, intern_value))
+        elif name == 'pageTarget':
+            page_list.add_target(_parse_etree_page_target(node, intern_value))
+
+    return page_list
+
+
+def _parse_etree_page_target(element, intern_value=keep_string):
+    """Inspect an ElementTree element <pageTarget> and return a PageTarget
+    object."""
+    page_target = PageTarget()
+    page_target.identifier = element.get('id', '')
+    page_target.value = element.get('value', '')
+    page_target.target_type = intern_value(element.get('type', ''))
+    page_target.class_name = intern_value(element.get('class', ''))
+    page_target.playOrder = element.get('playOrder', '')
+
+    for name, node in xmlbackend.iter_children(element):
+        if name == 'navLabel':
+            page_target.add_label(*_parse_etree_label(node, intern_value))
+        elif name == 'content':
+            page_target.src = node.get('src', '')
+
+    return page_target
+
+
+def _parse_etree_nav_list(element, intern_value=keep_string):
+    """Inspect an ElementTree element <navList> and return a NavList
+    object."""
+    nav_list = NavList()
+    nav_list.identifier = element.get('id', '')
+    nav_list.class_name = intern_value(element.get('class', ''))
+
+    for name, node in xmlbackend.iter_children(element):
+        if name == 'navLabel':
+            nav_list.add_label(*_parse_etree_label(node, intern_value))
+        elif name == 'navInfo':
+            nav_list.add_info(*_parse_etree_label(node, intern_value))
+        elif name == 'navTarget':
+            nav_list.add_target(_parse_etree_nav_target(node, intern_value))
+
+    return nav_list
+
+
+def _parse_etree_nav_target(element, intern_value=keep_string):
+    """Inspect an ElementTree element <navTarget> and return a NavTarget
+    object."""
+    nav_target = NavTarget()
+    nav_target.identifier = element.get('id', '')
+    nav_target.value = element.get('value', '')
+    nav_target.class_name = intern_value(element.get('class', ''))
+    nav_target.playOrder = element.get('playOrder', '')
+
+    for name, node in xmlbackend.iter_children(element):
+        if name == 'navLabel':
+            nav_target.add_label(*_parse_etree_label(node, intern_value))
+        elif name == 'content':
+            nav_target.src = node.get('src', '')
+
+    return nav_target
+
+
+def _parse_etree_label(element, intern_value=keep_string):
+    """Inspect an ElementTree element <navLabel> or <navInfo>, and return its
+    text, language and direction."""
+    return (_parse_etree_text_tag(element),
+            intern_value(element.get(xmlbackend.XML_LANG, '')),
+            intern_value(element.get('dir', '')))
+
+
+def _parse_etree_text_tag(element, name=None):
+    """Inspect an ElementTree element with a child 'name' to get its text
+    value, as _parse_for_text_tag does for xml.dom elements."""
+    name = name or 'text'
+    for child_name, child in xmlbackend.iter_children(element):
+        if child_name == name:
+            return xmlbackend.get_text(child)
+    return ''
+
+
 def _create_xml_element_text(data, name=None):
     """Create a <text> ... </text> Element node.
 
@@ -247,6 +600,31 @@ def _create_xml_element_text(data, name=None):
     return element
 
 
+def _write_xml_element_text(writer, data, name=None):
+    """Write a <text> ... </text> element with an XmlWriter, as
+    _create_xml_element_text creates it."""
+    if name is None:
+        name = 'text'
+    if data:
+        writer.text_element(name, data)
+    else:
+        writer.element(name)
+
+
+def _write_xml_labels(writer, labels, name='navLabel'):
+    """Write the <navLabel> (or <navInfo>) elements of `labels`, a list of
+    (text, lang, direction)."""
+    for text, lang, direction in labels:
+        attributes = []
+        if lang:
+            attributes.append(('xml:lang', lang))
+        if direction:
+            attributes.append(('dir', direction))
+        writer.start(name, attributes)
+        _write_xml_element_text(writer, text)
+        writer.end()
+
+
 class Ncx(object):
     """Represent the structured content of a NCX file."""
 
@@ -268,6 +646,22 @@ class Ncx(object):
             page_list = PageList()
         self.page_list = page_list
         self.nav_lists = []
+        self._index = None
+
+    @property
+    def index(self):
+        """
+        Return the TocIndex of the nav map, built the first time.
+
+        The index is not updated when the nav map is changed: call
+        `reset_index` after such a change.
+        """
+        if self._index is None:
+            self._index = TocIndex(self.nav_map)
+        return self._index
+
+    def reset_index(self):
+        self._index = None
 
     def add_nav_list(self, nav_list):
         self.nav_lists.append(nav_list)
@@ -309,6 +703,50 @@ class Ncx(object):
         doc.appendChild(ncx)
         return doc
 
+    def write_xml_document(self, stream):
+        """
+        Write the NCX file to `stream` (a binary file-like object), as
+        `as_xml_document().toxml()` encoded in UTF-8, without building it.
+        """
+        writer = XmlWriter(stream)
+        writer.declaration()
+        attributes = [('xmlns', self.xmlns), ('version', self.version)]
+        if self.lang:
+            attributes.append(('xml:lang', self.lang))
+        writer.start('ncx', attributes)
+
+        # head
+        writer.start('head')
+        for name, content in (('dtb:uid', self.uid),
+                              ('dtb:depth', self.depth),
+                              ('dtb:totalPageCount', self.total_page_count),
+                              ('dtb:maxPageNumber', self.max_page_number),
+                              ('dtb:generator', self.generator)):
+            if content:
+                writer.element('meta', [('name', name),
+                                        ('content', content)])
+        writer.end()
+
+        # title
+        writer.start('docTitle')
+        _write_xml_element_text(writer, self.title)
+        writer.end()
+
+        # authors
+        for text in self.authors:
+            writer.start('docAuthor')
+            _write_xml_element_text(writer, text)
+            writer.end()
+
+        self.nav_map.write_xml_element(writer)
+        if self.page_list:
+            self.page_list.write_xml_element(writer)
+        for nav_list in self.nav_lists:
+            nav_list.write_xml_element(writer)
+
+        writer.end()
+        writer.flush()
+
     def _head_as_xml_element(self):
         """Create an xml Element node <head> with meta-data of Ncx item."""
         doc = minidom.Document()
@@ -391,8 +829,136 @@ class NavMap(object):
 
         return nav_map
 
+    def write_xml_element(self, writer):
+        """Write the element with an XmlWriter, as `as_xml_element`."""
+        writer.start('navMap',
+                     [('id', self.identifier)] if self.identifier else ())
+        _write_xml_labels(writer, self.labels)
+        _write_xml_labels(writer, self.infos, 'navInfo')
+        for nav_point in self.nav_point:
+            nav_point.write_xml_element(writer)
+        writer.end()
+
+
+class TocIndex(object):
+    """
+    Flat index of the navPoints of a NavMap, in document order.
+
+    Entries are identified by their position in the index, with the same
+    position in each list:
+
+    * `nav_points`: the NavPoint objects,
+    * `play_orders`: their playOrder as an integer (None if it is missing or
+      is not a number),
+    * `depths`: their depth (1 for the children of the navMap, as for the
+      ``dtb:depth`` meta-data),
+    * `parents`: the position of their parent (None for the children of the
+      navMap).
+
+    """
+
+    def __init__(self, nav_map):
+        self.nav_points = []
+        self.play_orders = []
+        self.depths = []
+        self.parents = []
+        self._by_src = {}
+        self._by_href = {}
+        self._by_play_order = {}
+
+        stack = [(nav_point, 1, None)
+                 for nav_point in reversed(nav_map.nav_point)]
+        while stack:
+            nav_point, depth, parent = stack.pop()
+            position = len(self.nav_points)
+            play_order = _get_int(nav_point.playOrder)
+            self.nav_points.append(nav_point)
+            self.play_orders.append(play_order)
+            self.depths.append(depth)
+            self.parents.append(parent)
+
+            if nav_point.src:
+                src = _normalize_src(nav_point.src)
+                self._by_src.setdefault(src, []).append(position)
+                self._by_href.setdefault(src[0], []).append(position)
+            if play_order is not None:
+                self._by_play_order.setdefault(play_order, position)
+
+            stack.extend((child, depth + 1, position)
+                         for child in reversed(nav_point.nav_point))
+
+        # Positions sorted by playOrder, to find the current entry
+        self._sorted_play_orders = sorted(self._by_play_order)
+        self._sorted_positions = [self._by_play_order[play_order]
+                                  for play_order in self._sorted_play_orders]
+
+    def __len__(self):
+        return len(self.nav_points)
+
+    def __getitem__(self, position):
+        return self.nav_points[position]
+
+    def get_ancestors(self, position):
+        """
+        Return the positions of the ancestors of the entry at `position`,
+        from the navMap's child to its parent.
+        """
+        ancestors = []
+        parent = self.parents[position]
+        while parent is not None:
+            ancestors.append(parent)
+            parent = self.parents[parent]
+        ancestors.reverse()
+        return ancestors
+
+    def find_by_src(self, src):
+        """
+        Return the positions of the entries pointing to `src` (a path relative
+        to the NCX file, with its fragment if any).
+        """
+        return list(self._by_src.get(_normalize_src(src), ()))
+
+    def find_by_href(self, href):
+        """
+        Return the positions of the entries pointing into the file `href`,
+        whatever their fragment.
+        """
+        return list(self._by_href.get(normalize_href(href), ()))
+
+    def find_by_play_order(self, play_order):
+        """
+        Return the position of the first entry with `play_order`, or None.
+        """
+        return self._by_play_order.get(play_order)
+
+    def find_current(self, play_order):
+        """
+        Return the position of the entry to highlight while reading the item
+        at `play_order`: the entry with the greatest playOrder up to
+        `play_order`, or None if there is no such entry.
+        """
+        index = bisect_right(self._sorted_play_orders, play_order)
+        if not index:
+            return None
+        return self._sorted_positions[index - 1]
+
+
+def _get_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _normalize_src(src):
+    """Return the (normalized href, fragment) of a src."""
+    fragment = src.split('#', 1)[1] if '#' in src else None
+    return normalize_href(src), fragment
+
 
 class NavPoint(object):
+    __slots__ = ('identifier', 'class_name', 'playOrder', 'labels', 'src',
+                 'nav_point')
 
     def __init__(self):
         self.identifier = None
@@ -411,8 +977,31 @@ class NavPoint(object):
         self.nav_point.append(nav_point)
 
     def as_xml_element(self):
-        """Return an xml dom Element node."""
+        """Return an xml dom Element node.
+
+        Nested navPoints are built with an explicit stack, and not
+        recursively, so there is no limit on their depth.
+        """
         doc = minidom.Document()
+        root = self._create_xml_element(doc)
+        elements = []
+        stack = [(self, root)]
+        while stack:
+            nav_point, element = stack.pop()
+            children = [(child, child._create_xml_element(doc))
+                        for child in nav_point.nav_point]
+            elements.append((element, [child[1] for child in children]))
+            stack.extend(children)
+
+        # Children are appended before their parent is: appendChild walks up
+        # the ancestors of the parent, which would be quadratic otherwise.
+        for element, child_elements in reversed(elements):
+            for child_element in child_elements:
+                element.appendChild(child_element)
+        return root
+
+    def _create_xml_element(self, doc):
+        """Return an xml dom Element node, without the nested navPoints."""
         nav_point = doc.createElement('navPoint')
 
         # Attributes
@@ -440,12 +1029,33 @@ class NavPoint(object):
         content.setAttribute('src', self.src)
         nav_point.appendChild(content)
 
-        # navPoint
-        for child in self.nav_point:
-            nav_point.appendChild(child.as_xml_element())
-
         return nav_point
 
+    def write_xml_element(self, writer):
+        """Write the element with an XmlWriter, as `as_xml_element` (with an
+        explicit stack too)."""
+        stack = [self]
+        while stack:
+            nav_point = stack.pop()
+            if nav_point is None:
+                # All the children of the navPoint have been written
+                writer.end()
+                continue
+
+            attributes = []
+            if nav_point.identifier:
+                attributes.append(('id', nav_point.identifier))
+            if nav_point.class_name:
+                attributes.append(('class', nav_point.class_name))
+            if nav_point.playOrder:
+                attributes.append(('playOrder', nav_point.playOrder))
+            writer.start('navPoint', attributes)
+            _write_xml_labels(writer, nav_point.labels)
+            writer.element('content', [('src', nav_point.src)])
+
+            stack.append(None)
+            stack.extend(reversed(nav_point.nav_point))
+
 
 class PageList(object):
 
@@ -469,6 +1079,10 @@ class PageList(object):
     def add_target(self, page_target):
         self.page_target.append(page_target)
 
+    def iter_targets(self):
+        """Iterate over the PageTarget objects of the list."""
+        return iter(self.page_target)
+
     def as_xml_element(self):
         """Return an xml dom Element node."""
         doc = minidom.Document()
@@ -507,8 +1121,116 @@ class PageList(object):
 
         return page_list
 
+    def write_xml_element(self, writer):
+        """Write the element with an XmlWriter, as `as_xml_element`."""
+        _write_xml_list(writer, 'pageList', self, self.page_target)
+
+
+class _DeferredList(object):
+    """
+    Mixin for a list element of an NCX file (<pageList> or <navList>) that
+    is parsed the first time one of its attributes is accessed.
+
+    `source` is the (prolog, element, end tag) of the element, as found by
+    parse_toc in deferred mode.
+
+    """
+    tag_name = None
+    target_name = None
+
+    def __init__(self, source, backend=None, intern_value=keep_string):
+        # The attributes of the list are not set until it is loaded
+        self._source = source
+        self._backend = backend
+        self._intern_value = intern_value
+
+    @property
+    def loaded(self):
+        return '_source' not in self.__dict__
+
+    def __getattr__(self, name):
+        # Only called for attributes not set yet
+        if name.startswith('__') or self.loaded:
+            raise AttributeError(name)
+        self._load()
+        return getattr(self, name)
+
+    def _load(self):
+        source = self._source
+        # Bytes or text, as the document given to parse_toc
+        element = xmlbackend.parse(source[0][:0].join(source), self._backend)
+        if xmlbackend.is_dom(element):
+            node = [node for node in _iter_xml_children(element)
+                    if node.localName == self.tag_name][0]
+            parsed = self._parse_xml(node, self._intern_value)
+        else:
+            node = [node for name, node in xmlbackend.iter_children(element)
+                    if name == self.tag_name][0]
+            parsed = self._parse_etree(node, self._intern_value)
+        del self._source, self._backend, self._intern_value
+        self.__dict__.update(parsed.__dict__)
+
+    def iter_targets(self):
+        """
+        Iterate over the targets of the list.
+
+        Until the list is loaded, targets are read from its source one by
+        one, and the whole list is never built.
+        """
+        if self.loaded:
+            for target in super(_DeferredList, self).iter_targets():
+                yield target
+            return
+
+        intern_value = self._intern_value
+        parents = []
+        for event, element in _iter_source_events(self._source):
+            if event == 'start':
+                parents.append(element)
+                continue
+            parents.pop()
+            if xmlbackend.get_local_name(element.tag) == self.target_name:
+                yield self._parse_etree_target(element, intern_value)
+                # Drop the target, to keep the memory used constant
+                parents[-1].remove(element)
+
+    def __getstate__(self):
+        # Pickled as a loaded list
+        if not self.loaded:
+            self._load()
+        return self.__dict__
+
+
+def _iter_source_events(source):
+    """
+    Iterate over the ('start', element) and ('end', element) events of a
+    deferred list's source, part by part with an XMLPullParser, or with
+    iterparse when there is none (Python 2).
+    """
+    if _XMLPullParser is not None:
+        parser = _XMLPullParser(events=('start', 'end'))
+        for part in source:
+            parser.feed(part)
+            for event in parser.read_events():
+                yield event
+        parser.close()
+        return
+
+    if isinstance(source[0], bytes):
+        parser = None
+        data = b''.join(source)
+    else:
+        # Text parts are encoded, whatever encoding the prolog declares
+        parser = ElementTree.XMLParser(encoding='utf-8')
+        data = ''.join(source).encode('utf-8')
+    for event in ElementTree.iterparse(io.BytesIO(data), ('start', 'end'),
+                                       parser):
+        yield event
+
 
 class PageTarget(object):
+    __slots__ = ('identifier', 'value', 'target_type', 'class_name',
+                 'playOrder', 'src', 'labels')
 
     def __init__(self):
         self.identifier = None
@@ -562,6 +1284,24 @@ class PageTarget(object):
 
         return page_target
 
+    def write_xml_element(self, writer):
+        """Write the element with an XmlWriter, as `as_xml_element`."""
+        attributes = []
+        if self.identifier:
+            attributes.append(('id', self.identifier))
+        if self.value:
+            attributes.append(('value', self.value))
+        if self.target_type:
+            attributes.append(('type', self.target_type))
+        if self.class_name:
+            attributes.append(('class', self.class_name))
+        if self.playOrder:
+            attributes.append(('playOrder', self.playOrder))
+        writer.start('pageTarget', attributes)
+        _write_xml_labels(writer, self.labels)
+        writer.element('content', [('src', self.src)])
+        writer.end()
+
 
 class NavList(object):
 
@@ -585,6 +1325,10 @@ class NavList(object):
     def add_target(self, nav_target):
         self.nav_target.append(nav_target)
 
+    def iter_targets(self):
+        """Iterate over the NavTarget objects of the list."""
+        return iter(self.nav_target)
+
     def as_xml_element(self):
         """Return an xml dom Element node."""
         doc = minidom.Document()
@@ -623,8 +1367,14 @@ class NavList(object):
 
         return nav_list
 
+    def write_xml_element(self, writer):
+        """Write the element with an XmlWriter, as `as_xml_element`."""
+        _write_xml_list(writer, 'navList', self, self.nav_target)
+
 
 class NavTarget(object):
+    __slots__ = ('identifier', 'class_name', 'value', 'playOrder', 'labels',
+                 'src')
 
     def __init__(self):
         self.identifier = None
@@ -673,3 +1423,52 @@ class NavTarget(object):
         nav_target.appendChild(content)
 
         return nav_target
+
+    def write_xml_element(self, writer):
+        """Write the element with an XmlWriter, as `as_xml_element`."""
+        attributes = []
+        if self.identifier:
+            attributes.append(('id', self.identifier))
+        if self.class_name:
+            attributes.append(('class', self.class_name))
+        if self.value:
+            attributes.append(('value', self.value))
+        if self.playOrder:
+            attributes.append(('playOrder', self.playOrder))
+        writer.start('navTarget', attributes)
+        _write_xml_labels(writer, self.labels)
+        writer.element('content', [('src', self.src)])
+        writer.end()
+
+
+def _write_xml_list(writer, name, xml_list, targets):
+    """Write a <pageList> or <navList> element with an XmlWriter."""
+    attributes = []
+    if xml_list.identifier:
+        attributes.append(('id', xml_list.identifier))
+    if xml_list.class_name:
+        attributes.append(('class', xml_list.class_name))
+    writer.start(name, attributes)
+    _write_xml_labels(writer, xml_list.labels)
+    _write_xml_labels(writer, xml_list.infos, 'navInfo')
+    for target in targets:
+        target.write_xml_element(writer)
+    writer.end()
+
+
+class DeferredPageList(_DeferredList, PageList):
+    """A PageList parsed the first time it is accessed."""
+    tag_name = 'pageList'
+    target_name = 'pageTarget'
+    _parse_xml = staticmethod(_parse_xml_page_list)
+    _parse_etree = staticmethod(_parse_etree_page_list)
+    _parse_etree_target = staticmethod(_parse_etree_page_target)
+
+
+class DeferredNavList(_DeferredList, NavList):
+    """A NavList parsed the first time it is accessed."""
+    tag_name = 'navList'
+    target_name = 'navTarget'
+    _parse_xml = staticmethod(_parse_xml_nav_list)
+    _parse_etree = staticmethod(_parse_etree_nav_list)
+    _parse_etree_target = staticmethod(_parse_etree_nav_target)
@@ -12,6 +12,7 @@ OPF epub : http://idpf.org/epub/20/spec/OPF_2.0.1_draft.htm
 """
 
 
+import io
 from xml.dom import minidom
 
 
@@ -27,16 +28,41 @@ except ImportError:
             'You should use Python 2.7 or install `ordereddict` from pypi.')
 
 
-from epub.utils import get_node_text
+from epub.reader import xmlbackend
+from epub.reader.xmlwriter import XmlWriter
+from epub.utils import (get_node_text, intern_string, keep_string,
+                        normalize_href)
 
 
 XMLNS_DC = 'http://purl.org/dc/elements/1.1/'
 XMLNS_OPF = 'http://www.idpf.org/2007/opf'
+XMLNS_XML = 'http://www.w3.org/XML/1998/namespace'
 
+# Namespace's prefixes used by qualified names, as found in OPF files.
+XMLNS_PREFIXES = {'dc': XMLNS_DC, 'opf': XMLNS_OPF, 'xml': XMLNS_XML}
 
-def parse_opf(xml_string):
-    package = minidom.parseString(xml_string).documentElement
 
+def parse_opf(xml_string, backend=None, intern_strings=True):
+    """Inspect an OPF formated xml document, and return an epub.opf.Opf
+    object.
+
+    `backend` is the name of the XML backend to use (see
+    epub.reader.xmlbackend), by default the fastest one available.
+
+    With `intern_strings`, repeated values (media types, ids, roles, ...)
+    are interned (see epub.utils.intern_string), so many parsed books share
+    the same string objects.
+    """
+    intern_value = intern_string if intern_strings else keep_string
+    package = xmlbackend.parse(xml_string, backend)
+    if xmlbackend.is_dom(package):
+        return _parse_xml_opf(package, intern_value)
+    return _parse_etree_opf(package, intern_value)
+
+
+def _parse_xml_opf(package, intern_value=keep_string):
+    """Inspect an xml.dom.Element <package> and return an epub.opf.Opf
+    object."""
     # Get Uid
     uid_id = package.getAttribute('unique-identifier')
 
@@ -47,22 +73,22 @@ def parse_opf(xml_string):
             'guide': None}
     elements = [e for e in package.childNodes if e.nodeType == e.ELEMENT_NODE]
     for node in elements:
-        data[node.tagName.lower()] = node
+        data[node.localName.lower()] = node
 
     # Inspect metadata
-    metadata = _parse_xml_metadata(data['metadata'])
+    metadata = _parse_xml_metadata(data['metadata'], intern_value)
 
     # Inspect manifest
-    manifest = _parse_xml_manifest(data['manifest'])
+    manifest = _parse_xml_manifest(data['manifest'], intern_value)
 
     # Inspect spine
-    spine = _parse_xml_spine(data['spine'])
+    spine = _parse_xml_spine(data['spine'], intern_value)
 
     # Inspect guide if exist
     if data['guide'] is None:
         guide = None
     else:
-        guide = _parse_xml_guide(data['guide'])
+        guide = _parse_xml_guide(data['guide'], intern_value)
 
     opf = Opf(uid_id=uid_id,
               metadata=metadata,
@@ -72,7 +98,34 @@ def parse_opf(xml_string):
     return opf
 
 
-def _parse_xml_metadata(element):
+def _parse_etree_opf(package, intern_value=keep_string):
+    """Inspect an ElementTree element <package> and return an epub.opf.Opf
+    object."""
+    uid_id = package.get('unique-identifier', '')
+
+    data = {'metadata': None,
+            'manifest': None,
+            'spine': None,
+            'guide': None}
+    for name, node in xmlbackend.iter_children(package):
+        data[name.lower()] = node
+
+    metadata = _parse_etree_metadata(data['metadata'], intern_value)
+    manifest = _parse_etree_manifest(data['manifest'], intern_value)
+    spine = _parse_etree_spine(data['spine'], intern_value)
+    if data['guide'] is None:
+        guide = None
+    else:
+        guide = _parse_etree_guide(data['guide'], intern_value)
+
+    return Opf(uid_id=uid_id,
+               metadata=metadata,
+               manifest=manifest,
+               spine=spine,
+               guide=guide)
+
+
+def _parse_xml_metadata(element, intern_value=keep_string):
     """Extract metadata from an xml.dom.Element object (ELEMENT_NODE)
 
     The "<metadata>" tag has a lot of metadatas about the epub this method
@@ -80,104 +133,312 @@ def _parse_xml_metadata(element):
     """
     metadata = Metadata()
 
-    for node in element.getElementsByTagName('dc:title'):
-        metadata.add_title(get_node_text(node),
-                           node.getAttribute('xml:lang'))
+    # One walk over the subtree, each tag is dispatched to its parser.
+    for node in element.getElementsByTagName('*'):
+        parser = _METADATA_PARSERS.get(_get_xml_qualified_name(node))
+        if parser is not None:
+            get_attribute = _get_interned_attribute(
+                _get_xml_attribute(node), intern_value)
+            parser(metadata, get_node_text(node), get_attribute)
 
-    for node in element.getElementsByTagName('dc:creator'):
-        metadata.add_creator(get_node_text(node),
-                             node.getAttribute('opf:role'),
-                             node.getAttribute('opf:file-as'))
+    return metadata
 
-    for node in element.getElementsByTagName('dc:subject'):
-        metadata.add_subject(get_node_text(node))
 
-    for node in element.getElementsByTagName('dc:description'):
-        metadata.description = get_node_text(node)
+def parse_metadata(source, backend=None, intern_strings=True):
+    """Extract metadata from an OPF file without building its whole tree.
 
-    for node in element.getElementsByTagName('dc:publisher'):
-        metadata.publisher = get_node_text(node)
+    `source` can be an xml string or a file-like object (for example, the
+    result of `EpubFile.open(EpubFile.opf_path)`). The document is read with
+    an incremental parser, and reading stops at the end of the <metadata>
+    tag: the manifest, spine and guide are never parsed.
 
-    for node in element.getElementsByTagName('dc:contributor'):
-        metadata.add_contributor(get_node_text(node),
-                                 node.getAttribute('opf:role'),
-                                 node.getAttribute('opf:file-as'))
+    Attribute values are interned with `intern_strings` (see parse_opf).
 
-    for node in element.getElementsByTagName('dc:date'):
-        metadata.add_date(get_node_text(node),
-                          node.getAttribute('opf:event'))
+    Return an epub.opf.Metadata object.
+    """
+    intern_value = intern_string if intern_strings else keep_string
+    encoding = None
+    if not hasattr(source, 'read'):
+        if isinstance(source, bytes):
+            source = io.BytesIO(source)
+        elif xmlbackend.get_backend(backend) == xmlbackend.LXML:
+            # lxml does not parse unicode strings with an encoding declaration
+            source = io.BytesIO(source.encode('utf-8'))
+            encoding = 'utf-8'
+        else:
+            source = io.StringIO(source)
 
-    for node in element.getElementsByTagName('dc:type'):
-        metadata.dc_type = get_node_text(node)
+    metadata = Metadata()
+    in_metadata = False
+    events = xmlbackend.iterparse(source, ('start', 'end'), backend,
+                                  encoding)
+    for event, element in events:
+        name = _get_qualified_name(element.tag)
+        if event == 'start':
+            if name == 'metadata':
+                in_metadata = True
+        elif name == 'metadata':
+            break
+        elif in_metadata:
+            parser = _METADATA_PARSERS.get(name)
+            if parser is not None:
+                get_attribute = _get_interned_attribute(
+                    _get_etree_attribute(element), intern_value)
+                parser(metadata, xmlbackend.get_text(element), get_attribute)
+            element.clear()
 
-    for node in element.getElementsByTagName('dc:format'):
-        metadata.format = get_node_text(node)
+    return metadata
 
-    for node in element.getElementsByTagName('dc:identifier'):
-        metadata.add_identifier(get_node_text(node),
-                            node.getAttribute('id'),
-                            node.getAttribute('opf:scheme'))
 
-    for node in element.getElementsByTagName('dc:source'):
-        metadata.source = get_node_text(node)
+def _parse_etree_metadata(element, intern_value=keep_string):
+    """Extract metadata from an ElementTree element <metadata>."""
+    metadata = Metadata()
 
-    for node in element.getElementsByTagName('dc:language'):
-        metadata.add_language(get_node_text(node))
+    for node in element.iter():
+        if not isinstance(node.tag, xmlbackend.string_types):
+            continue
+        parser = _METADATA_PARSERS.get(_get_qualified_name(node.tag))
+        if parser is not None:
+            get_attribute = _get_interned_attribute(
+                _get_etree_attribute(node), intern_value)
+            parser(metadata, xmlbackend.get_text(node), get_attribute)
 
-    for node in element.getElementsByTagName('dc:relation'):
-        metadata.relation = get_node_text(node)
+    return metadata
 
-    for node in element.getElementsByTagName('dc:coverage'):
-        metadata.coverage = get_node_text(node)
 
-    for node in element.getElementsByTagName('dc:rights'):
-        metadata.right = get_node_text(node)
+def _get_qualified_name(tag):
+    """Return the name of an ElementTree tag as it is written in an OPF file.
 
-    for node in element.getElementsByTagName('meta'):
-        metadata.add_meta(node.getAttribute('name'),
-                          node.getAttribute('content'))
+    Dublin Core elements are prefixed by "dc:", OPF elements (or elements
+    without namespace) are not prefixed, and any other tag is returned as it
+    is ("{namespace}name"). The prefixes used by the document do not matter:
+    `<opf:meta>` and `<meta>` are the same OPF element.
+    """
+    if tag[:1] != '{':
+        return tag
+    namespace, name = tag[1:].split('}', 1)
+    if namespace == XMLNS_DC:
+        return 'dc:%s' % name
+    elif namespace == XMLNS_OPF:
+        return name
+    return tag
+
+
+def _get_xml_qualified_name(node):
+    """Return the name of an xml.dom.Element as _get_qualified_name does for
+    ElementTree tags, from its namespace and not from its prefix."""
+    if node.namespaceURI:
+        return _get_qualified_name('{%s}%s' % (node.namespaceURI,
+                                               node.localName))
+    return node.localName
+
+
+def _get_xml_attribute(node):
+    """Return a function to get attributes of an xml.dom.Element by
+    qualified name (like "opf:role"), from their namespace and not from the
+    prefix used by the document, as _get_etree_attribute does."""
+    def get_attribute(name):
+        if ':' in name:
+            prefix, local_name = name.split(':', 1)
+            return node.getAttributeNS(XMLNS_PREFIXES[prefix], local_name)
+        return node.getAttribute(name)
+    return get_attribute
+
+
+def _get_etree_attribute(element):
+    """Return a function to get attributes of an ElementTree element by
+    qualified name (like "opf:role"), as xml.dom.Element.getAttribute does.
+    """
+    def get_attribute(name):
+        if ':' in name:
+            prefix, local_name = name.split(':', 1)
+            name = '{%s}%s' % (XMLNS_PREFIXES[prefix], local_name)
+        return element.get(name, '')
+    return get_attribute
+
+
+def _get_interned_attribute(get_attribute, intern_value):
+    """Return a function to get attributes with `get_attribute`, and intern
+    their values with `intern_value`."""
+    if intern_value is keep_string:
+        return get_attribute
+    return lambda name: intern_value(get_attribute(name))
+
+
+def _parse_title(metadata, text, get_attribute):
+    metadata.add_title(text, get_attribute('xml:lang'))
+
+
+def _parse_creator(metadata, text, get_attribute):
+    metadata.add_creator(text,
+                         get_attribute('opf:role'),
+                         get_attribute('opf:file-as'))
+
+
+def _parse_subject(metadata, text, get_attribute):
+    metadata.add_subject(text)
+
+
+def _parse_description(metadata, text, get_attribute):
+    metadata.description = text
 
-    return metadata
 
+def _parse_publisher(metadata, text, get_attribute):
+    metadata.publisher = text
 
-def _parse_xml_manifest(element):
+
+def _parse_contributor(metadata, text, get_attribute):
+    metadata.add_contributor(text,
+                             get_attribute('opf:role'),
+                             get_attribute('opf:file-as'))
+
+
+def _parse_date(metadata, text, get_attribute):
+    metadata.add_date(text, get_attribute('opf:event'))
+
+
+def _parse_type(metadata, text, get_attribute):
+    metadata.dc_type = text
+
+
+def _parse_format(metadata, text, get_attribute):
+    metadata.format = text
+
+
+def _parse_identifier(metadata, text, get_attribute):
+    metadata.add_identifier(text,
+                            get_attribute('id'),
+                            get_attribute('opf:scheme'))
+
+
+def _parse_source(metadata, text, get_attribute):
+    metadata.source = text
+
+
+def _parse_language(metadata, text, get_attribute):
+    metadata.add_language(text)
+
+
+def _parse_relation(metadata, text, get_attribute):
+    metadata.relation = text
+
+
+def _parse_coverage(metadata, text, get_attribute):
+    metadata.coverage = text
+
+
+def _parse_rights(metadata, text, get_attribute):
+    metadata.right = text
+
+
+def _parse_meta(metadata, text, get_attribute):
+    metadata.add_meta(get_attribute('name'), get_attribute('content'))
+
+
+# Parsers of <metadata>'s children, by qualified tag name. Each one takes the
+# Metadata object to fill, the text of the tag, and a function to get an
+# attribute by its qualified name.
+_METADATA_PARSERS = {
+    'dc:title': _parse_title,
+    'dc:creator': _parse_creator,
+    'dc:subject': _parse_subject,
+    'dc:description': _parse_description,
+    'dc:publisher': _parse_publisher,
+    'dc:contributor': _parse_contributor,
+    'dc:date': _parse_date,
+    'dc:type': _parse_type,
+    'dc:format': _parse_format,
+    'dc:identifier': _parse_identifier,
+    'dc:source': _parse_source,
+    'dc:language': _parse_language,
+    'dc:relation': _parse_relation,
+    'dc:coverage': _parse_coverage,
+    'dc:rights': _parse_rights,
+    'meta': _parse_meta,
+}
+
+
+def _parse_xml_manifest(element, intern_value=keep_string):
     """Inspect an xml.dom.Element <manifest> and return a list of
     epub.EpubManifestItem object."""
 
     manifest = Manifest()
-    for e in element.getElementsByTagName('item'):
-        manifest.add_item(e.getAttribute('id'),
+    for e in element.getElementsByTagNameNS('*', 'item'):
+        manifest.add_item(intern_value(e.getAttribute('id')),
                           e.getAttribute('href'),
-                          e.getAttribute('media-type'),
-                          e.getAttribute('fallback'),
-                          e.getAttribute('required-namespace'),
-                          e.getAttribute('required-modules'),
-                          e.getAttribute('fallback-style'))
+                          intern_value(e.getAttribute('media-type')),
+                          intern_value(e.getAttribute('fallback')),
+                          intern_value(e.getAttribute('required-namespace')),
+                          intern_value(e.getAttribute('required-modules')),
+                          intern_value(e.getAttribute('fallback-style')))
+    return manifest
+
+
+def _parse_etree_manifest(element, intern_value=keep_string):
+    """Inspect an ElementTree element <manifest> and return an
+    epub.opf.Manifest object."""
+
+    manifest = Manifest()
+    for name, e in xmlbackend.iter_descendants(element):
+        if name == 'item':
+            manifest.add_item(intern_value(e.get('id', '')),
+                              e.get('href', ''),
+                              intern_value(e.get('media-type', '')),
+                              intern_value(e.get('fallback', '')),
+                              intern_value(e.get('required-namespace', '')),
+                              intern_value(e.get('required-modules', '')),
+                              intern_value(e.get('fallback-style', '')))
     return manifest
 
 
-def _parse_xml_spine(element):
+def _parse_xml_spine(element, intern_value=keep_string):
     """Inspect an xml.dom.Element <spine> and return epub.opf.Spine object"""
 
     spine = Spine()
-    spine.toc = element.getAttribute('toc')
-    for e in element.getElementsByTagName('itemref'):
-        spine.add_itemref(e.getAttribute('idref'),
+    spine.toc = intern_value(element.getAttribute('toc'))
+    for e in element.getElementsByTagNameNS('*', 'itemref'):
+        spine.add_itemref(intern_value(e.getAttribute('idref')),
                           e.getAttribute('linear').lower() != 'no')
     return spine
 
 
-def _parse_xml_guide(element):
+def _parse_etree_spine(element, intern_value=keep_string):
+    """Inspect an ElementTree element <spine> and return epub.opf.Spine
+    object"""
+
+    spine = Spine()
+    spine.toc = intern_value(element.get('toc', ''))
+    for name, e in xmlbackend.iter_descendants(element):
+        if name == 'itemref':
+            spine.add_itemref(intern_value(e.get('idref', '')),
+                              e.get('linear', '').lower() != 'no')
+    return spine
+
+
+def _parse_xml_guide(element, intern_value=keep_string):
     """Inspect an xml.dom.Element <guide> and return a list of ref as tuple."""
 
     guide = Guide()
-    for e in element.getElementsByTagName('reference'):
+    for e in element.getElementsByTagNameNS('*', 'reference'):
         guide.add_reference(e.getAttribute('href'),
-                            e.getAttribute('type'),
+                            intern_value(e.getAttribute('type')),
                             e.getAttribute('title'))
     return guide
 
 
+def _parse_etree_guide(element, intern_value=keep_string):
+    """Inspect an ElementTree element <guide> and return epub.opf.Guide
+    object."""
+
+    guide = Guide()
+    for name, e in xmlbackend.iter_descendants(element):
+        if name == 'reference':
+            guide.add_reference(e.get('href', ''),
+                                intern_value(e.get('type', '')),
+                                e.get('title', ''))
+    return guide
+
+
 class Opf(object):
     """Represent an OPF formated file.
 
@@ -219,6 +480,23 @@ class Opf(object):
         doc.appendChild(package)
         return doc
 
+    def write_xml_document(self, stream):
+        """
+        Write the OPF file to `stream` (a binary file-like object), as
+        `as_xml_document().toxml()` encoded in UTF-8, without building it.
+        """
+        writer = XmlWriter(stream)
+        writer.declaration()
+        writer.start('package', [('version', self.version),
+                                 ('unique-identifier', self.uid_id),
+                                 ('xmlns', self.xmlns)])
+        self.metadata.write_xml_element(writer)
+        self.manifest.write_xml_element(writer)
+        self.spine.write_xml_element(writer)
+        self.guide.write_xml_element(writer)
+        writer.end()
+        writer.flush()
+
 
 class Metadata(object):
     """Represent an epub's metadatas set.
@@ -388,8 +666,112 @@ class Metadata(object):
 
         return metadata
 
+    def write_xml_element(self, writer):
+        """Write the element with an XmlWriter, as `as_xml_element`."""
+        writer.start('metadata', [('xmlns:dc', XMLNS_DC),
+                                  ('xmlns:opf', XMLNS_OPF)])
+
+        for text, lang in self.titles:
+            writer.text_element('dc:title', text,
+                                [('xml:lang', lang)] if lang else ())
+
+        for name, role, file_as in self.creators:
+            writer.text_element('dc:creator', name,
+                                _get_role_attributes(role, file_as))
+
+        for text in self.subjects:
+            writer.text_element('dc:subject', text)
+
+        if self.description:
+            writer.text_element('dc:description', self.description)
+
+        if self.publisher:
+            writer.text_element('dc:publisher', self.publisher)
+
+        for name, role, file_as in self.contributors:
+            writer.text_element('dc:contributor', name,
+                                _get_role_attributes(role, file_as))
+
+        for text, event in self.dates:
+            writer.text_element('dc:date', text,
+                                [('opf:event', event)] if event else ())
+
+        if self.dc_type:
+            writer.text_element('dc:type', self.dc_type)
+
+        if self.format:
+            writer.text_element('dc:format', self.format)
+
+        for text, identifier, scheme in self.identifiers:
+            attributes = []
+            if identifier:
+                attributes.append(('id', identifier))
+            if scheme:
+                attributes.append(('opf:scheme', scheme))
+            writer.text_element('dc:identifier', text, attributes)
+
+        if self.source:
+            writer.text_element('dc:source', self.source)
+
+        for text in self.languages:
+            writer.text_element('dc:language', text)
+
+        if self.relation:
+            writer.text_element('dc:relation', self.relation)
+
+        if self.coverage:
+            writer.text_element('dc:coverage', self.coverage)
+
+        if self.right:
+            writer.text_element('dc:rights', self.right)
+
+        for name, content in self.metas:
+            writer.element('meta', [('name', name), ('content', content)])
+
+        writer.end()
+
 
 class Manifest(OrderedDict):
+    """
+    Represent the manifest of an OPF file: a dict of ManifestItem by id.
+
+    Items are indexed by their normalized href too (see get_by_href). The
+    index is updated when an item is added, replaced or removed. When the
+    href of an item is modified in place, the index is rebuilt by the next
+    lookup that finds a stale entry or nothing; but a lookup of an href that
+    is still indexed for another item does not see the modified item until
+    the index is rebuilt (set the item again to update the index at once:
+    `manifest[item.identifier] = item`).
+
+    Two manifests are equal when they have the same identifiers, in the same
+    order, and their items have the same attributes (so a manifest is equal
+    to its copies).
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        # normalized href -> identifier (or tuple of identifiers),
+        # identifier -> (href, normalized href)
+        self._href_index = {}
+        self._indexed_hrefs = {}
+        super(Manifest, self).__init__(*args, **kwargs)
+
+    def __reduce__(self):
+        # The href index is rebuilt when items are set back
+        return self.__class__, (list(self.items()),)
+
+    def __eq__(self, other):
+        if not isinstance(other, Manifest):
+            return super(Manifest, self).__eq__(other)
+        if list(self.keys()) != list(other.keys()):
+            return False
+        return all(_get_item_values(item) == _get_item_values(other[key])
+                   for key, item in self.items())
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
 
     def __contains__(self, item):
         if hasattr(item, 'identifier'):
@@ -400,7 +782,9 @@ class Manifest(OrderedDict):
     def __setitem__(self, key, value):
         if hasattr(value, 'identifier') and hasattr(value, 'href'):
             if value.identifier == key:
+                self._unindex_href(key)
                 super(Manifest, self).__setitem__(key, value)
+                self._index_href(key, value.href)
             else:
                 raise ValueError('Value\'s id is different from insert key.')
         else:
@@ -408,6 +792,94 @@ class Manifest(OrderedDict):
             msg = 'Value does not fit the requirement (%s).' % requierements
             raise ValueError(msg)
 
+    def __delitem__(self, key):
+        super(Manifest, self).__delitem__(key)
+        self._unindex_href(key)
+
+    def pop(self, key, *args):
+        if super(Manifest, self).__contains__(key):
+            self._unindex_href(key)
+        return super(Manifest, self).pop(key, *args)
+
+    def popitem(self, last=True):
+        key, value = super(Manifest, self).popitem(last)
+        self._unindex_href(key)
+        return key, value
+
+    def clear(self):
+        super(Manifest, self).clear()
+        self._href_index.clear()
+        self._indexed_hrefs.clear()
+
+    def _index_href(self, key, href):
+        normalized_href = normalize_href(href)
+        if normalized_href == href:
+            # Share the same string object
+            normalized_href = href
+        self._indexed_hrefs[key] = (href, normalized_href)
+        # Most hrefs are unique: the key is stored as is, and only duplicated
+        # hrefs get a tuple of keys.
+        keys = self._href_index.get(normalized_href)
+        if keys is None:
+            self._href_index[normalized_href] = key
+        elif isinstance(keys, tuple):
+            self._href_index[normalized_href] = keys + (key,)
+        else:
+            self._href_index[normalized_href] = (keys, key)
+
+    def _unindex_href(self, key):
+        hrefs = self._indexed_hrefs.pop(key, None)
+        if hrefs is None:
+            return
+        href = hrefs[1]
+        keys = self._href_index[href]
+        if isinstance(keys, tuple):
+            keys = tuple(k for k in keys if k != key)
+            self._href_index[href] = keys[0] if len(keys) == 1 else keys
+        else:
+            del self._href_index[href]
+
+    def get_by_href(self, href):
+        """
+        Get an item through its "href" attribute. Both hrefs are normalized
+        before comparison, so `./Text/a%20b.xhtml#part` finds the item with
+        href `Text/a b.xhtml`.
+
+        Return a ManifestItem if found, else None. Raise a LookupError if
+        many items have the same href.
+
+        When nothing is found, or an item found has a new href, the index is
+        rebuilt first (its href may have been modified in place): a lookup
+        that finds nothing costs a walk over the items.
+
+        """
+        normalized_href = normalize_href(href)
+        keys = self._href_index.get(normalized_href)
+        if keys is None or not self._is_indexed(keys):
+            self._reindex_hrefs()
+            keys = self._href_index.get(normalized_href)
+        if keys is None:
+            return None
+        elif isinstance(keys, tuple):
+            raise LookupError('Multiple items are found with this href.')
+        return self[keys]
+
+    def _is_indexed(self, keys):
+        """Return True if the items of `keys` still have their indexed href.
+        """
+        if not isinstance(keys, tuple):
+            keys = (keys,)
+        return all(self[key].href == self._indexed_hrefs[key][0]
+                   for key in keys)
+
+    def _reindex_hrefs(self):
+        """Index again the hrefs of the items that have a new one."""
+        for key, item in self.items():
+            indexed = self._indexed_hrefs.get(key)
+            if indexed is None or item.href != indexed[0]:
+                self._unindex_href(key)
+                self._index_href(key, item.href)
+
     def add_item(self, identifier, href, media_type=None, fallback=None,
                  required_namespace=None, required_modules=None,
                  fallback_style=None):
@@ -435,12 +907,33 @@ class Manifest(OrderedDict):
 
         return manifest
 
+    def write_xml_element(self, writer):
+        """Write the element with an XmlWriter, as `as_xml_element`."""
+        writer.start('manifest')
+        for item in self.values():
+            if hasattr(item, 'write_xml_element'):
+                item.write_xml_element(writer)
+            else:
+                # Items only have to provide as_xml_element
+                writer.node(item.as_xml_element())
+        writer.end()
+
+
+def _get_item_values(item):
+    """Return the values of the attributes of a manifest item, to compare it
+    with another one (items that are not ManifestItem are compared as is)."""
+    if isinstance(item, ManifestItem):
+        return tuple(getattr(item, name) for name in ManifestItem.__slots__)
+    return item
+
 
 class ManifestItem(object):
     """
     Represent an item from the epub's manifest.
 
     """
+    __slots__ = ('identifier', 'href', 'media_type', 'fallback',
+                 'required_namespace', 'required_modules', 'fallback_style')
 
     def __init__(self, identifier, href, media_type=None, fallback=None,
                  required_namespace=None, required_modules=None,
@@ -473,6 +966,22 @@ class ManifestItem(object):
 
         return item
 
+    def write_xml_element(self, writer):
+        """Write the element with an XmlWriter, as `as_xml_element`."""
+        attributes = [('id', self.identifier), ('href', self.href)]
+        if self.media_type:
+            attributes.append(('media-type', self.media_type))
+        if self.fallback:
+            attributes.append(('fallback', self.fallback))
+        if self.required_namespace:
+            attributes.append(('required-namespace',
+                               self.required_namespace))
+        if self.required_modules:
+            attributes.append(('required-modules', self.required_modules))
+        if self.fallback_style:
+            attributes.append(('fallback-style', self.fallback_style))
+        writer.element('item', attributes)
+
 
 class Spine(object):
 
@@ -503,6 +1012,17 @@ class Spine(object):
 
         return spine
 
+    def write_xml_element(self, writer):
+        """Write the element with an XmlWriter, as `as_xml_element`."""
+        writer.start('spine', [('toc', self.toc)])
+        for idref, linear in self.itemrefs:
+            if linear:
+                writer.element('itemref', [('idref', idref)])
+            else:
+                writer.element('itemref', [('idref', idref),
+                                           ('linear', 'no')])
+        writer.end()
+
 
 class Guide(object):
 
@@ -530,3 +1050,26 @@ class Guide(object):
             guide.appendChild(reference)
 
         return guide
+
+    def write_xml_element(self, writer):
+        """Write the element with an XmlWriter, as `as_xml_element`."""
+        writer.start('guide')
+        for href, ref_type, title in self.references:
+            # The type attribute is always set by as_xml_element
+            attributes = [('type', ref_type)]
+            if title:
+                attributes.append(('title', title))
+            if href:
+                attributes.append(('href', href))
+            writer.element('reference', attributes)
+        writer.end()
+
+
+def _get_role_attributes(role, file_as):
+    """Return the attributes of a creator or contributor element."""
+    attributes = []
+    if role:
+        attributes.append(('opf:role', role))
+    if file_as:
+        attributes.append(('opf:file-as', file_as))
+    return attributes
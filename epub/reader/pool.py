@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+"""
+Pool of opened epub files, to share them between calls (and threads).
+
+Opening an epub file means reading its zip directory, and parsing its
+container, OPF and NCX files. For a service reading the same books again and
+again, the EpubFilePool keeps the most recently used ones opened:
+
+    pool = EpubFilePool(capacity=64)
+
+    with pool.open_epub('path/to/book.epub') as book:
+        data = book.read_item('Text/chapter1.xhtml')
+
+Epub files are identified by their absolute path, modification time and
+size: when a file is replaced, it is open again.
+"""
+
+
+from contextlib import contextmanager
+import os
+import threading
+
+try:
+    # Only for Python 2.7+
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+from epub.reader.content import EpubFile
+
+
+class EpubFilePool(object):
+    """
+    Keep at most `capacity` EpubFile opened in read mode, and close the least
+    recently used one when a new one is open.
+
+    Others keyword arguments are given to EpubFile when an epub file is open;
+    by default, `threadsafe` is True as the epub files may be shared between
+    threads.
+
+    """
+
+    def __init__(self, capacity=32, **options):
+        if capacity < 1:
+            raise ValueError('Pool capacity must be at least 1.')
+        options.setdefault('threadsafe', True)
+        self.capacity = capacity
+        self.options = options
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._keys_by_path = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @contextmanager
+    def open_epub(self, filename):
+        """
+        Return a context manager giving the EpubFile of `filename`, from the
+        pool if it is already open.
+
+        The EpubFile must not be closed by the caller, nor used outside of
+        the `with` block: it is closed by the pool when it is evicted and no
+        longer used.
+
+        """
+        entry = self._acquire(filename)
+        try:
+            yield entry.epub_file
+        finally:
+            self._release(entry)
+
+    def close(self):
+        """
+        Remove all the epub files from the pool, and close them (files still
+        in use are closed when they are released).
+
+        """
+        with self._lock:
+            evicted = [self._evict(key) for key in list(self._entries)]
+            to_close = _get_unused(evicted)
+        _close_entries(to_close)
+
+    def _acquire(self, filename):
+        path = os.path.abspath(filename)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime, stat.st_size)
+
+        with self._lock:
+            entry = self._get_entry(key)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Open and parse the epub file without holding the lock
+        epub_file = EpubFile(path, 'r', **self.options)
+
+        with self._lock:
+            entry = self._get_entry(key)
+            if entry is None:
+                entry = _PoolEntry(epub_file)
+                entry.refs += 1
+                evicted = []
+                if path in self._keys_by_path:
+                    # The file has been modified since it was open
+                    evicted.append(self._evict(self._keys_by_path[path]))
+                self._entries[key] = entry
+                self._keys_by_path[path] = key
+                while len(self._entries) > self.capacity:
+                    oldest_key = next(iter(self._entries))
+                    evicted.append(self._evict(oldest_key))
+                to_close = _get_unused(evicted)
+            else:
+                # Another thread did open the same file in the meantime
+                to_close = [_PoolEntry(epub_file)]
+        _close_entries(to_close)
+        return entry
+
+    def _get_entry(self, key):
+        """
+        Return the entry of `key` (and mark it as in use and most recently
+        used), or None. Lock must be held.
+
+        """
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._entries[key] = entry
+            entry.refs += 1
+        return entry
+
+    def _evict(self, key):
+        """
+        Remove an entry from the pool, and return it. Lock must be held.
+
+        """
+        entry = self._entries.pop(key)
+        del self._keys_by_path[key[0]]
+        entry.evicted = True
+        return entry
+
+    def _release(self, entry):
+        with self._lock:
+            entry.refs -= 1
+            to_close = _get_unused([entry])
+        _close_entries(to_close)
+
+
+def _get_unused(entries):
+    """
+    Return entries evicted from the pool and no longer in use: they can be
+    closed, as nobody can acquire them anymore. Lock must be held.
+
+    """
+    return [entry for entry in entries if entry.evicted and entry.refs == 0]
+
+
+def _close_entries(entries):
+    for entry in entries:
+        entry.epub_file.close()
+
+
+class _PoolEntry(object):
+
+    def __init__(self, epub_file):
+        self.epub_file = epub_file
+        self.refs = 0
+        self.evicted = False
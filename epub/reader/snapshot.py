@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+"""
+Snapshots of parsed OPF and NCX files.
+
+Parsing the OPF and NCX files is the main cost of opening an epub file. A
+snapshot is a binary (pickled) copy of the Opf and Ncx objects of an epub
+file, that is loaded without parsing any XML. A SnapshotCache keeps them in a
+directory, and is used by EpubFile:
+
+    snapshots = SnapshotCache('/var/cache/epub')
+
+    with open_epub('path/to/book.epub', snapshots=snapshots) as book:
+        print(book.opf.metadata.titles)
+
+Snapshots are identified by the archive (its absolute path, modification time
+and size, as for a MemberCache) and by the path, CRC and size of its OPF file,
+as found in the archive's directory: the archive is not read to find its
+snapshot, and a snapshot is never used once the epub file has been modified or
+replaced. The CRC of the NCX file is stored in the snapshot, and checked when
+it is loaded. Archives open from a file object without name have no snapshot.
+
+A snapshot is saved once the OPF file is parsed, without the Ncx object if the
+NCX file is not parsed yet (in lazy mode), and saved again with it once it is.
+
+As snapshots are pickled data, the cache directory must not be writable by
+untrusted users.
+"""
+
+
+import hashlib
+import os
+import tempfile
+
+from epub import utils
+from epub.reader import cache as member_cache
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+
+SNAPSHOT_HEADER = b'EPUBSNAP'
+
+# Incremented when the format or the snapshot classes change, so old
+# snapshots are ignored.
+SNAPSHOT_VERSION = 2
+
+
+class BadSnapshot(Exception):
+    pass
+
+
+def dumps(opf, toc, ncx_info=None):
+    """
+    Return a snapshot of an Opf and an Ncx objects (or None), as bytes.
+
+    `ncx_info` is the (path, CRC) of the NCX file, or None if the epub file
+    has no NCX file.
+
+    """
+    data = pickle.dumps((SNAPSHOT_VERSION, opf, toc, ncx_info),
+                        pickle.HIGHEST_PROTOCOL)
+    return SNAPSHOT_HEADER + data
+
+
+def loads(data):
+    """
+    Return the (opf, toc, ncx_info) of a snapshot made by `dumps`.
+
+    Raise BadSnapshot if the data is not a snapshot, or is a snapshot from
+    another version.
+
+    """
+    if not data.startswith(SNAPSHOT_HEADER):
+        raise BadSnapshot('Not a snapshot.')
+    try:
+        version, opf, toc, ncx_info = pickle.loads(
+            data[len(SNAPSHOT_HEADER):])
+    except Exception as error:
+        raise BadSnapshot('Can not load snapshot: %s' % error)
+    if version != SNAPSHOT_VERSION:
+        raise BadSnapshot('Snapshot version %r is not supported.' % version)
+    return opf, toc, ncx_info
+
+
+class SnapshotCache(object):
+    """
+    Keep snapshots of the Opf and Ncx objects of epub files in `directory`,
+    one file per snapshot (created if needed).
+
+    """
+
+    def __init__(self, directory):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+
+    def get_key(self, epub_file):
+        """
+        Return the key of the snapshot of `epub_file`: a hash of the identity
+        of its archive (see epub.reader.cache.get_archive_key), and of the
+        path, CRC and size of its OPF file.
+
+        Return None if the archive has no identity (a file object without
+        name): it has no snapshot.
+
+        """
+        archive_key = member_cache.get_archive_key(epub_file)
+        if len(archive_key) == 1:
+            return None
+        path, mtime, size = archive_key
+        info = epub_file.getinfo(epub_file.opf_path)
+        key = '%s\0%r\0%d\0%s\0%08x\0%d' % (path, mtime, size, info.filename,
+                                            info.CRC, info.file_size)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def get_path(self, epub_file):
+        """
+        Return the path of the snapshot of `epub_file`, or None if it has no
+        snapshot.
+
+        """
+        key = self.get_key(epub_file)
+        if key is None:
+            return None
+        return os.path.join(self.directory, '%s.snapshot' % key)
+
+    def load(self, epub_file):
+        """
+        Return the (opf, toc) of `epub_file` from its snapshot, or None if
+        there is no valid snapshot. `toc` is None if the snapshot was saved
+        before the NCX file was parsed.
+
+        """
+        path = self.get_path(epub_file)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            return None
+
+        try:
+            opf, toc, ncx_info = loads(data)
+        except BadSnapshot:
+            return None
+
+        if ncx_info is not None:
+            ncx_path, ncx_crc = ncx_info
+            try:
+                if epub_file.getinfo(ncx_path).CRC != ncx_crc:
+                    return None
+            except KeyError:
+                return None
+        return opf, toc
+
+    def save(self, epub_file, opf, toc=None):
+        """
+        Save a snapshot of the Opf and Ncx objects of `epub_file` (`toc` is
+        None if the NCX file is not parsed yet).
+
+        The snapshot is written in a temporary file first, so a snapshot being
+        saved is never loaded.
+
+        """
+        path = self.get_path(epub_file)
+        if path is None:
+            return
+        ncx_info = None
+        item_toc = opf.manifest.get(opf.spine.toc)
+        if item_toc is not None:
+            ncx_path = epub_file._get_item_path(item_toc)
+            ncx_info = (ncx_path, epub_file.getinfo(ncx_path).CRC)
+        data = dumps(opf, toc, ncx_info)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory,
+                                        suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            utils.replace_file(tmp_path, path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    def clear(self):
+        """Remove all the snapshots."""
+        for name in os.listdir(self.directory):
+            if name.endswith('.snapshot'):
+                os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+"""
+XML backends used by the reader to parse container, OPF and NCX files.
+
+Three backends are available:
+
+* "lxml" uses `lxml.etree` (only when lxml is installed),
+* "etree" uses `xml.etree.ElementTree` from the standard library (expat),
+* "minidom" uses `xml.dom.minidom`, and builds a full DOM tree.
+
+The "lxml" and "etree" backends share the ElementTree API, so the reader
+modules use the same code for both of them. The default backend is "lxml"
+when it is available, and "minidom" otherwise.
+"""
+
+
+import threading
+from xml.dom import minidom
+from xml.etree import ElementTree
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+
+LXML = 'lxml'
+ETREE = 'etree'
+MINIDOM = 'minidom'
+
+XMLNS_XML = 'http://www.w3.org/XML/1998/namespace'
+XML_LANG = '{%s}lang' % XMLNS_XML
+
+_default_backend = LXML if lxml_etree is not None else MINIDOM
+_lxml_parsers = threading.local()
+
+
+def get_available_backends():
+    """Return the list of backends that can be used."""
+    if lxml_etree is None:
+        return [ETREE, MINIDOM]
+    return [LXML, ETREE, MINIDOM]
+
+
+def get_default_backend():
+    return _default_backend
+
+
+def set_default_backend(backend):
+    """Set the backend used when none is given to the parse functions."""
+    global _default_backend
+    _default_backend = get_backend(backend)
+
+
+def get_backend(backend=None):
+    """Return `backend` if it is available, or the default backend if
+    `backend` is None.
+
+    Raise a ValueError if the backend is unknown or not available.
+    """
+    if backend is None:
+        return _default_backend
+    if backend not in get_available_backends():
+        raise ValueError('XML backend "%s" is not available.' % backend)
+    return backend
+
+
+def parse(xml_string, backend=None):
+    """Parse an xml string and return its root element.
+
+    With the "minidom" backend, it is an xml.dom.Element object; with others
+    backends, it is an ElementTree-like Element object. Documents too deep
+    for lxml are parsed with ElementTree.
+    """
+    backend = get_backend(backend)
+    if backend == LXML:
+        encoding = None
+        data = xml_string
+        if not isinstance(data, bytes):
+            # lxml does not parse unicode strings with an encoding declaration
+            data = data.encode('utf-8')
+            encoding = 'utf-8'
+        try:
+            return lxml_etree.fromstring(data, _get_lxml_parser(encoding))
+        except lxml_etree.XMLSyntaxError as error:
+            if 'depth' not in str(error):
+                raise
+        # libxml2 refuses documents nested deeper than 256 levels, when
+        # expat has no such limit: the document is parsed with ElementTree.
+        return ElementTree.fromstring(xml_string)
+    elif backend == ETREE:
+        return ElementTree.fromstring(xml_string)
+    return minidom.parseString(xml_string).documentElement
+
+
+def iterparse(source, events=None, backend=None, encoding=None):
+    """Incrementally parse a file-like object, as ElementTree.iterparse.
+
+    The "minidom" backend has no incremental parser, and ElementTree's one
+    is used in that case. `encoding` overrides the document's encoding with
+    the "lxml" backend only.
+    """
+    if get_backend(backend) == LXML:
+        return lxml_etree.iterparse(source, events=events, encoding=encoding,
+                                    resolve_entities=False)
+    return ElementTree.iterparse(source, events)
+
+
+def _get_lxml_parser(encoding=None):
+    """Return a lxml parser, one per thread and encoding."""
+    parsers = _lxml_parsers.__dict__
+    if encoding not in parsers:
+        parsers[encoding] = lxml_etree.XMLParser(encoding=encoding,
+                                                 resolve_entities=False)
+    return parsers[encoding]
+
+
+def get_local_name(tag):
+    """Return the name of an ElementTree tag, without its namespace."""
+    if tag[:1] == '{':
+        return tag.split('}', 1)[1]
+    return tag
+
+
+def get_namespace(tag):
+    """Return the namespace of an ElementTree tag, or None."""
+    if tag[:1] == '{':
+        return tag[1:].split('}', 1)[0]
+    return None
+
+
+def iter_children(element):
+    """Iterate over children elements of an ElementTree element, and yield
+    each one with its local name (comments and processing instructions are
+    ignored)."""
+    for child in element:
+        if isinstance(child.tag, string_types):
+            yield get_local_name(child.tag), child
+
+
+def iter_descendants(element):
+    """Iterate over descendants elements of an ElementTree element (the
+    element itself included), and yield each one with its local name."""
+    for node in element.iter():
+        if isinstance(node.tag, string_types):
+            yield get_local_name(node.tag), node
+
+
+def get_text(element):
+    """Return the stripped text of an ElementTree element, as
+    epub.utils.get_node_text does for xml.dom elements."""
+    if element.text:
+        return element.text.strip()
+    return ''
+
+
+def is_dom(element):
+    """Return True if element comes from the "minidom" backend."""
+    return isinstance(element, minidom.Node)
+
+
+def get_elements_by_name(element, name):
+    """Return descendants elements of `element` with the local name `name`,
+    whatever the backend is."""
+    if is_dom(element):
+        return element.getElementsByTagNameNS('*', name)
+    return [node for node_name, node in iter_descendants(element)
+            if node_name == name]
+
+
+def get_attribute(element, name):
+    """Return the value of the attribute `name` (an empty string if there is
+    no such attribute), whatever the backend is."""
+    if is_dom(element):
+        return element.getAttribute(name)
+    return element.get(name, '')
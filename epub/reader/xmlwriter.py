@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+
+"""
+Write XML documents without building a DOM.
+
+The OPF and NCX files of an epub are written by their objects with an
+XmlWriter, as `write_xml_document` methods:
+
+    with open('content.opf', 'wb') as f:
+        book.opf.write_xml_document(f)
+
+The output is the same, byte for byte, as the one of `as_xml_document`
+serialized by minidom (`as_xml_document().toxml().encode('utf-8')`), but no
+node is created: the document is written as it goes, element by element.
+"""
+
+
+import sys
+
+
+XML_DECLARATION = '<?xml version="1.0" ?>'
+
+# minidom writes attributes sorted by name before Python 3.8, and in their
+# order of creation since then.
+SORT_ATTRIBUTES = sys.version_info < (3, 8)
+
+# Number of parts kept before they are encoded and written to the stream
+BUFFER_SIZE = 1024
+
+
+def escape(data):
+    """
+    Return `data` escaped as minidom does, for text and attribute values
+    (None and empty values are written as empty strings).
+    """
+    if not data:
+        return ''
+    return data.replace('&', '&amp;').replace('<', '&lt;').replace(
+        '"', '&quot;').replace('>', '&gt;')
+
+
+class XmlWriter(object):
+    """
+    Write an XML document to `stream`, a binary file-like object, encoded in
+    `encoding`.
+
+    Elements are written with `start` and `end`, or `element` for an element
+    without children and `text_element` for an element with text only: a
+    start tag is closed when its first child is written, or written as an
+    empty element tag (`<tag/>`) if it has none.
+
+    Attributes are given as a list of (name, value) pairs, each name once;
+    they are written in the same order as minidom would.
+
+    """
+
+    def __init__(self, stream, encoding='utf-8'):
+        self.stream = stream
+        self.encoding = encoding
+        self._parts = []
+        self._tags = []
+        self._open = False
+
+    def declaration(self):
+        self._write(XML_DECLARATION)
+
+    def start(self, tag, attributes=()):
+        self._close_start_tag()
+        self._write('<' + tag)
+        self._write_attributes(attributes)
+        self._tags.append(tag)
+        self._open = True
+
+    def end(self):
+        tag = self._tags.pop()
+        if self._open:
+            self._write('/>')
+            self._open = False
+        else:
+            self._write('</%s>' % tag)
+
+    def element(self, tag, attributes=()):
+        self.start(tag, attributes)
+        self.end()
+
+    def text_element(self, tag, text, attributes=()):
+        """
+        Write an element with a text node, even an empty one (as
+        `doc.createTextNode(text)` would).
+        """
+        self._close_start_tag()
+        self._write('<' + tag)
+        self._write_attributes(attributes)
+        self._write('>%s</%s>' % (escape('%s' % text), tag))
+
+    def node(self, node):
+        """Write a minidom node, as `node.toxml()` would."""
+        self._close_start_tag()
+        node.writexml(self)
+
+    def write(self, data):
+        """Write some XML text as is (used by minidom's writexml)."""
+        self._write(data)
+
+    def flush(self):
+        """Write the buffered parts to the stream."""
+        if self._parts:
+            self.stream.write(''.join(self._parts).encode(self.encoding))
+            del self._parts[:]
+
+    def _write(self, data):
+        self._parts.append(data)
+        if len(self._parts) >= BUFFER_SIZE:
+            self.flush()
+
+    def _close_start_tag(self):
+        if self._open:
+            self._write('>')
+            self._open = False
+
+    def _write_attributes(self, attributes):
+        if SORT_ATTRIBUTES:
+            attributes = sorted(attributes)
+        for name, value in attributes:
+            self._write(' %s="%s"' % (name, escape(value)))
@@ -1,6 +1,15 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 import os
+import posixpath
+import sys
+
+from epub import const
+
+try:
+    from urllib.parse import unquote
+except ImportError:
+    from urllib import unquote
 
 
 def get_node_text(node):
@@ -39,6 +48,101 @@ def get_urlpath_part(urlpath):
     return (href, fragment)
 
 
+def normalize_href(href):
+    """
+    Return a normalized version of an href, to compare paths of items.
+
+    The url fragment is removed, percent-encoded characters are decoded, and
+    `.` and `..` segments are resolved.
+
+    eg.:
+
+        print normalize_href('./Text/../Text/chapter%201.xhtml#part2')
+        # 'Text/chapter 1.xhtml'
+    """
+    path = unquote(href.split('#', 1)[0])
+    if not path:
+        return path
+    path = posixpath.normpath(path)
+    if path == '.':
+        return ''
+    return path
+
+
+# Well-known values are always interned to the constant itself
+_WELL_KNOWN_STRINGS = dict((value, value) for value in (
+    const.MIMETYPE_EPUB, const.MIMETYPE_HTML, const.MIMETYPE_OPF,
+    const.MIMETYPE_NCX, const.MIMETYPE_JS, const.MIMETYPE_CSS))
+
+# Maximum number of strings kept by an _InternTable
+INTERN_TABLE_SIZE = 10000
+
+
+class _InternTable(object):
+    """
+    Intern strings in a dict of at most `max_size` strings.
+
+    Strings interned by sys.intern are freed once they are not used anymore,
+    but the ones of a dict are kept as long as the dict: the table is
+    cleared when it is full, so that a long-running process does not keep
+    the values (ids, hrefs, ...) of every book it has parsed.
+
+    """
+
+    def __init__(self, max_size=INTERN_TABLE_SIZE):
+        self.max_size = max_size
+        self._strings = {}
+
+    def __len__(self):
+        return len(self._strings)
+
+    def __call__(self, value):
+        interned = self._strings.get(value)
+        if interned is None:
+            if len(self._strings) >= self.max_size:
+                self._strings.clear()
+            self._strings[value] = interned = value
+        return interned
+
+
+if sys.version_info[0] >= 3:
+    _intern = sys.intern
+else:
+    # intern() does not accept unicode strings in Python 2
+    _intern = _InternTable()
+
+
+def intern_string(value):
+    """
+    Return an interned version of the string `value`: equal values parsed
+    from many files share the same string object (and the memory it uses).
+
+    Values from epub.const are returned as the constant itself.
+    """
+    if not value:
+        return value
+    well_known = _WELL_KNOWN_STRINGS.get(value)
+    if well_known is not None:
+        return well_known
+    return _intern(value)
+
+
+def keep_string(value):
+    """Return `value` as is; used in place of intern_string."""
+    return value
+
+
+try:
+    replace_file = os.replace
+except AttributeError:
+    # Python 2: os.rename does not replace an existing file on Windows
+    def replace_file(source, destination):
+        """Rename the file `source` to `destination`, replacing it."""
+        if os.name == 'nt' and os.path.exists(destination):
+            os.remove(destination)
+        os.rename(source, destination)
+
+
 def get_module_path(module):
     return os.path.dirname(module.__file__)
 
@@ -19,7 +19,7 @@ from lxml import etree
 
 from genshi.template import TemplateLoader
 
-from epub import const
+from epub import const, zipio
 
 
 class ToCMapNode(object):
@@ -328,7 +328,9 @@ class EPubBook(object):
             namespaces={'opf': 'http://www.idpf.org/2007/opf'})
 
     @staticmethod
-    def create_archive(root_dir, output_path):
+    def create_archive(root_dir, output_path, workers=1):
+        # With more than one worker, files are deflated by a pool of threads
+        # (None for the number of CPUs), and written in manifest order.
         fout = zipfile.ZipFile(output_path, 'w')
         cwd = os.getcwd()
         os.chdir(root_dir)
@@ -338,8 +340,16 @@ class EPubBook(object):
         fileList.append(const.OPF_PATH)
         for itemPath in EPubBook._list_manifest_items(const.OPF_PATH):
             fileList.append(os.path.join('OEBPS', itemPath))
-        for filePath in fileList:
-            fout.write(filePath, compress_type = zipfile.ZIP_DEFLATED)
+        if workers == 1:
+            for filePath in fileList:
+                fout.write(filePath, compress_type = zipfile.ZIP_DEFLATED)
+        else:
+            pool = zipio.DeflatePool(fout, workers)
+            try:
+                for filePath in fileList:
+                    pool.write(filePath, compress_type = zipfile.ZIP_DEFLATED)
+            finally:
+                pool.close()
         fout.close()
         os.chdir(cwd)
 
@@ -349,7 +359,7 @@ class EPubBook(object):
         #print cmd
         subprocess.call(cmd, shell=False)
 
-    def create_book(self, root_dir, extension='.epub'):
+    def create_book(self, root_dir, extension='.epub', workers=1):
         if self.title_page:
             self._make_title_page()
         if self.toc_page:
@@ -361,4 +371,4 @@ class EPubBook(object):
         self._write_container_xml()
         self._write_content_opf()
         self._write_toc_ncx()
-        self.create_archive(root_dir, root_dir + extension)
\ No newline at end of file
+        self.create_archive(root_dir, root_dir + extension, workers)
\ No newline at end of file
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+Low-level helpers to access the members of a zip archive.
+
+The zipfile module reads members through the archive's file object; these
+helpers work from the central directory's ZipInfo objects and a `read_at`
+function, that returns `size` bytes at `offset` in the archive (through a
+memory map or os.pread for example), so members can be read without seeking
+the archive's file object.
+
+`write_raw` writes a member to another archive from its raw data, without
+compressing it again, and a DeflatePool compresses members in many threads
+before they are written in order.
+"""
+from collections import deque
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import os
+import struct
+import time
+import zipfile
+import zlib
+
+
+# Local file header: signature, version, flags, compression, time, date,
+# crc-32, compressed size, uncompressed size, file name length, extra length
+LOCAL_HEADER_FORMAT = '<4s5H3L2H'
+LOCAL_HEADER_SIZE = struct.calcsize(LOCAL_HEADER_FORMAT)
+LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+# Bit 0 of the general purpose flags: the member is encrypted
+FLAG_ENCRYPTED = 0x1
+
+
+def is_readable(info):
+    """
+    Return True if the member described by `info` (a zipfile.ZipInfo) can be
+    read by these helpers: it is not encrypted, and it is either stored or
+    deflated.
+
+    """
+    return (not info.flag_bits & FLAG_ENCRYPTED and
+            info.compress_type in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED))
+
+
+def get_data_offset(read_at, info):
+    """
+    Return the offset of the member's data in the archive, just after its
+    local file header.
+
+    """
+    header = read_at(info.header_offset, LOCAL_HEADER_SIZE)
+    fields = struct.unpack(LOCAL_HEADER_FORMAT, header)
+    if fields[0] != LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipfile('Bad magic number for file header')
+    name_length, extra_length = fields[-2:]
+    return (info.header_offset + LOCAL_HEADER_SIZE +
+            name_length + extra_length)
+
+
+def read_raw(read_at, info):
+    """
+    Return the raw (compressed) data of the member described by `info`.
+
+    """
+    return read_at(get_data_offset(read_at, info), info.compress_size)
+
+
+def decompress(info, data):
+    """
+    Return the content of the member described by `info` from its raw
+    `data`, and check its CRC.
+
+    Raise zipfile.BadZipfile if the CRC does not match.
+
+    """
+    if info.compress_type == zipfile.ZIP_DEFLATED:
+        data = zlib.decompress(data, -zlib.MAX_WBITS, info.file_size or 1)
+    check_crc(info, data)
+    return data
+
+
+def check_crc(info, data):
+    """
+    Raise zipfile.BadZipfile if `data` does not match the CRC of `info`.
+
+    """
+    if zlib.crc32(data) & 0xffffffff != info.CRC:
+        raise zipfile.BadZipfile('Bad CRC-32 for file %r' % info.filename)
+
+
+# Data descriptor, written after the data of a member when bit 3 of its flags
+# is set: signature, crc-32, compressed size, uncompressed size
+DATA_DESCRIPTOR_FORMAT = '<4s3L'
+DATA_DESCRIPTOR_FORMAT_64 = '<4sL2Q'
+DATA_DESCRIPTOR_SIGNATURE = b'PK\x07\x08'
+
+# Bit 3 of the general purpose flags: crc-32 and sizes are in a data
+# descriptor, after the member's data
+FLAG_DATA_DESCRIPTOR = 0x8
+
+# Header id of the zip64 extra field (written again by zipfile when needed)
+ZIP64_EXTRA_ID = 0x0001
+
+# ZipInfo attributes copied as is from the source member
+RAW_ATTRIBUTES = ('compress_type', 'comment', 'create_system',
+                  'create_version', 'extract_version', 'reserved',
+                  'flag_bits', 'volume', 'internal_attr', 'external_attr',
+                  'CRC', 'compress_size', 'file_size')
+
+
+def strip_zip64_extra(extra):
+    """
+    Return the `extra` field of a member without its zip64 record.
+
+    """
+    records = []
+    position = 0
+    while position + 4 <= len(extra):
+        header_id, size = struct.unpack('<2H', extra[position:position + 4])
+        end = position + 4 + size
+        if header_id != ZIP64_EXTRA_ID:
+            records.append(extra[position:end])
+        position = end
+    return b''.join(records)
+
+
+def write_raw(zip_file, info, data):
+    """
+    Write a member to `zip_file` (a zipfile.ZipFile open for writing) from its
+    raw `data` (as returned by `read_raw`) and `info`, the ZipInfo of the
+    member in its source archive.
+
+    The data is neither decompressed nor compressed again: the member keeps
+    its compression, CRC and sizes. Return the ZipInfo of the new member.
+
+    """
+    if getattr(zip_file, '_writing', False):
+        raise ValueError("Can't write to the ZIP file while there is "
+                         "another write handle open on it.")
+    if len(data) != info.compress_size:
+        raise zipfile.BadZipfile('Truncated data for file %r' % info.filename)
+
+    new_info = zipfile.ZipInfo(info.filename, info.date_time)
+    for name in RAW_ATTRIBUTES:
+        setattr(new_info, name, getattr(info, name))
+    new_info.extra = strip_zip64_extra(info.extra)
+
+    lock = getattr(zip_file, '_lock', None)
+    if lock is not None:
+        lock.acquire()
+    try:
+        zip_file._writecheck(new_info)
+        if hasattr(zip_file, 'start_dir'):
+            zip_file.fp.seek(zip_file.start_dir)
+        new_info.header_offset = zip_file.fp.tell()
+        zip_file.fp.write(new_info.FileHeader())
+        zip_file.fp.write(data)
+        if new_info.flag_bits & FLAG_DATA_DESCRIPTOR:
+            sizes = (new_info.compress_size, new_info.file_size)
+            if max(sizes) > zipfile.ZIP64_LIMIT:
+                descriptor_format = DATA_DESCRIPTOR_FORMAT_64
+            else:
+                descriptor_format = DATA_DESCRIPTOR_FORMAT
+            zip_file.fp.write(struct.pack(
+                descriptor_format, DATA_DESCRIPTOR_SIGNATURE, new_info.CRC,
+                new_info.compress_size, new_info.file_size))
+        if hasattr(zip_file, 'start_dir'):
+            zip_file.start_dir = zip_file.fp.tell()
+        zip_file.filelist.append(new_info)
+        zip_file.NameToInfo[new_info.filename] = new_info
+        zip_file._didModify = True
+    finally:
+        if lock is not None:
+            lock.release()
+    return new_info
+
+
+def get_file_info(filename, arcname=None, compress_type=zipfile.ZIP_DEFLATED):
+    """
+    Return the ZipInfo of the file `filename` written to an archive as
+    `arcname` (by default `filename`), as zipfile.ZipFile.write would.
+
+    """
+    st = os.stat(filename)
+    if arcname is None:
+        arcname = filename
+    arcname = os.path.normpath(os.path.splitdrive(arcname)[1])
+    arcname = arcname.lstrip(os.sep).replace(os.sep, '/')
+    info = zipfile.ZipInfo(arcname, time.localtime(st.st_mtime)[:6])
+    info.external_attr = (st.st_mode & 0xFFFF) << 16
+    info.compress_type = compress_type
+    return info
+
+
+def compress(info, data, level=zlib.Z_DEFAULT_COMPRESSION):
+    """
+    Return the raw data of the member described by `info` from its content
+    `data`, stored or deflated according to its compression, and set its CRC
+    and sizes.
+
+    """
+    info.file_size = len(data)
+    info.CRC = zlib.crc32(data) & 0xffffffff
+    if info.compress_type == zipfile.ZIP_DEFLATED:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        data = compressor.compress(data) + compressor.flush()
+    elif info.compress_type != zipfile.ZIP_STORED:
+        raise NotImplementedError('Compression method not supported')
+    info.compress_size = len(data)
+    return data
+
+
+def _compress_file(info, filename, level):
+    with open(filename, 'rb') as f:
+        return compress(info, f.read(), level)
+
+
+class DeflatePool(object):
+    """
+    Compress members in a pool of `workers` threads (by default, the number
+    of CPUs), and write them to `zip_file` in the order they were added.
+
+    zlib releases the GIL while it compresses, so members are deflated on
+    many cores at once; they are written to the archive (with `write_raw`) as
+    soon as they and all the members added before them are compressed.
+    At most `max_pending` members (by default, twice the number of workers)
+    wait to be written: adding another one waits for the first of them.
+
+    """
+
+    def __init__(self, zip_file, workers=None, max_pending=None,
+                 level=zlib.Z_DEFAULT_COMPRESSION):
+        self.zip_file = zip_file
+        self.level = level
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self._pool = ThreadPool(workers)
+        if max_pending is None:
+            max_pending = 2 * workers
+        self.max_pending = max(max_pending, 1)
+        self._pending = deque()
+
+    def write(self, filename, arcname=None,
+              compress_type=zipfile.ZIP_DEFLATED):
+        """
+        Add the file `filename` as the member `arcname`, read and compressed
+        in the pool.
+
+        """
+        info = get_file_info(filename, arcname, compress_type)
+        self._add(info, _compress_file, (info, filename, self.level))
+
+    def writestr(self, info, data, compress_type=zipfile.ZIP_DEFLATED):
+        """
+        Add a member with the content `data` (bytes), compressed in the pool.
+        `info` is the name of the member, or its ZipInfo.
+
+        """
+        if not isinstance(info, zipfile.ZipInfo):
+            info = zipfile.ZipInfo(info, time.localtime(time.time())[:6])
+            info.external_attr = 0o600 << 16
+            info.compress_type = compress_type
+        self._add(info, compress, (info, data, self.level))
+
+    def flush(self):
+        """Wait for the members added, and write them all."""
+        while self._pending:
+            self._write_first()
+
+    def close(self):
+        """
+        Write the members added, and stop the threads of the pool.
+
+        A member that can not be compressed does not stop the others from
+        being written: its error is raised once they all are, and the pool is
+        stopped.
+
+        """
+        error = None
+        try:
+            while self._pending:
+                try:
+                    self._write_first()
+                except Exception as member_error:
+                    if error is None:
+                        error = member_error
+        finally:
+            self._pending.clear()
+            self._pool.terminate()
+            self._pool.join()
+        if error is not None:
+            raise error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _add(self, info, func, args):
+        self._pending.append((info, self._pool.apply_async(func, args)))
+        while len(self._pending) > self.max_pending:
+            self._write_first()
+
+    def _write_first(self):
+        info, result = self._pending.popleft()
+        write_raw(self.zip_file, info, result.get())
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Test cases of epub.reader.aio, imported by test_aio on Python 3.7+ only:
+they are not even compiled on older versions.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import os
+import threading
+import unittest
+
+from epub.reader import aio, content
+
+
+def run_async(test):
+    """Run a coroutine test method in its own event loop."""
+    @functools.wraps(test)
+    def wrapper(self):
+        return asyncio.run(test(self))
+    return wrapper
+
+
+class AsyncEpubFileTestCase(unittest.TestCase):
+
+    epub_path = os.path.join(os.path.dirname(__file__), '_data/test.epub')
+
+    def setUp(self):
+        with content.open_epub(self.epub_path) as book:
+            self.spine = [idref for idref, linear in book.opf.spine.itemrefs]
+            self.expected = dict((idref, book.read_item(book.get_item(idref)))
+                                 for idref in self.spine)
+        self.executor = ThreadPoolExecutor(2)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    @run_async
+    async def test_open_epub(self):
+        async with await aio.open_epub(self.epub_path) as book:
+            self.assertTrue(book.epub_file.threadsafe)
+            self.assertEqual(book.opf.metadata.titles, [('Testing Epub', '')])
+            self.assertIsNotNone(book.toc)
+            data = await book.read_item('Text/cover.xhtml')
+            self.assertEqual(data, self.expected['cover.xhtml'])
+        self.assertIsNone(book.epub_file.fp)
+
+        with self.assertRaises(IOError):
+            await aio.open_epub('unknown.epub')
+
+    @run_async
+    async def test_open_epub_lazy(self):
+        book = await aio.open_epub(self.epub_path, self.executor, lazy=True)
+        self.assertIsNotNone(book.epub_file._opf)
+        self.assertIsNotNone(book.epub_file._toc)
+        await book.close()
+
+    @run_async
+    async def test_read_item_concurrently(self):
+        async with await aio.open_epub(self.epub_path, self.executor,
+                                       max_pending=2) as book:
+            idrefs = self.spine * 10
+            results = await asyncio.gather(
+                *[book.read_item(book.get_item(idref)) for idref in idrefs])
+            self.assertEqual(results,
+                             [self.expected[idref] for idref in idrefs])
+
+    @run_async
+    async def test_iter_spine(self):
+        async with await aio.open_epub(self.epub_path, self.executor) as book:
+            result = [(item, data) async for item, data in book.iter_spine()]
+        self.assertEqual([item.identifier for item, data in result],
+                         self.spine)
+        for item, data in result:
+            self.assertEqual(data, self.expected[item.identifier])
+
+    @run_async
+    async def test_iter_spine_stop(self):
+        async with await aio.open_epub(self.epub_path, self.executor) as book:
+            iterator = book.iter_spine(prefetch=1)
+            item, data = await iterator.__anext__()
+            self.assertEqual(item.identifier, self.spine[0])
+            await iterator.aclose()
+
+    @run_async
+    async def test_cancel(self):
+        started = threading.Event()
+        blocked = threading.Event()
+
+        def block():
+            started.set()
+            blocked.wait(5)
+
+        async with await aio.open_epub(self.epub_path, self.executor,
+                                       max_pending=1) as book:
+            running = asyncio.ensure_future(book._run(block))
+            await asyncio.get_running_loop().run_in_executor(None,
+                                                           started.wait)
+            waiting = asyncio.ensure_future(book.read_item('Text/cover.xhtml'))
+            await asyncio.sleep(0.01)
+            # The read waits for the blocking call (backpressure)
+            self.assertFalse(waiting.done())
+
+            waiting.cancel()
+            running.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await running
+            blocked.set()
+
+            # The slot is released once the blocking call is really over
+            data = await asyncio.wait_for(book.read_item('Text/cover.xhtml'),
+                                          5)
+            self.assertEqual(data, self.expected['cover.xhtml'])
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+import sys
+import unittest
+
+if sys.version_info < (3, 7):
+    raise unittest.SkipTest('epub.reader.aio requires Python 3.7+')
+
+from test.reader.aio_cases import AsyncEpubFileTestCase  # noqa: F401
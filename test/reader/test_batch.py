@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import os
+from shutil import copy, rmtree
+import tempfile
+import unittest
+import zipfile
+
+from epub.reader import batch
+
+
+class IterMetadataTestCase(unittest.TestCase):
+
+    epub_path = os.path.join(os.path.dirname(__file__), '_data/test.epub')
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.paths = []
+        for i in range(4):
+            path = os.path.join(self.tmp_dir, 'book%d.epub' % i)
+            copy(self.epub_path, path)
+            self.paths.append(path)
+
+        # Not a zip file
+        self.not_zip_path = os.path.join(self.tmp_dir, 'not_zip.epub')
+        with open(self.not_zip_path, 'wb') as f:
+            f.write(b'not a zip file')
+
+        # Zip file without container
+        self.no_container_path = os.path.join(self.tmp_dir, 'empty.epub')
+        with zipfile.ZipFile(self.no_container_path, 'w') as f:
+            f.writestr('mimetype', b'application/epub+zip')
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def check_results(self, results):
+        results = dict((result.path, result) for result in results)
+        self.assertEqual(len(results), 7)
+
+        for path in self.paths:
+            self.assertIsNone(results[path].error)
+            self.assertEqual(results[path].metadata.titles,
+                             [('Testing Epub', '')])
+
+        for path in (self.not_zip_path, self.no_container_path,
+                     'unknown.epub'):
+            self.assertIsNone(results[path].metadata)
+            self.assertTrue(results[path].error)
+
+        self.assertTrue(
+            results[self.not_zip_path].error.startswith('BadZip'))
+        self.assertIn('META-INF/container.xml',
+                      results[self.no_container_path].error)
+
+    def test_iter_metadata(self):
+        paths = self.paths + [self.not_zip_path, self.no_container_path,
+                              'unknown.epub']
+        self.check_results(batch.iter_metadata(paths, workers=2))
+        self.check_results(batch.iter_metadata(iter(paths), workers=1))
+
+    def test_stop_iteration(self):
+        results = batch.iter_metadata(self.paths, workers=2)
+        self.assertIsNone(next(results).error)
+        results.close()
@@ -18,6 +18,30 @@ class TestBookChapter(unittest.TestCase):
         self.assertEquals(chapter.read(),
                           self.epub_file.read_item(origin))
 
+    def test_read_fragment(self):
+        chapter = book.BookChapter(self.book, 'Section0001.xhtml',
+                                   'heading_id_3')
+        self.assertEqual(chapter.fragment, 'heading_id_3')
+        data = chapter.read()
+        section = chapter.read_fragment()
+        self.assertTrue(section.startswith(b'<h2 id="heading_id_3">'))
+        self.assertIn(section, data)
+        self.assertNotIn(b'heading_id_4', section)
+        self.assertTrue(data.index(section) + len(section) ==
+                        data.index(b'<h2 id="heading_id_4">'))
+
+        # The index is built once per file
+        index = self.book.get_fragment_index(chapter)
+        self.assertIs(self.book.get_fragment_index(
+            self.book.chapter_by_id('Section0001.xhtml')), index)
+        self.assertEqual(chapter.read_fragment('heading_id_4'),
+                         data[slice(*index['heading_id_4'])])
+
+        # The whole chapter without a (known) fragment
+        self.assertEqual(chapter.read_fragment('unknown'), data)
+        self.assertEqual(self.book.chapters[0].read_fragment(),
+                         self.book.chapters[0].read())
+
 
 class TestBook(unittest.TestCase):
     """
@@ -41,6 +65,52 @@ class TestBook(unittest.TestCase):
             self.assertIsNotNone(chapter)
             self.assertIsInstance(chapter, book.BookChapter)
 
+    def test_chapters_cached(self):
+        obj = book.Book(self.epub_file)
+        chapters = obj.chapters
+        self.assertIs(obj.chapters, chapters)
+        self.assertEqual([chapter.position for chapter in chapters],
+                         list(range(6)))
+
+        # Chapters are built again when the spine changes
+        self.epub_file.opf.spine.add_itemref('cover.xhtml', False)
+        self.assertIsNot(obj.chapters, chapters)
+        self.assertEqual(len(obj.chapters), 6)
+        self.assertEqual(len(obj.extra_chapters), 1)
+
+    def test_chapter_at(self):
+        obj = book.Book(self.epub_file)
+        itemrefs = self.epub_file.opf.spine.itemrefs
+        for position, (identifier, linear) in enumerate(itemrefs):
+            chapter = obj.chapter_at(position)
+            self.assertEqual(chapter.identifier, identifier)
+            self.assertIs(obj.chapter_by_id(identifier), chapter)
+        self.assertIs(obj.chapter_at(-1), obj.chapters[-1])
+        with self.assertRaises(IndexError):
+            obj.chapter_at(6)
+        self.assertIsNone(obj.chapter_by_id('unknown'))
+
+    def test_next_previous(self):
+        obj = book.Book(self.epub_file)
+        chapters = obj.chapters
+        self.assertIsNone(chapters[0].previous)
+        self.assertIsNone(chapters[-1].next)
+        for previous, chapter in zip(chapters, chapters[1:]):
+            self.assertIs(previous.next, chapter)
+            self.assertIs(chapter.previous, previous)
+            self.assertIs(obj.next_chapter(previous), chapter)
+            self.assertIs(obj.previous_chapter(chapter), previous)
+
+        # Non-linear chapters are not in reading order
+        self.epub_file.opf.spine.add_itemref('cover.xhtml', False)
+        extra_chapter = obj.extra_chapters[0]
+        self.assertIsNone(extra_chapter.position)
+        self.assertIsNone(extra_chapter.next)
+        self.assertIsNone(extra_chapter.previous)
+
+        # Chapter built before the change
+        self.assertEqual(chapters[0].next.identifier, chapters[1].identifier)
+
     def test_extra_chapters(self):
         obj = book.Book(self.epub_file)
         self.assertEquals(len(list(obj.extra_chapters)), 0)
@@ -146,4 +216,55 @@ class TestBook(unittest.TestCase):
         lang = 'fra_alt'
         self.epub_file.opf.metadata.add_title(title, lang)
         obj = book.Book(self.epub_file)
-        self.assertIn((title, lang), obj.titles)
\ No newline at end of file
+        self.assertIn((title, lang), obj.titles)
+
+
+class TestChapterReader(unittest.TestCase):
+
+    epub_path = os.path.join(os.path.dirname(__file__), '_data/test.epub')
+
+    def setUp(self):
+        self.epub_file = content.open_epub(self.epub_path)
+        self.book = book.Book(self.epub_file)
+        self.expected = [chapter.read() for chapter in self.book.chapters]
+
+    def tearDown(self):
+        self.epub_file.close()
+
+    def test_read_sequential(self):
+        with self.book.open_reader(prefetch=2) as reader:
+            result = [reader.read(position) for position in range(6)]
+            self.assertEqual(result, self.expected)
+            # Only the first chapter is not read ahead
+            self.assertEqual(reader.misses, 1)
+            self.assertEqual(reader.hits, 5)
+            self.assertAlmostEqual(reader.hit_rate, 5 / 6.0)
+            self.assertLessEqual(len(reader._cache), reader.capacity)
+        self.assertEqual(len(reader._cache), 0)
+
+    def test_read_chapter(self):
+        with self.book.open_reader(prefetch=1, capacity=2) as reader:
+            chapter = self.book.chapters[3]
+            self.assertEqual(reader.read(chapter), self.expected[3])
+            self.assertEqual(reader.read(-1), self.expected[-1])
+            self.assertEqual(reader.read(chapter), self.expected[3])
+            with self.assertRaises(IndexError):
+                reader.read(6)
+
+            self.epub_file.opf.spine.add_itemref('cover.xhtml', False)
+            with self.assertRaises(ValueError):
+                reader.read(self.book.extra_chapters[0])
+
+    def test_no_prefetch(self):
+        reader = self.book.open_reader(prefetch=0)
+        self.assertEqual(reader.read(0), self.expected[0])
+        self.assertEqual(reader.read(1), self.expected[1])
+        self.assertEqual(reader.read(1), self.expected[1])
+        self.assertEqual((reader.hits, reader.misses), (1, 2))
+        self.assertIsNone(reader._thread)
+        reader.close()
+
+        with self.assertRaises(ValueError):
+            self.book.open_reader(prefetch=-1)
+        with self.assertRaises(ValueError):
+            self.book.open_reader(prefetch=2, capacity=2)
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import os
+from shutil import copy, rmtree
+import tempfile
+import unittest
+import zipfile
+
+from epub.reader import cache, content
+
+
+class MemberCacheTestCase(unittest.TestCase):
+
+    def test_get_set(self):
+        member_cache = cache.MemberCache(max_size=10)
+        self.assertIsNone(member_cache.get('a'))
+        member_cache.set('a', b'1234')
+        self.assertEqual(member_cache.get('a'), b'1234')
+        self.assertEqual(member_cache.hits, 1)
+        self.assertEqual(member_cache.misses, 1)
+        self.assertEqual(member_cache.size, 4)
+
+        # Replace a content
+        member_cache.set('a', b'12')
+        self.assertEqual(member_cache.size, 2)
+        self.assertEqual(len(member_cache), 1)
+
+    def test_eviction(self):
+        member_cache = cache.MemberCache(max_size=10)
+        member_cache.set('a', b'1234')
+        member_cache.set('b', b'1234')
+        member_cache.get('a')
+        member_cache.set('c', b'1234')
+
+        # "b" is the least recently used
+        self.assertNotIn('b', member_cache)
+        self.assertIn('a', member_cache)
+        self.assertIn('c', member_cache)
+        self.assertEqual(member_cache.size, 8)
+
+        member_cache.set('d', b'123456789')
+        self.assertEqual(list(member_cache._entries), ['d'])
+        self.assertEqual(member_cache.size, 9)
+
+        member_cache.clear()
+        self.assertEqual(len(member_cache), 0)
+        self.assertEqual(member_cache.size, 0)
+
+    def test_max_item_size(self):
+        member_cache = cache.MemberCache(max_size=10, max_item_size=4)
+        member_cache.set('a', b'1234')
+        member_cache.set('b', b'12345')
+        self.assertIn('a', member_cache)
+        self.assertNotIn('b', member_cache)
+
+        # Bigger than the cache
+        member_cache = cache.MemberCache(max_size=4)
+        member_cache.set('a', b'12345')
+        self.assertEqual(len(member_cache), 0)
+
+        with self.assertRaises(ValueError):
+            cache.MemberCache(max_size=0)
+
+
+class EpubFileCacheTestCase(unittest.TestCase):
+
+    epub_path = os.path.join(os.path.dirname(__file__), '_data/test.epub')
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'book.epub')
+        copy(self.epub_path, self.path)
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def test_read_item(self):
+        member_cache = cache.MemberCache()
+        with content.open_epub(self.path, cache=member_cache) as book:
+            self.assertIs(book.cache, member_cache)
+            hits, misses = member_cache.hits, member_cache.misses
+            data = book.read_item('Text/cover.xhtml')
+            self.assertEqual(member_cache.misses, misses + 1)
+            self.assertIs(book.read_item('Text/cover.xhtml'), data)
+            self.assertEqual(member_cache.hits, hits + 1)
+
+        # Shared with another EpubFile of the same archive
+        with content.open_epub(self.path, cache=member_cache) as book:
+            hits = member_cache.hits
+            self.assertIs(book.read_item('Text/cover.xhtml'), data)
+            self.assertEqual(member_cache.hits, hits + 1)
+
+        with content.open_epub(self.path, cache=True) as book:
+            self.assertIsInstance(book.cache, cache.MemberCache)
+            self.assertEqual(book.read_item('Text/cover.xhtml'), data)
+
+    def test_replaced_file(self):
+        member_cache = cache.MemberCache()
+        with content.open_epub(self.path, cache=member_cache) as book:
+            book.read_item('Text/cover.xhtml')
+
+        # Replace the cover, with the same size and modification time
+        stat = os.stat(self.path)
+        with zipfile.ZipFile(self.epub_path) as source:
+            with zipfile.ZipFile(self.path, 'w') as target:
+                for info in source.infolist():
+                    data = source.read(info)
+                    if info.filename == 'OEBPS/Text/cover.xhtml':
+                        data = data.replace(b'<body', b'<BODY', 1)
+                        data = data.replace(b'</body>', b'</BODY>', 1)
+                    target.writestr(info, data)
+        os.utime(self.path, (stat.st_atime, stat.st_mtime))
+
+        with content.open_epub(self.path, cache=member_cache) as book:
+            self.assertIn(b'<BODY', book.read_item('Text/cover.xhtml'))
+
+    def test_open_fail(self):
+        with self.assertRaises(ValueError):
+            content.open_epub(self.path, 'a', cache=cache.MemberCache())
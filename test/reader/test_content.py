@@ -1,8 +1,15 @@
 # -*- coding: utf-8 -*-
+import io
+import mmap
 import os
 from shutil import copy, rmtree
+import tempfile
+import threading
 import unittest
+from unittest import mock
+import zipfile
 
+from epub import zipio
 from epub.reader import content, opf
 
 
@@ -35,6 +42,29 @@ class ContentTestCase(unittest.TestCase):
                 self.assertEqual(item.identifier, key)
                 self.assertIsInstance(item, opf.ManifestItem)
 
+    def test_open_lazy(self):
+        test_path = os.path.join(os.path.dirname(__file__), self.epub_path)
+        book = content.open_epub(test_path, lazy=True)
+
+        # Only container.xml is read when the file is open
+        self.assertEqual(book.opf_path, 'OEBPS/content.opf')
+        self.assertIsNone(book._opf)
+        self.assertIsNone(book._toc)
+
+        # OPF is parsed on first access, but NCX is not
+        self.assertEqual(book.opf.metadata.titles, [('Testing Epub', '')])
+        self.assertEqual(book.uid[1], 'BookId')
+        self.assertIsNone(book._toc)
+
+        # NCX is parsed on first access
+        eager_book = content.open_epub(test_path)
+        self.assertEqual(book.toc.uid, eager_book.toc.uid)
+        self.assertEqual(len(book.toc.nav_map.nav_point),
+                         len(eager_book.toc.nav_map.nav_point))
+
+        eager_book.close()
+        book.close()
+
 
 class ContentWriteModeTestCase(unittest.TestCase):
 
@@ -169,6 +199,113 @@ class ContentWriteModeAppendTestCase(ContentWriteModeTestCase):
         self._subtest_add_item(book)
         book.close()
 
+    def test_close_rebuild(self):
+        source_filename = os.path.join(os.path.dirname(__file__),
+                                       self.epub_source)
+        working_copy_filename = os.path.join(os.path.dirname(__file__),
+                                             self.epub_path)
+
+        book = content.open(working_copy_filename, 'a')
+        self._subtest_add_item(book)
+        book.opf.metadata.titles = [('Edition 1', '')]
+        book.close()
+
+        sizes = []
+        for i in range(2, 5):
+            book = content.open(working_copy_filename, 'a')
+            self.assertEqual(book.opf.metadata.titles,
+                             [('Edition %d' % (i - 1), '')])
+            book.opf.metadata.titles = [('Edition %d' % i, '')]
+            book.close()
+            sizes.append(os.path.getsize(working_copy_filename))
+        # The archive does not grow with each edit
+        self.assertEqual(len(set(sizes)), 1)
+
+        with zipfile.ZipFile(source_filename) as source:
+            with zipfile.ZipFile(working_copy_filename) as rebuilt:
+                names = rebuilt.namelist()
+                self.assertEqual(len(names), len(set(names)))
+                self.assertEqual(len(names), 6)
+                self.assertEqual(names[0], 'mimetype')
+                self.assertEqual(rebuilt.getinfo('mimetype').compress_type,
+                                 zipfile.ZIP_STORED)
+                self.assertIsNone(rebuilt.testzip())
+                # Unchanged members are copied with their compressed data
+                path = 'OEBPS/Text/Section0001.xhtml'
+                source_info = source.getinfo(path)
+                rebuilt_info = rebuilt.getinfo(path)
+                self.assertEqual(rebuilt_info.compress_type,
+                                 source_info.compress_type)
+                self.assertEqual(rebuilt_info.compress_size,
+                                 source_info.compress_size)
+                self.assertEqual(rebuilt_info.CRC, source_info.CRC)
+                self.assertEqual(rebuilt.read(path), source.read(path))
+
+        book = content.open(working_copy_filename)
+        self.assertEqual(book.opf.metadata.titles, [('Edition 4', '')])
+        self.assertIn('AddItem0001', book.opf.manifest)
+        book.close()
+
+    def _subtest_close_fail(self, book):
+        working_copy_filename = os.path.join(os.path.dirname(__file__),
+                                             self.epub_path)
+        self._subtest_add_item(book)
+        book.opf.metadata.titles = [('Edition 1', '')]
+        with self.assertRaises(IOError):
+            book.close()
+        self.assertIsNone(book.fp)
+
+        # No temporary file is left behind
+        self.assertEqual([name for name in os.listdir(
+            os.path.dirname(working_copy_filename))
+            if name.endswith('.tmp')], [])
+        # The epub is still valid, with its changes
+        book = content.open(working_copy_filename)
+        self.assertIsNone(book.testzip())
+        self.assertEqual(book.opf.metadata.titles, [('Edition 1', '')])
+        self.assertIn('AddItem0001', book.opf.manifest)
+        book.close()
+
+    def test_close_rebuild_fail(self):
+        working_copy_filename = os.path.join(os.path.dirname(__file__),
+                                             self.epub_path)
+        book = content.open(working_copy_filename, 'a')
+
+        def fail(*args):
+            raise IOError('No space left on device')
+
+        book._write_temporary_archive = fail
+        self._subtest_close_fail(book)
+
+    def test_close_replace_fail(self):
+        working_copy_filename = os.path.join(os.path.dirname(__file__),
+                                             self.epub_path)
+        book = content.open(working_copy_filename, 'a')
+
+        def fail(source, destination):
+            raise IOError('Permission denied')
+
+        replace_file = content.utils.replace_file
+        content.utils.replace_file = fail
+        try:
+            self._subtest_close_fail(book)
+        finally:
+            content.utils.replace_file = replace_file
+
+    def test_close_unchanged(self):
+        working_copy_filename = os.path.join(os.path.dirname(__file__),
+                                             self.epub_path)
+        # The OPF and NCX files of the source are written again once
+        content.open(working_copy_filename, 'a').close()
+        with open(working_copy_filename, 'rb') as f:
+            expected = f.read()
+
+        book = content.open(working_copy_filename, 'a')
+        book.close()
+
+        with open(working_copy_filename, 'rb') as f:
+            self.assertEqual(f.read(), expected)
+
 
 class EpubFileTestCase(unittest.TestCase):
     """Test class for epub.EpubFile class"""
@@ -224,6 +361,23 @@ class EpubFileTestCase(unittest.TestCase):
         with self.assertRaises(LookupError):
             self.epub_file.get_item_by_href(item.href)
 
+    def test_open_item(self):
+        item = self.epub_file.get_item('Section0002.xhtml')
+        expected = self.epub_file.read_item(item)
+
+        for value in (item, item.href):
+            with self.epub_file.open_item(value) as f:
+                chunks = []
+                chunk = f.read(100)
+                while chunk:
+                    self.assertLessEqual(len(chunk), 100)
+                    chunks.append(chunk)
+                    chunk = f.read(100)
+            self.assertEqual(b''.join(chunks), expected)
+
+        with self.assertRaises(KeyError):
+            self.epub_file.open_item('BadHref')
+
     def test_add_item_fail(self):
         """
         When open in read-only mode, add_item must fail.
@@ -243,3 +397,399 @@ class EpubFileTestCase(unittest.TestCase):
                                                   media_type=TEST_XHTML_MIMETYPE)
             self.epub_file.add_item(filename, manifest_item)
 
+
+class EpubFileCopyTestCase(unittest.TestCase):
+    """Test class for raw copies of members: copy_member and save_as"""
+
+    epub_path = os.path.join(os.path.dirname(__file__), '_data/test.epub')
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def assertSameMember(self, source, target, path):
+        source_info = source.getinfo(path)
+        target_info = target.getinfo(path)
+        self.assertEqual(target_info.compress_type, source_info.compress_type)
+        self.assertEqual(target_info.compress_size, source_info.compress_size)
+        self.assertEqual(target_info.CRC, source_info.CRC)
+        self.assertEqual(target.read(path), source.read(path))
+
+    def test_copy_member(self):
+        target_path = os.path.join(self.tmp_dir, 'target.zip')
+        path = 'OEBPS/Text/Section0001.xhtml'
+        for kwargs in ({}, {'use_mmap': True}, {'threadsafe': True}):
+            with content.open_epub(self.epub_path, **kwargs) as book:
+                with zipfile.ZipFile(target_path, 'w') as target:
+                    info = book.copy_member(path, target)
+                    self.assertEqual(info.filename, path)
+                    book.copy_member(book.getinfo('mimetype'), target)
+                with zipfile.ZipFile(target_path) as target:
+                    self.assertEqual(target.namelist(), [path, 'mimetype'])
+                    self.assertIsNone(target.testzip())
+                    self.assertSameMember(book, target, path)
+
+    def test_save_as(self):
+        saved_path = os.path.join(self.tmp_dir, 'saved.epub')
+        with open(self.epub_path, 'rb') as f:
+            expected = f.read()
+
+        with content.open_epub(self.epub_path, lazy=True) as book:
+            book.opf.metadata.titles = [('Stamped', '')]
+            book.save_as(saved_path)
+            # Still open, and saved again over the same file
+            book.opf.metadata.description = 'Stamped again'
+            book.save_as(saved_path)
+
+        with open(self.epub_path, 'rb') as f:
+            self.assertEqual(f.read(), expected)
+
+        with content.open_epub(saved_path) as book:
+            self.assertEqual(book.opf.metadata.titles, [('Stamped', '')])
+            self.assertEqual(book.opf.metadata.description, 'Stamped again')
+            names = book.namelist()
+            self.assertEqual(names[0], 'mimetype')
+            self.assertEqual(len(names), len(set(names)))
+            self.assertIsNone(book.testzip())
+            with zipfile.ZipFile(self.epub_path) as source:
+                self.assertEqual(sorted(names), sorted(source.namelist()))
+                for path in names:
+                    if path not in ('META-INF/container.xml',
+                                    'OEBPS/content.opf', 'OEBPS/toc.ncx'):
+                        self.assertSameMember(source, book, path)
+
+    def test_save_as_fail(self):
+        book = content.open_epub(self.epub_path)
+        book.close()
+        with self.assertRaises(RuntimeError):
+            book.save_as(os.path.join(self.tmp_dir, 'saved.epub'))
+
+
+class EpubFileDeflateTestCase(unittest.TestCase):
+    """Test class for epub.EpubFile class, with deflate_workers"""
+
+    epub_path = os.path.join(os.path.dirname(__file__), '_data/test.epub')
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.items = []
+        for i in range(12):
+            filename = os.path.join(self.tmp_dir, 'chapter%d.xhtml' % i)
+            data = ('<p>Chapter %d</p>' % i * (i * 500 + 1)).encode('utf-8')
+            with io.open(filename, 'wb') as f:
+                f.write(data)
+            item = opf.ManifestItem(identifier='chapter%d' % i,
+                                    href='Text/chapter%d.xhtml' % i,
+                                    media_type=TEST_XHTML_MIMETYPE)
+            self.items.append((filename, item, data))
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def test_add_item(self):
+        epub_path = os.path.join(self.tmp_dir, 'deflated.epub')
+        with content.open_epub(epub_path, 'w', deflate_workers=4) as book:
+            for filename, item, data in self.items:
+                book.add_item(filename, item, True)
+            # Items still in the pool can be read
+            self.assertEqual(book.read_item(self.items[-1][1]),
+                             self.items[-1][2])
+
+        with content.open_epub(epub_path) as book:
+            names = book.namelist()
+            self.assertEqual(names[0], 'mimetype')
+            self.assertEqual(book.getinfo('mimetype').compress_type,
+                             zipfile.ZIP_STORED)
+            # Written in manifest order
+            self.assertEqual(names[1:13], ['OEBPS/' + item.href
+                                           for filename, item, data
+                                           in self.items])
+            self.assertEqual(len(names), len(set(names)))
+            self.assertIsNone(book.testzip())
+            for filename, item, data in self.items:
+                # Compressed as without the pool
+                self.assertEqual(book.getinfo('OEBPS/' + item.href)
+                                 .compress_type, book.compression)
+                self.assertEqual(book.read_item(item), data)
+            self.assertEqual([identifier for identifier, linear
+                              in book.opf.spine.itemrefs],
+                             [item.identifier for filename, item, data
+                              in self.items])
+
+    def test_add_item_append(self):
+        epub_path = os.path.join(self.tmp_dir, 'appended.epub')
+        copy(self.epub_path, epub_path)
+        with content.open_epub(epub_path, 'a', deflate_workers=True) as book:
+            for filename, item, data in self.items:
+                book.add_item(filename, item)
+
+        with content.open_epub(epub_path) as book:
+            self.assertEqual(book.namelist()[0], 'mimetype')
+            self.assertIsNone(book.testzip())
+            for filename, item, data in self.items:
+                self.assertEqual(book.read_item(item), data)
+
+    def test_save_as(self):
+        epub_path = os.path.join(self.tmp_dir, 'deflated.epub')
+        saved_path = os.path.join(self.tmp_dir, 'saved.epub')
+        target_path = os.path.join(self.tmp_dir, 'target.zip')
+        with content.open_epub(epub_path, 'w', deflate_workers=2) as book:
+            for filename, item, data in self.items:
+                book.add_item(filename, item)
+            book.save_as(saved_path)
+            self.assertEqual(len(book.namelist()), 13)
+
+        book = content.open_epub(epub_path, 'w', deflate_workers=2)
+        filename, first_item, first_data = self.items[0]
+        book.add_item(filename, first_item)
+        with zipfile.ZipFile(target_path, 'w') as target:
+            book.copy_member('OEBPS/' + first_item.href, target)
+        book.close()
+
+        with content.open_epub(saved_path) as book:
+            self.assertIsNone(book.testzip())
+            for filename, item, data in self.items:
+                self.assertEqual(book.read_item(item), data)
+        with zipfile.ZipFile(target_path) as target:
+            self.assertEqual(target.read('OEBPS/' + first_item.href),
+                             first_data)
+
+    def test_close_fail(self):
+        epub_path = os.path.join(self.tmp_dir, 'deflated.epub')
+        book = content.open_epub(epub_path, 'w', deflate_workers=2)
+        pool = book._deflate_pool
+
+        def close():
+            pool._pool.terminate()
+            raise IOError('Can not deflate')
+
+        pool.close = close
+        with self.assertRaises(IOError):
+            book.close()
+        # The file is closed anyway
+        self.assertIsNone(book.fp)
+
+    def test_deflate_pool_relative_paths(self):
+        # As EPubBook.create_archive does, from the root of the book
+        root_dir = os.path.join(self.tmp_dir, 'book')
+        paths = ['META-INF/container.xml', 'OEBPS/content.opf']
+        paths += ['OEBPS/' + item.href for filename, item, data in self.items]
+        for path in paths:
+            filename = os.path.join(root_dir, *path.split('/'))
+            if not os.path.isdir(os.path.dirname(filename)):
+                os.makedirs(os.path.dirname(filename))
+            with io.open(filename, 'wb') as f:
+                f.write(path.encode('utf-8') * 100)
+        with io.open(os.path.join(root_dir, 'mimetype'), 'wb') as f:
+            f.write(b'application/epub+zip')
+
+        zip_path = os.path.join(self.tmp_dir, 'book.epub')
+        cwd = os.getcwd()
+        os.chdir(root_dir)
+        try:
+            with zipfile.ZipFile(zip_path, 'w') as zip_file:
+                zip_file.write('mimetype', compress_type=zipfile.ZIP_STORED)
+                pool = zipio.DeflatePool(zip_file, 4)
+                try:
+                    for path in paths:
+                        pool.write(os.path.join(*path.split('/')))
+                finally:
+                    pool.close()
+        finally:
+            os.chdir(cwd)
+
+        with zipfile.ZipFile(zip_path) as zip_file:
+            self.assertIsNone(zip_file.testzip())
+            self.assertEqual(zip_file.namelist(), ['mimetype'] + paths)
+            self.assertEqual(zip_file.getinfo('mimetype').compress_type,
+                             zipfile.ZIP_STORED)
+            for path in paths:
+                info = zip_file.getinfo(path)
+                self.assertEqual(info.compress_type, zipfile.ZIP_DEFLATED)
+                self.assertEqual(zip_file.read(path),
+                                 path.encode('utf-8') * 100)
+
+    def test_deflate_pool(self):
+        zip_path = os.path.join(self.tmp_dir, 'pool.zip')
+        with zipfile.ZipFile(zip_path, 'w') as zip_file:
+            zip_file.writestr('mimetype', b'application/epub+zip')
+            with zipio.DeflatePool(zip_file, workers=2,
+                                   max_pending=1) as pool:
+                for i, (filename, item, data) in enumerate(self.items):
+                    pool.write(filename, item.href)
+                    # Only the last member added waits to be written
+                    self.assertEqual(len(zip_file.namelist()), i + 1)
+                pool.writestr('stored.txt', b'stored', zipfile.ZIP_STORED)
+
+        with zipfile.ZipFile(zip_path) as zip_file:
+            self.assertIsNone(zip_file.testzip())
+            self.assertEqual(zip_file.namelist(),
+                             ['mimetype'] +
+                             [item.href for filename, item, data
+                              in self.items] + ['stored.txt'])
+            self.assertEqual(zip_file.getinfo('stored.txt').compress_type,
+                             zipfile.ZIP_STORED)
+            for filename, item, data in self.items:
+                self.assertEqual(zip_file.read(item.href), data)
+
+    def test_deflate_pool_fail(self):
+        zip_path = os.path.join(self.tmp_dir, 'pool.zip')
+        with zipfile.ZipFile(zip_path, 'w') as zip_file:
+            pool = zipio.DeflatePool(zip_file, workers=2, max_pending=4)
+            pool.writestr('first.txt', b'first')
+            # Not bytes: the compression fails
+            pool.writestr('broken.txt', None)
+            pool.writestr('last.txt', b'last')
+            with self.assertRaises(TypeError):
+                pool.close()
+
+        # Members added after the broken one are written
+        with zipfile.ZipFile(zip_path) as zip_file:
+            self.assertIsNone(zip_file.testzip())
+            self.assertEqual(zip_file.namelist(), ['first.txt', 'last.txt'])
+            self.assertEqual(zip_file.read('last.txt'), b'last')
+
+    def test_open_fail(self):
+        with self.assertRaises(ValueError):
+            content.open_epub(self.epub_path, deflate_workers=2)
+
+
+class EpubFileMmapTestCase(unittest.TestCase):
+    """Test class for epub.EpubFile class, with use_mmap=True"""
+
+    epub_path = os.path.join(os.path.dirname(__file__), '_data/test.epub')
+    xhtml_item_path = os.path.join(os.path.dirname(__file__),
+                                   '_data/write/add_item.xhtml')
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def test_read_item(self):
+        with content.open_epub(self.epub_path) as expected_book:
+            with content.open_epub(self.epub_path, use_mmap=True) as book:
+                self.assertIsNotNone(book._mmap)
+                self.assertEqual(book.opf.metadata.titles,
+                                 [('Testing Epub', '')])
+                for item in expected_book.opf.manifest.values():
+                    expected = expected_book.read_item(item)
+                    self.assertEqual(book.read_item(item), expected)
+                    self.assertEqual(book.read_item(item.href), expected)
+                    self.assertEqual(book.read_item_buffer(item).tobytes(),
+                                     expected)
+
+    def test_read_item_buffer(self):
+        stored_path = os.path.join(self.tmp_dir, 'stored.epub')
+        manifest_item = opf.ManifestItem(identifier='AddItem0001',
+                                         href='Text/add_item.xhtml',
+                                         media_type=TEST_XHTML_MIMETYPE)
+        with content.open_epub(stored_path, 'w') as book:
+            book.add_item(self.xhtml_item_path, manifest_item)
+
+        with open(self.xhtml_item_path, 'rb') as f:
+            expected = f.read()
+
+        book = content.open_epub(stored_path, use_mmap=True)
+        info = book.getinfo('OEBPS/Text/add_item.xhtml')
+        self.assertEqual(info.compress_type, zipfile.ZIP_STORED)
+
+        # Stored member is a slice of the memory map
+        view = book.read_item_buffer(manifest_item)
+        self.assertIsInstance(view, memoryview)
+        self.assertIsInstance(view.obj, mmap.mmap)
+        self.assertEqual(view.tobytes(), expected)
+        self.assertEqual(book.read_item(manifest_item), expected)
+
+        # Buffer is still usable after close
+        book.close()
+        self.assertEqual(view.tobytes(), expected)
+        view.release()
+
+    def test_read_item_buffer_without_mmap(self):
+        with content.open_epub(self.epub_path) as book:
+            item = book.get_item('Section0001.xhtml')
+            view = book.read_item_buffer(item)
+            self.assertIsInstance(view, memoryview)
+            self.assertEqual(view.tobytes(), book.read_item(item))
+
+    def test_open_fail(self):
+        with self.assertRaises(ValueError):
+            content.open_epub(os.path.join(self.tmp_dir, 'new.epub'), 'w',
+                              use_mmap=True)
+
+        with open(self.epub_path, 'rb') as f:
+            data = io.BytesIO(f.read())
+        with self.assertRaises(ValueError):
+            content.open_epub(data, use_mmap=True)
+
+    def test_open_invalid(self):
+        # A zip file without META-INF/container.xml
+        zip_path = os.path.join(self.tmp_dir, 'invalid.epub')
+        with zipfile.ZipFile(zip_path, 'w') as zip_file:
+            zip_file.writestr('mimetype', b'application/epub+zip')
+
+        close_files = content.EpubFile._close_files
+        for options in ({}, {'use_mmap': True}, {'threadsafe': True}):
+            with mock.patch.object(content.EpubFile, '_close_files',
+                                   autospec=True,
+                                   side_effect=close_files) as closed:
+                with self.assertRaises(KeyError):
+                    content.open_epub(zip_path, **options)
+            # The archive, its memory map and its file are closed
+            book = closed.call_args[0][0]
+            self.assertIsNone(book.fp)
+            self.assertIsNone(book._mmap)
+
+
+class EpubFileThreadsafeTestCase(unittest.TestCase):
+    """Test class for epub.EpubFile class, with threadsafe=True"""
+
+    epub_path = os.path.join(os.path.dirname(__file__), '_data/test.epub')
+
+    def setUp(self):
+        with content.open_epub(self.epub_path) as book:
+            self.expected = dict((item.identifier, book.read_item(item))
+                                 for item in book.opf.manifest.values())
+
+    def _read_concurrently(self, book):
+        errors = []
+
+        def read_all():
+            try:
+                for _ in range(20):
+                    for item in book.opf.manifest.values():
+                        data = book.read_item(item)
+                        if data != self.expected[item.identifier]:
+                            errors.append(item.identifier)
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=read_all) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def test_read_item(self):
+        with content.open_epub(self.epub_path, threadsafe=True) as book:
+            self.assertEqual(book.opf.metadata.titles, [('Testing Epub', '')])
+            self.assertEqual(self._read_concurrently(book), [])
+
+    def test_read_item_local_file(self):
+        """Check the fallback without os.pread: one file per thread."""
+        with content.open_epub(self.epub_path, threadsafe=True) as book:
+            book._pread = book._pread_local_file
+            self.assertEqual(self._read_concurrently(book), [])
+            self.assertEqual(len(book._local_files), 8)
+            local_files = list(book._local_files)
+        for local_file in local_files:
+            self.assertTrue(local_file.closed)
+
+    def test_open_fail(self):
+        with self.assertRaises(ValueError):
+            content.open_epub(self.epub_path, 'a', threadsafe=True)
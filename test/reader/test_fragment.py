@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import io
+import unittest
+
+from epub.reader import fragment
+
+
+XHTML = (b'<?xml version="1.0" encoding="utf-8"?>\n'
+         b'<html xmlns="http://www.w3.org/1999/xhtml"><body>'
+         b'<h1 id="title">Title</h1><p>Introduction</p>'
+         b'<div id="part1"><p id="note">Note</p><p>Text</p></div>'
+         b'<a id="part2"/><p>End</p>'
+         b'</body></html>')
+
+
+class FragmentTestCase(unittest.TestCase):
+
+    def get_section(self, index, identifier):
+        start, end = index[identifier]
+        return XHTML[start:end]
+
+    def test_build_index(self):
+        index = fragment.build_index(io.BytesIO(XHTML), chunk_size=16)
+        self.assertEqual(sorted(index), ['note', 'part1', 'part2', 'title'])
+        # Sections end at the next sibling with an id, or with their parent
+        self.assertEqual(self.get_section(index, 'title'),
+                         b'<h1 id="title">Title</h1><p>Introduction</p>')
+        self.assertEqual(self.get_section(index, 'part1'),
+                         b'<div id="part1"><p id="note">Note</p>'
+                         b'<p>Text</p></div>')
+        self.assertEqual(self.get_section(index, 'note'),
+                         b'<p id="note">Note</p><p>Text</p>')
+        self.assertEqual(self.get_section(index, 'part2'),
+                         b'<a id="part2"/><p>End</p>')
+
+    def test_build_index_root(self):
+        data = b'<html id="root"><p id="first">Text</p></html>'
+        index = fragment.build_index(io.BytesIO(data))
+        self.assertEqual(index['root'], (0, None))
+        self.assertEqual(index['first'], (16, 38))
+
+    def test_build_index_error(self):
+        index = fragment.build_index(io.BytesIO(b'<html><p id="a"></html>'))
+        self.assertEqual(index, {})
+
+    def test_build_index_html_entities(self):
+        data = (b'<!DOCTYPE html>\n'
+                b'<html xmlns="http://www.w3.org/1999/xhtml"><body>'
+                b'<p id="a" title="&eacute;t&eacute;">A&nbsp;B</p>'
+                b'<p id="b">&copy; C</p>'
+                b'</body></html>')
+        index = fragment.build_index(io.BytesIO(data), chunk_size=16)
+        self.assertEqual(sorted(index), ['a', 'b'])
+        start, end = index['a']
+        self.assertEqual(data[start:end],
+                         b'<p id="a" title="&eacute;t&eacute;">A&nbsp;B</p>')
+        start, end = index['b']
+        self.assertEqual(data[start:end], b'<p id="b">&copy; C</p>')
+
+    def test_read_range(self):
+        stream = io.BytesIO(XHTML)
+        self.assertEqual(fragment.read_range(stream, 10, 30, chunk_size=3),
+                         XHTML[10:30])
+        stream = io.BytesIO(XHTML)
+        self.assertEqual(fragment.read_range(stream, 10), XHTML[10:])
+        stream = io.BytesIO(XHTML)
+        self.assertEqual(fragment.read_range(stream, len(XHTML) + 10), b'')
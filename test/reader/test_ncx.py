@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+import copy
 import os
+import pickle
 import unittest
+from unittest import mock
 from xml.dom import minidom
 
-from epub.reader import ncx
+from epub.reader import ncx, xmlbackend
 
 
 class ParseTestCase(unittest.TestCase):
@@ -392,6 +395,27 @@ class NavPointTestCase(unittest.TestCase):
                          xml_element.toxml())
 
 
+    def test_slots(self):
+        nav_point = ncx.NavPoint()
+        nav_point.identifier = 'point1'
+        nav_point.src = 'Text/Point1.xhtml'
+        nav_point.add_label('Label')
+        sub_point = ncx.NavPoint()
+        sub_point.identifier = 'point1_1'
+        nav_point.add_point(sub_point)
+
+        self.assertFalse(hasattr(nav_point, '__dict__'))
+        with self.assertRaises(AttributeError):
+            nav_point.unknown = 'value'
+
+        for result in (pickle.loads(pickle.dumps(nav_point)),
+                       copy.deepcopy(nav_point)):
+            self.assertEqual(result.identifier, 'point1')
+            self.assertEqual(result.src, 'Text/Point1.xhtml')
+            self.assertEqual(result.labels, [('Label', '', '')])
+            self.assertEqual(result.nav_point[0].identifier, 'point1_1')
+
+
 class NavMapTestCase(unittest.TestCase):
 
     def test_as_xml_element(self):
@@ -599,3 +623,206 @@ class NcxTestCase(unittest.TestCase):
         xml_output = xml_toc.strip()
 
         self.assertEqual(xml_output, xml_input)
+
+
+class TocIndexTestCase(unittest.TestCase):
+
+    def make_point(self, identifier, play_order, src, children=()):
+        nav_point = ncx.NavPoint()
+        nav_point.identifier = identifier
+        nav_point.playOrder = play_order
+        nav_point.src = src
+        for child in children:
+            nav_point.add_point(child)
+        return nav_point
+
+    def setUp(self):
+        make_point = self.make_point
+        self.toc = ncx.Ncx()
+        nav_map = self.toc.nav_map
+        nav_map.add_point(make_point('ch1', '1', 'Text/ch1.xhtml', [
+            make_point('ch1-1', '2', 'Text/ch1.xhtml#part1'),
+            make_point('ch1-2', '3', 'Text/ch1.xhtml#part2', [
+                make_point('ch1-2-1', '4', './Text/ch1.xhtml#sub'),
+            ]),
+        ]))
+        nav_map.add_point(make_point('ch2', '6', 'Text/ch2.xhtml'))
+        nav_map.add_point(make_point('ch3', None, 'Text/ch3.xhtml'))
+
+    def test_index(self):
+        index = self.toc.index
+        self.assertIs(self.toc.index, index)
+        self.assertEqual(len(index), 6)
+        self.assertEqual([nav_point.identifier
+                          for nav_point in index.nav_points],
+                         ['ch1', 'ch1-1', 'ch1-2', 'ch1-2-1', 'ch2', 'ch3'])
+        self.assertIs(index[3], index.nav_points[3])
+        self.assertEqual(index.play_orders, [1, 2, 3, 4, 6, None])
+        self.assertEqual(index.depths, [1, 2, 2, 3, 1, 1])
+        self.assertEqual(index.parents, [None, 0, 0, 2, None, None])
+        self.assertEqual(index.get_ancestors(3), [0, 2])
+        self.assertEqual(index.get_ancestors(4), [])
+
+        self.toc.nav_map.add_point(self.make_point('ch4', '7', 'ch4.xhtml'))
+        self.assertEqual(len(self.toc.index), 6)
+        self.toc.reset_index()
+        self.assertEqual(len(self.toc.index), 7)
+
+    def test_find(self):
+        index = self.toc.index
+        self.assertEqual(index.find_by_src('Text/ch1.xhtml'), [0])
+        self.assertEqual(index.find_by_src('Text/ch1.xhtml#sub'), [3])
+        self.assertEqual(index.find_by_src('Text/unknown.xhtml'), [])
+        self.assertEqual(index.find_by_href('Text/ch1.xhtml#part1'),
+                         [0, 1, 2, 3])
+        self.assertEqual(index.find_by_href('Text/ch3.xhtml'), [5])
+
+        self.assertEqual(index.find_by_play_order(3), 2)
+        self.assertIsNone(index.find_by_play_order(5))
+        self.assertIsNone(index.find_current(0))
+        self.assertEqual(index.find_current(1), 0)
+        self.assertEqual(index.find_current(5), 3)
+        self.assertEqual(index.find_current(100), 4)
+
+    def test_deep_nav_map(self):
+        toc = ncx.Ncx()
+        parent = toc.nav_map
+        for i in range(5000):
+            nav_point = self.make_point('p%d' % i, str(i + 1), 'ch.xhtml')
+            parent.add_point(nav_point)
+            parent = nav_point
+        self.assertEqual(toc.index.depths[-1], 5000)
+        self.assertEqual(toc.index.find_current(5000), 4999)
+
+
+class DeepNavMapTestCase(unittest.TestCase):
+    """Nested navPoints are inspected without recursion."""
+
+    depth = 3000
+
+    def build_ncx(self):
+        nav_points = ''.join(
+            '<navPoint id="p%d" playOrder="%d"><navLabel><text>%d</text>'
+            '</navLabel><content src="ch.xhtml#p%d"/>' % (i, i + 1, i, i)
+            for i in range(self.depth))
+        return ('<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/">'
+                '<head/><docTitle><text>Deep</text></docTitle>'
+                '<navMap>%s%s</navMap></ncx>' % (nav_points,
+                                                 '</navPoint>' * self.depth))
+
+    def test_parse_toc(self):
+        xml_string = self.build_ncx()
+        for backend in xmlbackend.get_available_backends():
+            toc = ncx.parse_toc(xml_string, backend)
+            self.assertEqual(toc.title, 'Deep')
+            index = toc.index
+            self.assertEqual(len(index), self.depth)
+            self.assertEqual(index.depths[-1], self.depth)
+            last = index[self.depth - 1]
+            self.assertEqual(last.identifier, 'p%d' % (self.depth - 1))
+            self.assertEqual(last.labels, [('%d' % (self.depth - 1), '', '')])
+            self.assertEqual(last.src, 'ch.xhtml#p%d' % (self.depth - 1))
+
+    def test_as_xml_element(self):
+        toc = ncx.parse_toc(self.build_ncx())
+        element = toc.nav_map.as_xml_element()
+        depth = 0
+        while True:
+            nav_points = [node for node in element.childNodes
+                          if node.tagName == 'navPoint']
+            if not nav_points:
+                break
+            self.assertEqual(len(nav_points), 1)
+            element = nav_points[0]
+            depth += 1
+        self.assertEqual(depth, self.depth)
+        self.assertEqual(element.getAttribute('id'), 'p%d' % (self.depth - 1))
+
+
+class DeferredTestCase(unittest.TestCase):
+
+    ncx_path = os.path.join(os.path.dirname(__file__), '_data/test.ncx')
+
+    def setUp(self):
+        with open(self.ncx_path, 'rb') as f:
+            self.xml_string = f.read()
+
+    def get_identifiers(self, targets):
+        return [target.identifier for target in targets]
+
+    def test_parse_toc(self):
+        for backend in xmlbackend.get_available_backends():
+            expected = ncx.parse_toc(self.xml_string, backend)
+            toc = ncx.parse_toc(self.xml_string, backend, deferred=True)
+            self.assertIsInstance(toc.page_list, ncx.DeferredPageList)
+            self.assertFalse(toc.page_list.loaded)
+            self.assertEqual(len(toc.nav_lists), 1)
+            self.assertFalse(toc.nav_lists[0].loaded)
+            self.assertEqual(toc.title, expected.title)
+            self.assertEqual(len(toc.nav_map.nav_point), 2)
+
+            # Loaded on access
+            self.assertEqual(self.get_identifiers(toc.page_list.page_target),
+                             ['p1', 'p2'])
+            self.assertTrue(toc.page_list.loaded)
+            self.assertEqual(toc.page_list.page_target[0].labels,
+                             expected.page_list.page_target[0].labels)
+            nav_list = toc.nav_lists[0]
+            self.assertEqual(nav_list.labels, expected.nav_lists[0].labels)
+            self.assertTrue(nav_list.loaded)
+            self.assertEqual(
+                self.get_identifiers(nav_list.nav_target),
+                self.get_identifiers(expected.nav_lists[0].nav_target))
+            self.assertEqual(
+                toc.as_xml_document().toxml(),
+                expected.as_xml_document().toxml())
+
+    def test_iter_targets(self):
+        toc = ncx.parse_toc(self.xml_string, deferred=True)
+        targets = list(toc.page_list.iter_targets())
+        self.assertFalse(toc.page_list.loaded)
+        self.assertEqual(self.get_identifiers(targets), ['p1', 'p2'])
+        self.assertEqual(targets[1].src, 'content.html#p2')
+        self.assertEqual(targets[1].labels, [('2', '', '')])
+        self.assertEqual(
+            self.get_identifiers(toc.nav_lists[0].iter_targets()),
+            ['ill-1', 'ill-2'])
+
+        # Once loaded, the targets are the list's ones
+        page_target = toc.page_list.page_target
+        self.assertEqual(list(toc.page_list.iter_targets()), page_target)
+
+        expected = ncx.parse_toc(self.xml_string)
+        self.assertEqual(list(expected.page_list.iter_targets()),
+                         expected.page_list.page_target)
+
+    def test_iter_targets_without_pull_parser(self):
+        # Python 2 has no XMLPullParser: the source is read with iterparse
+        for xml_string in (self.xml_string, self.xml_string.decode('utf-8')):
+            toc = ncx.parse_toc(xml_string, deferred=True)
+            with mock.patch.object(ncx, '_XMLPullParser', None):
+                targets = list(toc.page_list.iter_targets())
+                nav_targets = list(toc.nav_lists[0].iter_targets())
+            self.assertFalse(toc.page_list.loaded)
+            self.assertEqual(self.get_identifiers(targets), ['p1', 'p2'])
+            self.assertEqual(targets[1].src, 'content.html#p2')
+            self.assertEqual(targets[1].labels, [('2', '', '')])
+            self.assertEqual(self.get_identifiers(nav_targets),
+                             ['ill-1', 'ill-2'])
+
+    def test_text_and_pickle(self):
+        toc = ncx.parse_toc(self.xml_string.decode('utf-8'), deferred=True)
+        self.assertFalse(toc.page_list.loaded)
+        toc = pickle.loads(pickle.dumps(toc))
+        self.assertTrue(toc.page_list.loaded)
+        self.assertEqual(self.get_identifiers(toc.page_list.page_target),
+                         ['p1', 'p2'])
+
+    def test_nothing_deferred(self):
+        xml_string = ('<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/">'
+                      '<head/><docTitle><text>Title</text></docTitle>'
+                      '<navMap/><pageList/></ncx>')
+        toc = ncx.parse_toc(xml_string, deferred=True)
+        self.assertNotIsInstance(toc.page_list, ncx.DeferredPageList)
+        self.assertEqual(toc.page_list.page_target, [])
+        self.assertEqual(toc.nav_lists, [])
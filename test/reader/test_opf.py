@@ -1,10 +1,121 @@
 # -*- coding: utf-8 -*-
+import copy
+import io
+import pickle
 import unittest
 
 from xml.dom import minidom
 
 from epub import const
-from epub.reader import opf
+from epub.reader import opf, xmlbackend
+from epub.utils import get_node_text
+
+
+FULL_METADATA_OPF = """<?xml version="1.0" ?>
+<package unique-identifier="BookId" version="2.0" xmlns="http://www.idpf.org/2007/opf">
+    <metadata xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:opf="http://www.idpf.org/2007/opf">
+        <dc:identifier opf:scheme="uuid" id="BookId">
+            18430f16-c687-400b-9b9c-54a9c8b0646c
+        </dc:identifier>
+        <dc:title>Metadata for testing purpose</dc:title>
+        <dc:creator opf:file-as="Doe, Jhon" opf:role="aut">John Doe</dc:creator>
+        <meta content="Custom Meta" name="custom:meta"/>
+        <dc:title xml:lang="fr">Metadonnée pour les tests.</dc:title>
+        <dc:identifier opf:scheme="ISBN">9782000000000</dc:identifier>
+        <dc:creator>Anonymous</dc:creator>
+        <dc:subject>This is an arbitrary subjet.</dc:subject>
+        <dc:subject>Another subject</dc:subject>
+        <dc:contributor opf:role="other.test">Python unittest</dc:contributor>
+        <dc:contributor opf:file-as="Smith, Jane" opf:role="edt">Jane Smith</dc:contributor>
+        <dc:description>A long description.</dc:description>
+        <dc:description>The last description.</dc:description>
+        <dc:date opf:event="creation">2012-01-05T16:18:00+00:00</dc:date>
+        <dc:date>2013</dc:date>
+        <dc:type>Is this a type?</dc:type>
+        <dc:format>Well formated, sir!</dc:format>
+        <dc:publisher>Exirel</dc:publisher>
+        <dc:language>en</dc:language>
+        <dc:language>fr</dc:language>
+        <dc:source>From the far old west (Brittany, France).</dc:source>
+        <dc:relation>It's complicated...</dc:relation>
+        <dc:coverage>An art of cover.</dc:coverage>
+        <dc:rights>To the left!</dc:rights>
+        <dc:rights/>
+        <dc:type/>
+        <meta content="Another Custom Meta" name="custom:other"/>
+        <meta name="cover"/>
+    </metadata>
+    <manifest>
+        <item href="toc.ncx" id="ncx" media-type="application/x-dtbncx+xml"/>
+    </manifest>
+    <spine toc="ncx"/>
+</package>
+"""
+
+
+def legacy_parse_xml_metadata(element):
+    """<metadata> parser as it was before the dispatch table: one walk
+    per element name."""
+    metadata = opf.Metadata()
+
+    for node in element.getElementsByTagName('dc:title'):
+        metadata.add_title(get_node_text(node),
+                           node.getAttribute('xml:lang'))
+
+    for node in element.getElementsByTagName('dc:creator'):
+        metadata.add_creator(get_node_text(node),
+                             node.getAttribute('opf:role'),
+                             node.getAttribute('opf:file-as'))
+
+    for node in element.getElementsByTagName('dc:subject'):
+        metadata.add_subject(get_node_text(node))
+
+    for node in element.getElementsByTagName('dc:description'):
+        metadata.description = get_node_text(node)
+
+    for node in element.getElementsByTagName('dc:publisher'):
+        metadata.publisher = get_node_text(node)
+
+    for node in element.getElementsByTagName('dc:contributor'):
+        metadata.add_contributor(get_node_text(node),
+                                 node.getAttribute('opf:role'),
+                                 node.getAttribute('opf:file-as'))
+
+    for node in element.getElementsByTagName('dc:date'):
+        metadata.add_date(get_node_text(node),
+                          node.getAttribute('opf:event'))
+
+    for node in element.getElementsByTagName('dc:type'):
+        metadata.dc_type = get_node_text(node)
+
+    for node in element.getElementsByTagName('dc:format'):
+        metadata.format = get_node_text(node)
+
+    for node in element.getElementsByTagName('dc:identifier'):
+        metadata.add_identifier(get_node_text(node),
+                                node.getAttribute('id'),
+                                node.getAttribute('opf:scheme'))
+
+    for node in element.getElementsByTagName('dc:source'):
+        metadata.source = get_node_text(node)
+
+    for node in element.getElementsByTagName('dc:language'):
+        metadata.add_language(get_node_text(node))
+
+    for node in element.getElementsByTagName('dc:relation'):
+        metadata.relation = get_node_text(node)
+
+    for node in element.getElementsByTagName('dc:coverage'):
+        metadata.coverage = get_node_text(node)
+
+    for node in element.getElementsByTagName('dc:rights'):
+        metadata.right = get_node_text(node)
+
+    for node in element.getElementsByTagName('meta'):
+        metadata.add_meta(node.getAttribute('name'),
+                          node.getAttribute('content'))
+
+    return metadata
 
 
 class ParseTestCase(unittest.TestCase):
@@ -198,6 +309,80 @@ class ParseTestCase(unittest.TestCase):
                          [('custom:meta', 'Custom Meta'),
                           ('custom:other', 'Another Custom Meta')])
 
+    def test_parse_metadata(self):
+        """Test parse_metadata (streaming parser for <metadata> only)."""
+        xml_string = """<?xml version="1.0" ?>
+<package unique-identifier="BookId" version="2.0" xmlns="http://www.idpf.org/2007/opf">
+    <metadata xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:opf="http://www.idpf.org/2007/opf">
+        <dc:identifier opf:scheme="uuid" id="BookId">
+            18430f16-c687-400b-9b9c-54a9c8b0646c
+        </dc:identifier>
+        <dc:title>Metadata for testing purpose</dc:title>
+        <dc:title xml:lang="fr">Metadonnée pour les tests.</dc:title>
+        <dc:creator opf:file-as="Doe, Jhon" opf:role="aut">John Doe</dc:creator>
+        <dc:subject>This is an arbitrary subjet.</dc:subject>
+        <dc:contributor opf:role="other.test">Python unittest</dc:contributor>
+        <dc:description>A long description.</dc:description>
+        <dc:date opf:event="creation">2012-01-05T16:18:00+00:00</dc:date>
+        <dc:type>Is this a type?</dc:type>
+        <dc:format>Well formated, sir!</dc:format>
+        <dc:publisher>Exirel</dc:publisher>
+        <dc:language>en</dc:language>
+        <dc:source>From the far old west (Brittany, France).</dc:source>
+        <dc:relation>It's complicated...</dc:relation>
+        <dc:coverage>An art of cover.</dc:coverage>
+        <dc:rights>To the left!</dc:rights>
+        <dc:rights/>
+        <meta content="Custom Meta" name="custom:meta"/>
+    </metadata>
+    <manifest>
+        <item href="toc.ncx" id="ncx" media-type="application/x-dtbncx+xml"/>
+"""
+        # The document is not well-formed after </metadata>, but it is never
+        # read that far.
+        metadata = opf.parse_metadata(xml_string.encode('utf-8'))
+
+        element = minidom.parseString(
+            xml_string.encode('utf-8') + b'</manifest></package>'
+        ).documentElement.getElementsByTagName('metadata')[0]
+        expected = opf._parse_xml_metadata(element)
+
+        self.assertEqual(vars(metadata), vars(expected))
+        self.assertEqual(metadata.titles,
+                         [('Metadata for testing purpose', ''),
+                          ('Metadonn\xe9e pour les tests.', 'fr')])
+        self.assertEqual(metadata.right, '')
+
+        # Text and file-like objects are accepted too
+        self.assertEqual(vars(opf.parse_metadata(xml_string)), vars(expected))
+        self.assertEqual(
+            vars(opf.parse_metadata(io.BytesIO(xml_string.encode('utf-8')))),
+            vars(expected))
+
+    def test_parse_xml_metadata_legacy(self):
+        """The dispatch table gives the same metadata as the legacy walks."""
+        xml_string = FULL_METADATA_OPF.encode('utf-8')
+        element = minidom.parseString(
+            xml_string).documentElement.getElementsByTagName('metadata')[0]
+        expected = legacy_parse_xml_metadata(element)
+
+        results = [('minidom', opf._parse_xml_metadata(element)),
+                   ('parse_metadata', opf.parse_metadata(xml_string))]
+        for backend in xmlbackend.get_available_backends():
+            results.append((backend,
+                            opf.parse_opf(xml_string, backend).metadata))
+
+        for label, metadata in results:
+            self.assertEqual(sorted(vars(metadata)), sorted(vars(expected)))
+            for name, value in vars(expected).items():
+                self.assertEqual(getattr(metadata, name), value,
+                                 '%s: %s' % (label, name))
+        # Every element is parsed (the last one of single values is kept)
+        for name, value in vars(expected).items():
+            self.assertNotIn(value, (None, []), name)
+        self.assertEqual(expected.description, 'The last description.')
+        self.assertEqual(expected.dc_type, '')
+
     def test_parse_xml_manifest(self):
         xml_string = """
         <manifest>
@@ -519,6 +704,86 @@ class ManifestTestCase(unittest.TestCase):
         self.assertEqual(len(manifest), 1, 'Il manque un objet !')
         self.assertIsInstance(manifest[identifier], opf.ManifestItem)
 
+    def test_get_by_href(self):
+        manifest = opf.Manifest()
+        manifest.add_item('chap1', 'Text/chapter 1.xhtml')
+        manifest.add_item('chap2', './Text/chapter%202.xhtml')
+        chap1 = manifest['chap1']
+        chap2 = manifest['chap2']
+
+        self.assertIs(manifest.get_by_href('Text/chapter 1.xhtml'), chap1)
+        self.assertIs(manifest.get_by_href('Text/chapter%201.xhtml'), chap1)
+        self.assertIs(manifest.get_by_href('Text/../Text/chapter 2.xhtml#p1'),
+                      chap2)
+        self.assertIsNone(manifest.get_by_href('Text/chapter 3.xhtml'))
+
+        # Replace an item by another one, with another href
+        manifest['chap1'] = opf.ManifestItem('chap1', 'Text/chapter 3.xhtml')
+        self.assertIsNone(manifest.get_by_href('Text/chapter 1.xhtml'))
+        self.assertIs(manifest.get_by_href('Text/chapter 3.xhtml'),
+                      manifest['chap1'])
+
+        # Many items with the same href
+        manifest.add_item('copy2', 'Text/chapter 2.xhtml')
+        manifest.add_item('copy3', 'Text/chapter%202.xhtml')
+        with self.assertRaises(LookupError):
+            manifest.get_by_href('Text/chapter 2.xhtml')
+
+        # Removing items update the index
+        del manifest['copy2']
+        with self.assertRaises(LookupError):
+            manifest.get_by_href('Text/chapter 2.xhtml')
+        del manifest['copy3']
+        self.assertIs(manifest.get_by_href('Text/chapter 2.xhtml'), chap2)
+        manifest.pop('chap2')
+        self.assertIsNone(manifest.get_by_href('Text/chapter 2.xhtml'))
+        self.assertIsNone(manifest.pop('chap2', None))
+        manifest.popitem()
+        self.assertIsNone(manifest.get_by_href('Text/chapter 3.xhtml'))
+
+        manifest.add_item('chap4', 'Text/chapter4.xhtml')
+        manifest.clear()
+        self.assertIsNone(manifest.get_by_href('Text/chapter4.xhtml'))
+
+    def test_get_by_href_modified_in_place(self):
+        manifest = opf.Manifest()
+        manifest.add_item('chap1', 'Text/chapter1.xhtml')
+        manifest.add_item('chap2', 'Text/chapter2.xhtml')
+        chap1 = manifest['chap1']
+
+        # The item is not set again: the index is rebuilt on lookup
+        chap1.href = 'Text/renamed.xhtml'
+        self.assertIs(manifest.get_by_href('Text/renamed.xhtml'), chap1)
+        self.assertIsNone(manifest.get_by_href('Text/chapter1.xhtml'))
+
+        # A stale entry is not returned, even when its href is found
+        chap1.href = 'Text/other.xhtml'
+        self.assertIsNone(manifest.get_by_href('Text/renamed.xhtml'))
+        self.assertIs(manifest.get_by_href('Text/other.xhtml'), chap1)
+
+    def test_copy(self):
+        manifest = opf.Manifest()
+        manifest.add_item('chap1', 'Text/chap1.xhtml')
+        manifest.add_item('chap2', 'Text/chap2.xhtml')
+
+        for other in (copy.deepcopy(manifest),
+                      pickle.loads(pickle.dumps(manifest)),
+                      manifest.copy()):
+            self.assertIsInstance(other, opf.Manifest)
+            self.assertEqual(list(other.keys()), ['chap1', 'chap2'])
+            self.assertEqual(other.get_by_href('Text/chap2.xhtml').identifier,
+                             'chap2')
+            # Equal, with items that are copies
+            self.assertEqual(other, manifest)
+            self.assertFalse(other != manifest)
+
+        other = copy.deepcopy(manifest)
+        other['chap2'].media_type = 'text/plain'
+        self.assertNotEqual(other, manifest)
+        other = copy.deepcopy(manifest)
+        other.move_to_end('chap1')
+        self.assertNotEqual(other, manifest)
+
     def test_as_xml_element(self):
         xml_string = """<manifest>
     <item id="css1" href="happy.css" media-type="text/css" />
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import os
+from shutil import copy, rmtree
+import tempfile
+import threading
+import unittest
+
+from epub.reader import pool
+
+
+class EpubFilePoolTestCase(unittest.TestCase):
+
+    epub_path = os.path.join(os.path.dirname(__file__), '_data/test.epub')
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.paths = []
+        for i in range(3):
+            path = os.path.join(self.tmp_dir, 'book%d.epub' % i)
+            copy(self.epub_path, path)
+            self.paths.append(path)
+        self.pool = pool.EpubFilePool(capacity=2)
+
+    def tearDown(self):
+        self.pool.close()
+        rmtree(self.tmp_dir)
+
+    def test_open_epub(self):
+        with self.pool.open_epub(self.paths[0]) as book:
+            first = book
+            self.assertEqual(book.opf.metadata.titles, [('Testing Epub', '')])
+            self.assertTrue(book.threadsafe)
+
+        with self.pool.open_epub(self.paths[0]) as book:
+            self.assertIs(book, first)
+            self.assertIsNotNone(book.fp)
+
+        self.assertEqual(self.pool.hits, 1)
+        self.assertEqual(self.pool.misses, 1)
+        self.assertEqual(len(self.pool), 1)
+
+    def test_eviction(self):
+        books = []
+        for path in self.paths:
+            with self.pool.open_epub(path) as book:
+                books.append(book)
+
+        # The least recently used is closed
+        self.assertEqual(len(self.pool), 2)
+        self.assertIsNone(books[0].fp)
+        self.assertIsNotNone(books[1].fp)
+        self.assertIsNotNone(books[2].fp)
+
+        # Using a book makes it the most recently used
+        with self.pool.open_epub(self.paths[1]) as book:
+            self.assertIs(book, books[1])
+        with self.pool.open_epub(self.paths[0]):
+            pass
+        self.assertIsNone(books[2].fp)
+        self.assertIsNotNone(books[1].fp)
+
+    def test_eviction_in_use(self):
+        with self.pool.open_epub(self.paths[0]) as in_use:
+            for path in self.paths[1:]:
+                with self.pool.open_epub(path):
+                    pass
+            # Evicted, but not closed while in use
+            self.assertEqual(len(self.pool), 2)
+            self.assertIsNotNone(in_use.fp)
+            self.assertTrue(in_use.read_item('Text/cover.xhtml'))
+        self.assertIsNone(in_use.fp)
+
+    def test_modified_file(self):
+        with self.pool.open_epub(self.paths[0]) as book:
+            first = book
+
+        stat = os.stat(self.paths[0])
+        os.utime(self.paths[0], (stat.st_atime, stat.st_mtime + 10))
+
+        with self.pool.open_epub(self.paths[0]) as book:
+            self.assertIsNot(book, first)
+        self.assertIsNone(first.fp)
+        self.assertEqual(len(self.pool), 1)
+
+    def test_close(self):
+        with pool.EpubFilePool() as epub_pool:
+            with epub_pool.open_epub(self.paths[0]) as book:
+                pass
+            with epub_pool.open_epub(self.paths[1]) as in_use:
+                epub_pool.close()
+                self.assertIsNotNone(in_use.fp)
+            self.assertEqual(len(epub_pool), 0)
+        self.assertIsNone(book.fp)
+        self.assertIsNone(in_use.fp)
+
+    def test_threads(self):
+        errors = []
+
+        def read():
+            try:
+                for i in range(30):
+                    path = self.paths[i % len(self.paths)]
+                    with self.pool.open_epub(path) as book:
+                        book.read_item('Text/cover.xhtml')
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(self.pool.hits + self.pool.misses, 120)
+        self.assertLessEqual(len(self.pool), 2)
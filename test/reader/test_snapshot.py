@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+from shutil import copy, rmtree
+import tempfile
+import unittest
+from unittest import mock
+import zipfile
+
+from epub.reader import content, ncx, opf, snapshot
+from test.reader.test_xmlbackend import as_data
+
+
+class SnapshotTestCase(unittest.TestCase):
+
+    epub_path = os.path.join(os.path.dirname(__file__), '_data/test.epub')
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'book.epub')
+        copy(self.epub_path, self.path)
+        self.snapshots = snapshot.SnapshotCache(
+            os.path.join(self.tmp_dir, 'snapshots'))
+        with content.open_epub(self.epub_path) as book:
+            self.expected_opf = as_data(book.opf)
+            self.expected_toc = as_data(book.toc)
+            self.expected_uid = book.uid
+
+    def tearDown(self):
+        rmtree(self.tmp_dir)
+
+    def get_snapshot_names(self):
+        return [name for name in os.listdir(self.snapshots.directory)
+                if name.endswith('.snapshot')]
+
+    def open_without_parsing(self, **kwargs):
+        """Open the epub file, and fail if its OPF or NCX file is parsed."""
+        with mock.patch.object(opf, 'parse_opf', side_effect=AssertionError):
+            with mock.patch.object(ncx, 'parse_toc',
+                                   side_effect=AssertionError):
+                return content.open_epub(self.path, snapshots=self.snapshots,
+                                         **kwargs)
+
+    def get_labels(self, toc):
+        return [nav_point.labels[0][0]
+                for nav_point in toc.nav_map.nav_point]
+
+    def replace_member(self, name, old, new):
+        """Replace `old` by `new` in a member of the epub file."""
+        with zipfile.ZipFile(self.epub_path) as source:
+            with zipfile.ZipFile(self.path, 'w') as target:
+                for info in source.infolist():
+                    data = source.read(info)
+                    if info.filename == name:
+                        data = data.replace(old, new)
+                    target.writestr(info, data)
+        # A new modification time, even on file systems with a coarse one
+        stat = os.stat(self.path)
+        os.utime(self.path, (stat.st_atime, stat.st_mtime + 10))
+
+    def test_dumps_loads(self):
+        with content.open_epub(self.path) as book:
+            data = snapshot.dumps(book.opf, book.toc, ('OEBPS/toc.ncx', 1))
+
+        opf_obj, toc, ncx_info = snapshot.loads(data)
+        self.assertEqual(as_data(opf_obj), self.expected_opf)
+        self.assertEqual(as_data(toc), self.expected_toc)
+        self.assertEqual(ncx_info, ('OEBPS/toc.ncx', 1))
+        self.assertIs(opf_obj.manifest.get_by_href('Text/cover.xhtml'),
+                      opf_obj.manifest['cover.xhtml'])
+
+        with self.assertRaises(snapshot.BadSnapshot):
+            snapshot.loads(b'not a snapshot')
+        with self.assertRaises(snapshot.BadSnapshot):
+            snapshot.loads(snapshot.SNAPSHOT_HEADER + b'garbage')
+
+    def test_open_epub(self):
+        with content.open_epub(self.path, snapshots=self.snapshots) as book:
+            self.assertEqual(as_data(book.opf), self.expected_opf)
+        self.assertEqual(len(self.get_snapshot_names()), 1)
+
+        # Loaded from the snapshot, without parsing
+        with self.open_without_parsing() as book:
+            self.assertEqual(as_data(book.opf), self.expected_opf)
+            self.assertEqual(as_data(book.toc), self.expected_toc)
+            self.assertEqual(book.uid, self.expected_uid)
+
+        # Lazy mode, and cache directory
+        with content.open_epub(self.path, lazy=True,
+                               snapshots=self.snapshots.directory) as book:
+            self.assertIsNone(book._opf)
+            self.assertEqual(as_data(book.toc), self.expected_toc)
+            self.assertIsNotNone(book._opf)
+
+        with self.assertRaises(ValueError):
+            content.open_epub(self.path, 'a', snapshots=self.snapshots)
+
+    def test_changed_opf(self):
+        with content.open_epub(self.path, snapshots=self.snapshots):
+            pass
+
+        self.replace_member('OEBPS/content.opf', b'Testing Epub',
+                            b'Changed Epub')
+        with content.open_epub(self.path, snapshots=self.snapshots) as book:
+            self.assertEqual(book.opf.metadata.titles,
+                             [('Changed Epub', '')])
+        self.assertEqual(len(self.get_snapshot_names()), 2)
+
+    def test_changed_ncx(self):
+        with content.open_epub(self.path, snapshots=self.snapshots):
+            pass
+
+        self.replace_member('OEBPS/toc.ncx', b'<text>Introduction</text>',
+                            b'<text>Changed</text>')
+        with content.open_epub(self.path, snapshots=self.snapshots) as book:
+            self.assertIn('Changed', self.get_labels(book.toc))
+
+        self.assertEqual(len(self.get_snapshot_names()), 2)
+        with self.open_without_parsing() as book:
+            self.assertIn('Changed', self.get_labels(book.toc))
+
+    def test_changed_archive(self):
+        with content.open_epub(self.path, snapshots=self.snapshots):
+            pass
+
+        # Neither the OPF nor the NCX file changes: the archive does
+        self.replace_member('OEBPS/Text/cover.xhtml', b'<body',
+                            b'<body class="changed"')
+        with mock.patch.object(opf, 'parse_opf',
+                               side_effect=opf.parse_opf) as parse_opf:
+            with content.open_epub(self.path,
+                                   snapshots=self.snapshots) as book:
+                self.assertEqual(as_data(book.opf), self.expected_opf)
+        self.assertEqual(parse_opf.call_count, 1)
+        self.assertEqual(len(self.get_snapshot_names()), 2)
+
+    def test_lazy_metadata(self):
+        # Only the metadata is read: the snapshot is saved without the toc
+        with content.open_epub(self.path, lazy=True,
+                               snapshots=self.snapshots) as book:
+            self.assertEqual(book.uid, self.expected_uid)
+            self.assertIsNone(book._toc)
+        self.assertEqual(len(self.get_snapshot_names()), 1)
+
+        with mock.patch.object(opf, 'parse_opf', side_effect=AssertionError):
+            with content.open_epub(self.path, lazy=True,
+                                   snapshots=self.snapshots) as book:
+                self.assertEqual(as_data(book.opf), self.expected_opf)
+                self.assertIsNone(book._toc)
+                # The NCX file is parsed, and the snapshot saved again
+                self.assertEqual(as_data(book.toc), self.expected_toc)
+
+        with self.open_without_parsing() as book:
+            self.assertEqual(as_data(book.toc), self.expected_toc)
+
+    def test_file_object(self):
+        # A file object without name: the archive has no identity
+        with open(self.path, 'rb') as f:
+            data = io.BytesIO(f.read())
+        with content.open_epub(data, snapshots=self.snapshots) as book:
+            self.assertEqual(as_data(book.opf), self.expected_opf)
+        self.assertEqual(self.get_snapshot_names(), [])
+
+    def test_bad_snapshot(self):
+        with content.open_epub(self.path, snapshots=self.snapshots):
+            pass
+        for name in self.get_snapshot_names():
+            with open(os.path.join(self.snapshots.directory, name),
+                      'wb') as f:
+                f.write(b'garbage')
+
+        with content.open_epub(self.path, snapshots=self.snapshots) as book:
+            self.assertEqual(as_data(book.opf), self.expected_opf)
+
+        self.snapshots.clear()
+        self.assertEqual(self.get_snapshot_names(), [])
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import os
+import unittest
+import zipfile
+
+from epub import const
+from epub.reader import content, ncx, opf, xmlbackend
+
+
+def as_data(obj):
+    """Return a comparable structure (dict, list, ...) from a parsed object.
+    """
+    if isinstance(obj, dict):
+        return dict((k, as_data(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return [as_data(v) for v in obj]
+    if hasattr(obj, '__dict__'):
+        return (obj.__class__.__name__, as_data(vars(obj)))
+    if hasattr(obj, '__slots__'):
+        return (obj.__class__.__name__,
+                dict((name, as_data(getattr(obj, name)))
+                     for name in obj.__slots__))
+    return obj
+
+
+# An OPF file with prefixed OPF elements, and another prefix for Dublin Core
+PREFIXED_OPF = """<?xml version="1.0" encoding="UTF-8"?>
+<opf:package xmlns:opf="http://www.idpf.org/2007/opf"
+             xmlns:purl="http://purl.org/dc/elements/1.1/"
+             unique-identifier="BookId" version="2.0">
+  <opf:metadata>
+    <purl:title xml:lang="fr">Titre</purl:title>
+    <purl:creator opf:role="aut"
+                  opf:file-as="Doe, John">John Doe</purl:creator>
+    <purl:identifier id="BookId" opf:scheme="ISBN">123456789</purl:identifier>
+    <opf:meta name="cover" content="cover-image"/>
+    <meta name="generator" content="test"/>
+  </opf:metadata>
+  <opf:manifest>
+    <opf:item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>
+    <opf:item id="chap1" href="Text/chap1.xhtml"
+              media-type="application/xhtml+xml"/>
+  </opf:manifest>
+  <opf:spine toc="ncx">
+    <opf:itemref idref="chap1" linear="no"/>
+  </opf:spine>
+  <opf:guide>
+    <opf:reference type="text" title="Start" href="Text/chap1.xhtml"/>
+  </opf:guide>
+</opf:package>"""
+
+# An NCX file with prefixed elements
+PREFIXED_NCX = """<?xml version="1.0" encoding="UTF-8"?>
+<ncx:ncx xmlns:ncx="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">
+  <ncx:head>
+    <ncx:meta name="dtb:uid" content="123456789"/>
+    <ncx:meta name="dtb:depth" content="1"/>
+  </ncx:head>
+  <ncx:docTitle><ncx:text>Titre</ncx:text></ncx:docTitle>
+  <ncx:docAuthor><ncx:text>John Doe</ncx:text></ncx:docAuthor>
+  <ncx:navMap>
+    <ncx:navPoint id="chap1" playOrder="1">
+      <ncx:navLabel><ncx:text>Chapter 1</ncx:text></ncx:navLabel>
+      <ncx:content src="Text/chap1.xhtml"/>
+    </ncx:navPoint>
+  </ncx:navMap>
+</ncx:ncx>"""
+
+# An NCX file without <head>, <docTitle> nor <navMap>
+INCOMPLETE_NCX = """<?xml version="1.0" encoding="UTF-8"?>
+<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">
+  <docAuthor><text>John Doe</text></docAuthor>
+  <pageList>
+    <pageTarget id="p1" type="normal" value="1" playOrder="1">
+      <navLabel><text>1</text></navLabel>
+      <content src="Text/chap1.xhtml#p1"/>
+    </pageTarget>
+  </pageList>
+</ncx>"""
+
+
+class XmlBackendTestCase(unittest.TestCase):
+
+    epub_path = os.path.join(os.path.dirname(__file__), '_data/test.epub')
+    ncx_path = os.path.join(os.path.dirname(__file__), '_data/test.ncx')
+
+    def setUp(self):
+        self.default_backend = xmlbackend.get_default_backend()
+
+    def tearDown(self):
+        xmlbackend.set_default_backend(self.default_backend)
+
+    def test_get_backend(self):
+        self.assertEqual(xmlbackend.get_backend(), self.default_backend)
+        self.assertEqual(xmlbackend.get_backend(xmlbackend.MINIDOM),
+                         xmlbackend.MINIDOM)
+        with self.assertRaises(ValueError):
+            xmlbackend.get_backend('unknown')
+
+        xmlbackend.set_default_backend(xmlbackend.ETREE)
+        self.assertEqual(xmlbackend.get_default_backend(), xmlbackend.ETREE)
+
+        if xmlbackend.lxml_etree is None:
+            self.assertNotIn(xmlbackend.LXML,
+                             xmlbackend.get_available_backends())
+            self.assertEqual(self.default_backend, xmlbackend.MINIDOM)
+        else:
+            self.assertEqual(self.default_backend, xmlbackend.LXML)
+
+    def test_parse_opf(self):
+        with zipfile.ZipFile(self.epub_path) as archive:
+            xml_string = archive.read('OEBPS/content.opf')
+
+        expected = as_data(opf.parse_opf(xml_string, xmlbackend.MINIDOM))
+        for backend in xmlbackend.get_available_backends():
+            result = opf.parse_opf(xml_string, backend)
+            self.assertEqual(as_data(result), expected, backend)
+            # With unicode string too
+            result = opf.parse_opf(xml_string.decode('utf-8'), backend)
+            self.assertEqual(as_data(result), expected, backend)
+
+    def test_parse_metadata(self):
+        with zipfile.ZipFile(self.epub_path) as archive:
+            xml_string = archive.read('OEBPS/content.opf')
+
+        expected = as_data(opf.parse_opf(xml_string).metadata)
+        for backend in xmlbackend.get_available_backends():
+            for source in (xml_string, xml_string.decode('utf-8')):
+                result = opf.parse_metadata(source, backend)
+                self.assertEqual(as_data(result), expected, backend)
+
+    def test_parse_toc(self):
+        with open(self.ncx_path, 'rb') as f:
+            xml_string = f.read()
+
+        expected = as_data(ncx.parse_toc(xml_string, xmlbackend.MINIDOM))
+        for backend in xmlbackend.get_available_backends():
+            result = ncx.parse_toc(xml_string, backend)
+            self.assertEqual(as_data(result), expected, backend)
+
+    def test_parse_fixtures(self):
+        with zipfile.ZipFile(self.epub_path) as archive:
+            epub_opf = archive.read('OEBPS/content.opf')
+        with open(self.ncx_path, 'rb') as f:
+            epub_ncx = f.read()
+
+        fixtures = [(opf.parse_opf, epub_opf),
+                    (opf.parse_opf, PREFIXED_OPF),
+                    (ncx.parse_toc, epub_ncx),
+                    (ncx.parse_toc, PREFIXED_NCX),
+                    (ncx.parse_toc, INCOMPLETE_NCX)]
+        backends = xmlbackend.get_available_backends()
+        for parse, xml_string in fixtures:
+            results = [as_data(parse(xml_string, backend))
+                       for backend in backends]
+            for backend, result in zip(backends[1:], results[1:]):
+                self.assertEqual(result, results[0], backend)
+
+        metadata = opf.parse_opf(PREFIXED_OPF, xmlbackend.MINIDOM).metadata
+        self.assertEqual(metadata.titles, [('Titre', 'fr')])
+        self.assertEqual(metadata.creators,
+                         [('John Doe', 'aut', 'Doe, John')])
+        self.assertEqual(metadata.identifiers,
+                         [('123456789', 'BookId', 'ISBN')])
+        self.assertEqual(metadata.metas, [('cover', 'cover-image'),
+                                          ('generator', 'test')])
+        toc = ncx.parse_toc(PREFIXED_NCX, xmlbackend.MINIDOM)
+        self.assertEqual(toc.title, 'Titre')
+        self.assertEqual(toc.uid, '123456789')
+        self.assertEqual(toc.nav_map.nav_point[0].src, 'Text/chap1.xhtml')
+        toc = ncx.parse_toc(INCOMPLETE_NCX, xmlbackend.MINIDOM)
+        self.assertEqual(toc.authors, ['John Doe'])
+        self.assertEqual(toc.nav_map.nav_point, [])
+        self.assertEqual(toc.page_list.page_target[0].value, '1')
+
+    def test_open_epub(self):
+        with content.open_epub(self.epub_path) as book:
+            expected_opf = as_data(book.opf)
+            expected_toc = as_data(book.toc)
+
+        for backend in xmlbackend.get_available_backends():
+            xmlbackend.set_default_backend(backend)
+            with content.open_epub(self.epub_path) as book:
+                self.assertEqual(book.opf_path, 'OEBPS/content.opf')
+                self.assertEqual(as_data(book.opf), expected_opf, backend)
+                self.assertEqual(as_data(book.toc), expected_toc, backend)
+
+    def test_intern_strings(self):
+        with zipfile.ZipFile(self.epub_path) as archive:
+            opf_string = archive.read('OEBPS/content.opf')
+        with open(self.ncx_path, 'rb') as f:
+            ncx_string = f.read()
+
+        for backend in xmlbackend.get_available_backends():
+            first, second = [opf.parse_opf(opf_string, backend)
+                             for _ in range(2)]
+            item = first.manifest['cover.xhtml']
+            self.assertIs(item.media_type, const.MIMETYPE_HTML)
+            self.assertIs(item.identifier,
+                          second.manifest['cover.xhtml'].identifier)
+            self.assertIs(first.spine.itemrefs[0][0],
+                          second.spine.itemrefs[0][0])
+
+            first, second = [ncx.parse_toc(ncx_string, backend)
+                             for _ in range(2)]
+            self.assertIs(first.nav_map.nav_point[0].class_name,
+                          second.nav_map.nav_point[0].class_name)
+            self.assertIs(first.page_list.page_target[0].target_type,
+                          second.page_list.page_target[0].target_type)
+
+            # Values are the same without interning
+            self.assertEqual(
+                as_data(opf.parse_opf(opf_string, backend, False)),
+                as_data(opf.parse_opf(opf_string, backend)))
+            self.assertEqual(
+                as_data(ncx.parse_toc(ncx_string, backend, False)),
+                as_data(ncx.parse_toc(ncx_string, backend)))
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import io
+import os
+import unittest
+import zipfile
+from xml.dom import minidom
+
+from epub.reader import ncx, opf, xmlwriter
+
+
+class XmlWriterTestCase(unittest.TestCase):
+
+    def write(self, func):
+        stream = io.BytesIO()
+        writer = xmlwriter.XmlWriter(stream)
+        func(writer)
+        writer.flush()
+        return stream.getvalue()
+
+    def test_escape(self):
+        self.assertEqual(xmlwriter.escape('a & <b> "c"'),
+                         'a &amp; &lt;b&gt; &quot;c&quot;')
+        self.assertEqual(xmlwriter.escape(None), '')
+        self.assertEqual(xmlwriter.escape(''), '')
+
+    def test_elements(self):
+        def func(writer):
+            writer.declaration()
+            writer.start('root', [('b', '1'), ('a', None)])
+            writer.element('empty')
+            writer.text_element('text', 'été & co', [('lang', 'fr')])
+            writer.text_element('none', None)
+            writer.start('parent')
+            writer.end()
+            writer.node(minidom.parseString('<x y="&quot;"/>').firstChild)
+            writer.end()
+
+        attributes = ' b="1" a=""'
+        if xmlwriter.SORT_ATTRIBUTES:
+            attributes = ' a="" b="1"'
+        self.assertEqual(
+            self.write(func),
+            ('<?xml version="1.0" ?><root%s><empty/>'
+             '<text lang="fr">été &amp; co</text><none>None</none>'
+             '<parent/><x y="&quot;"/></root>' % attributes).encode('utf-8'))
+
+    def test_flush(self):
+        stream = io.BytesIO()
+        writer = xmlwriter.XmlWriter(stream)
+        writer.start('root')
+        for i in range(xmlwriter.BUFFER_SIZE):
+            writer.element('item')
+        # Written as the buffer is full, without the last parts
+        self.assertTrue(stream.getvalue().startswith(b'<root><item/>'))
+        writer.end()
+        writer.flush()
+        self.assertTrue(stream.getvalue().endswith(b'<item/></root>'))
+
+
+class WriteXmlDocumentTestCase(unittest.TestCase):
+    """write_xml_document writes the same bytes as as_xml_document."""
+
+    data_path = os.path.join(os.path.dirname(__file__), '_data')
+
+    def assertSameXml(self, obj):
+        stream = io.BytesIO()
+        obj.write_xml_document(stream)
+        self.assertEqual(stream.getvalue(),
+                         obj.as_xml_document().toxml().encode('utf-8'))
+
+    def test_opf(self):
+        epub_path = os.path.join(self.data_path, 'test.epub')
+        with zipfile.ZipFile(epub_path) as epub_file:
+            opf_obj = opf.parse_opf(epub_file.read('OEBPS/content.opf'))
+        self.assertSameXml(opf_obj)
+
+        metadata = opf_obj.metadata
+        metadata.add_title('Title & <subtitle>', 'fr')
+        metadata.add_creator('Creator', 'aut', 'Creator, The')
+        metadata.add_contributor('Contributor')
+        metadata.add_date('2014', 'publication')
+        metadata.add_identifier('"id"', 'id2', 'isbn')
+        metadata.add_subject('')
+        metadata.description = 'Description'
+        metadata.dc_type = 'Text'
+        metadata.add_meta('name', 'content')
+        opf_obj.spine.add_itemref('chapter', False)
+        opf_obj.guide.add_reference('cover.html', None, None)
+        opf_obj.guide.add_reference(None, 'toc', 'Table')
+        opf_obj.manifest.append(opf.ManifestItem(
+            'item', 'Text/item.xhtml', 'application/xhtml+xml', 'fallback',
+            'namespace', 'modules', 'style'))
+        self.assertSameXml(opf_obj)
+
+        self.assertSameXml(opf.Opf())
+
+    def test_opf_custom_item(self):
+        class Item(object):
+            identifier = 'custom'
+            href = 'custom.xhtml'
+
+            def as_xml_element(self):
+                element = minidom.Document().createElement('item')
+                element.setAttribute('id', self.identifier)
+                return element
+
+        opf_obj = opf.Opf()
+        opf_obj.manifest.append(Item())
+        self.assertSameXml(opf_obj)
+
+    def test_ncx(self):
+        with open(os.path.join(self.data_path, 'test.ncx'), 'rb') as f:
+            xml_string = f.read()
+        toc = ncx.parse_toc(xml_string)
+        self.assertSameXml(toc)
+        self.assertSameXml(ncx.parse_toc(xml_string, deferred=True))
+
+        nav_point = ncx.NavPoint()
+        nav_point.add_label('', 'fr', 'rtl')
+        nav_point.add_point(ncx.NavPoint())
+        toc.nav_map.nav_point[0].add_point(nav_point)
+        toc.nav_map.identifier = 'map'
+        toc.nav_map.add_info('Info & co')
+        toc.page_list.identifier = 'pages'
+        toc.page_list.class_name = 'pages'
+        toc.page_list.add_label('Pages')
+        toc.nav_lists[0].add_info('Info')
+        self.assertSameXml(toc)
+
+        self.assertSameXml(ncx.Ncx())
+
+    def test_deep_ncx(self):
+        toc = ncx.Ncx()
+        parent = toc.nav_map
+        for i in range(200):
+            nav_point = ncx.NavPoint()
+            nav_point.identifier = 'p%d' % i
+            nav_point.src = 'ch.xhtml#p%d' % i
+            parent.add_point(nav_point)
+            parent = nav_point
+        self.assertSameXml(toc)
+
+        # minidom's toxml is recursive, write_xml_document is not
+        for i in range(5000):
+            nav_point = ncx.NavPoint()
+            parent.add_point(nav_point)
+            parent = nav_point
+        stream = io.BytesIO()
+        toc.write_xml_document(stream)
+        self.assertEqual(stream.getvalue().count(b'</navPoint>'), 5200)
@@ -4,7 +4,7 @@
 import unittest
 from xml.dom import minidom
 
-from epub import utils
+from epub import const, utils
 
 
 class TestFunction(unittest.TestCase):
@@ -30,3 +30,37 @@ class TestFunction(unittest.TestCase):
         href, fragment = utils.get_urlpath_part(url)
         self.assertEquals(href, expected_href)
         self.assertEquals(fragment, expected_fragment)
+
+    def test_normalize_href(self):
+        self.assertEqual(utils.normalize_href('Text/chapter1.xhtml'),
+                         'Text/chapter1.xhtml')
+        self.assertEqual(utils.normalize_href('./Text/chapter1.xhtml#part2'),
+                         'Text/chapter1.xhtml')
+        self.assertEqual(utils.normalize_href('Text/../Images/cover%201.jpg'),
+                         'Images/cover 1.jpg')
+        self.assertEqual(utils.normalize_href('#part2'), '')
+        self.assertEqual(utils.normalize_href('./'), '')
+
+    def test_intern_string(self):
+        media_type = ''.join(['application/', 'xhtml+xml'])
+        self.assertIs(utils.intern_string(media_type), const.MIMETYPE_HTML)
+
+        role = ''.join(['a', 'ut'])
+        self.assertEqual(utils.intern_string(role), 'aut')
+        self.assertIs(utils.intern_string(''.join(['au', 't'])),
+                      utils.intern_string(role))
+        self.assertEqual(utils.intern_string(''), '')
+        self.assertIs(utils.keep_string(role), role)
+
+    def test_intern_table(self):
+        intern = utils._InternTable(max_size=3)
+        role = ''.join(['a', 'ut'])
+        self.assertIs(intern(role), role)
+        self.assertIs(intern(''.join(['au', 't'])), role)
+        for value in ('edt', 'ill'):
+            intern(value)
+        self.assertEqual(len(intern), 3)
+        # Cleared when full: it never keeps more than max_size strings
+        intern('trl')
+        self.assertEqual(len(intern), 1)
+        self.assertIsNot(intern(''.join(['au', 't'])), role)